@@ -0,0 +1,157 @@
+"""Benchmark scalability
+
+Script which generates synthetic datasets with the same schema as the DMC data, but in multiples of
+its size, and measures runtime and peak memory of the main processing stages (loading, recommenders,
+validation, offline evaluation) on them. Item popularity follows a long-tail (Zipf-like)
+distribution, session lengths a geometric distribution.
+Results are appended to a JSON-lines file (one record per scale and stage, plus the current Git
+commit), so they can be compared across versions of the code.
+Peak memory is measured with "tracemalloc", i.e., only considers Python/NumPy allocations in the
+main process (not in worker processes, e.g., of the validation).
+"""
+
+import datetime
+import json
+import pathlib
+import subprocess
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+import check_submission_validity
+import evaluate_offline
+import load_data
+import recommend_cooccurring_favorites
+import recommend_global_favorites
+import recommend_similar_items
+
+
+BENCHMARK_DIR = pathlib.Path('data/benchmark/')  # generated data and results are stored here
+RESULTS_FILE_NAME = 'benchmark_results.jsonl'
+SCALES = [1, 10, 100]  # multiples of DMC data size
+BASE_NUM_ITEMS = 78334  # sizes of DMC data
+BASE_NUM_TRANSACTIONS = 365143
+BASE_NUM_EVALUATION_ITEMS = 1000
+ITEMWISE_MAX_ITEMS = 100  # the item-wise recommender is slow, so only evaluate it on a few items
+SEED = 25
+
+
+# Generate items, transactions, and evaluation items in DMC format (with "scale" times its size).
+def generate_dataset(scale: float, seed: int = SEED) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    num_items = int(BASE_NUM_ITEMS * scale)
+    num_transactions = int(BASE_NUM_TRANSACTIONS * scale)
+    item_ids = np.sort(rng.choice(2 * num_items, size=num_items, replace=False)) + 1
+    vocabulary = pd.Series([f'word{i}' for i in range(5000)])
+    title_words = [vocabulary.sample(n=num_items, replace=True, random_state=seed + i).to_numpy() for i in range(3)]
+    items = pd.DataFrame({
+        'itemID': item_ids,
+        'title': pd.Series(title_words[0]).str.cat(title_words[1:], sep=' '),
+        'author': pd.Series(rng.zipf(1.5, size=num_items) % max(num_items // 3, 1)).map('author {}'.format),
+        'publisher': pd.Series(rng.zipf(1.5, size=num_items) % max(num_items // 50, 1)).map('publisher {}'.format),
+        'main topic': pd.Series(rng.integers(200, size=num_items)).map('T{}'.format),
+        'subtopics': pd.Series(rng.integers(200, size=num_items)).map('[T{0},T{0}A]'.format)
+    })
+    items.loc[rng.random(num_items) < 0.01, 'author'] = np.nan
+    # Long-tail popularity (item order is random, so popularity is not correlated with item id):
+    popularity = 1 / np.arange(1, num_items + 1)
+    popularity = rng.permutation(popularity / popularity.sum())
+    session_lengths = rng.geometric(p=0.74, size=num_transactions)
+    session_ids = np.repeat(np.arange(1, num_transactions + 1), session_lengths)[:num_transactions]
+    transactions = pd.DataFrame({'sessionID': session_ids,
+                                 'itemID': rng.choice(item_ids, size=num_transactions, p=popularity)})
+    transactions = transactions.drop_duplicates(ignore_index=True)
+    transactions['click'] = rng.geometric(p=0.6, size=len(transactions)) - 1
+    transactions['basket'] = rng.binomial(n=1, p=0.1, size=len(transactions))
+    transactions['order'] = transactions['basket'] * rng.binomial(n=1, p=0.5, size=len(transactions))
+    evaluation = pd.DataFrame({'itemID': rng.choice(item_ids, size=int(BASE_NUM_EVALUATION_ITEMS * scale),
+                                                    replace=False)})
+    return items, transactions, evaluation
+
+
+# Run a function and measure its wall time and peak memory. Return function result and measurements.
+def measure(function: Callable[[], Any]) -> Tuple[Any, Dict[str, float]]:
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    result = function()
+    wall_time = time.perf_counter() - start_time
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {'wall_time_s': wall_time, 'peak_memory_mb': peak_memory / 2 ** 20}
+
+
+def get_git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+# Generate dataset of given scale, run all stages on it, and return one result record per stage.
+def run_benchmark(scale: float) -> list:
+    data_dir = BENCHMARK_DIR / f'scale_{scale}'
+    data_dir.mkdir(parents=True, exist_ok=True)
+    results = []
+
+    def run_stage(stage: str, function: Callable[[], Any]) -> Any:
+        result, measurements = measure(function)
+        num_rows = len(result) if isinstance(result, pd.DataFrame) else None
+        results.append({'scale': scale, 'stage': stage, 'num_rows': num_rows, **measurements})
+        print(f'Scale {scale}, stage "{stage}": {measurements["wall_time_s"]:.2f}s, '
+              f'{measurements["peak_memory_mb"]:.1f} MB')
+        return result
+
+    items, transactions, evaluation = run_stage('generate_data', lambda: generate_dataset(scale))
+    run_stage('write_csv', lambda: [items.to_csv(data_dir / 'items.csv', sep='|', index=False),
+                                    transactions.to_csv(data_dir / 'transactions.csv', sep='|', index=False),
+                                    evaluation.to_csv(data_dir / 'evaluation.csv', sep='|', index=False)])
+    for cache_file in (data_dir / load_data.CACHE_DIR_NAME).glob('*'):
+        cache_file.unlink()  # make sure first load is not cached
+    run_stage('load_transactions_csv', lambda: load_data.load_transactions(data_dir))
+    transactions = run_stage('load_transactions_cached', lambda: load_data.load_transactions(data_dir))
+    items = run_stage('load_items', lambda: load_data.load_items(data_dir))
+    evaluation = run_stage('load_evaluation', lambda: load_data.load_evaluation(data_dir))
+    run_stage('recommend_global_in_memory', lambda: recommend_global_favorites.recommend_globally(
+        evaluation, recommend_global_favorites.count_items([transactions]).get_top_items()))
+    run_stage('recommend_global_streaming', lambda: recommend_global_favorites.recommend_globally(
+        evaluation, recommend_global_favorites.count_items_streaming(data_dir / 'transactions.csv').get_top_items()))
+    if scale <= 1:
+        run_stage('recommend_cooccurring_itemwise', lambda: recommend_cooccurring_favorites.recommend_itemwise(
+            evaluation.iloc[:ITEMWISE_MAX_ITEMS], transactions))
+    run_stage('recommend_cooccurring_batchwise', lambda: recommend_cooccurring_favorites.recommend_batchwise(
+        evaluation, transactions))
+    similarity_index = run_stage('build_similarity_index', lambda: recommend_similar_items.build_similarity_index(items))
+    run_stage('recommend_similar_items', lambda: recommend_similar_items.get_similar_items(
+        similarity_index, evaluation['itemID']))
+    submission = recommend_cooccurring_favorites.recommend_batchwise(evaluation, transactions).astype('int64')
+    submission.to_csv(data_dir / 'Benchmark_recommendation.csv', sep='|', index=False)
+    run_stage('check_submission_validity', lambda: check_submission_validity.check_submission_validity(
+        submission=submission, test_values=evaluation, valid_itemIDs=items['itemID']))
+    run_stage('check_submission_files', lambda: check_submission_validity.check_submission_files(
+        submission_files=[data_dir / 'Benchmark_recommendation.csv'], test_values=evaluation,
+        valid_itemIDs=items['itemID'])[0])
+    train_transactions, holdout_transactions = evaluate_offline.split_transactions(transactions)
+    relevant_pairs = run_stage('evaluate_offline_split', lambda: evaluate_offline.get_relevant_pairs(
+        holdout_transactions))
+    run_stage('evaluate_offline_metrics', lambda: evaluate_offline.compute_metrics(
+        recommendations=submission, relevant_pairs=relevant_pairs))
+    return results
+
+
+if __name__ == '__main__':
+    BENCHMARK_DIR.mkdir(parents=True, exist_ok=True)
+    run_info = {'run_time': datetime.datetime.now().isoformat(timespec='seconds'), 'git_commit': get_git_commit()}
+    results = []
+    for scale in SCALES:
+        scale_results = run_benchmark(scale)
+        with open(BENCHMARK_DIR / RESULTS_FILE_NAME, 'a') as results_file:
+            for result in scale_results:
+                results_file.write(json.dumps({**run_info, **result}) + '\n')
+        results.extend(scale_results)
+    results = pd.DataFrame(results)
+    print(results.pivot(index='stage', columns='scale', values='wall_time_s'))
+    print(results.pivot(index='stage', columns='scale', values='peak_memory_mb'))
@@ -0,0 +1,100 @@
+"""Build comparison tables
+
+Shared functionality for "prepare_manual_scoring.py" and "prepare_distributed_solution.py", which
+both create comparison tables showing the recommendations of several teams (one recommendation per
+row, with meta-data from the items file) and write them, partitioned by items, to multiple files.
+All submission files are found with one directory scan and loaded once into one array aligned by
+itemID. Item meta-data is added via index lookup (instead of merging), and all partitions are cut
+from the comparison table in one pass and written in parallel.
+"""
+
+import concurrent.futures
+import pathlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+import check_submission_validity
+import instrumentation
+
+
+NUM_RECOMMENDATIONS = 5
+MAX_WRITE_WORKERS = 8  # number of threads writing files
+
+
+# Find the submission file of each team with one scan of "submission_dir". Files are matched by
+# team name; if there is no file named exactly like a team, file names containing the team name
+# are considered.
+def find_submission_files(submission_dir: pathlib.Path, teams: Iterable[str]) -> Dict[str, pathlib.Path]:
+    files_by_team = {x.stem.replace('_recommendation', ''): x
+                     for x in submission_dir.glob('**/*_recommendation.csv')}
+    submission_files = {}
+    for team in teams:
+        if team in files_by_team:
+            submission_files[team] = files_by_team[team]
+            continue
+        team_files = [x for name, x in files_by_team.items() if team in name]
+        if len(team_files) != 1:
+            raise FileNotFoundError(f'No or multiple prediction files for group {team}.')
+        submission_files[team] = team_files[0]
+    return submission_files
+
+
+# Load the submissions of multiple teams into one array with dimensions (team, item, rank), with
+# items in order of "item_ids" and -1 for missing recommendations.
+@instrumentation.instrument()
+def load_submissions(submission_files: Dict[str, pathlib.Path], item_ids: Sequence[int],
+                     num_recommendations: int = NUM_RECOMMENDATIONS) -> np.ndarray:
+    item_index = pd.Index(item_ids)
+    recommendations = np.full((len(submission_files), len(item_index), num_recommendations), -1, dtype=np.int64)
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        submissions = executor.map(check_submission_validity.read_submission, submission_files.values())
+        for team_idx, submission in enumerate(submissions):
+            positions = item_index.get_indexer(submission['itemID'])
+            is_relevant = positions >= 0
+            recommendations[team_idx, positions[is_relevant]] = submission.loc[
+                is_relevant, [f'rec_{i + 1}' for i in range(num_recommendations)]].to_numpy()
+    return recommendations
+
+
+# Create comparison table (one row per item, team, and recommendation) from recommendations as
+# returned by "load_submissions()". Rows are ordered by item (as in "item_ids"), team name (alphabetically),
+# and rank. Recommended items not contained in "items" are dropped.
+@instrumentation.instrument()
+def build_comparison_table(recommendations: np.ndarray, teams: Sequence[str], item_ids: Sequence[int],
+                           items: pd.DataFrame) -> pd.DataFrame:
+    team_order = np.argsort(teams, kind='stable')
+    recommendations = recommendations[team_order].transpose(1, 0, 2)  # (item, team, rank)
+    num_items, num_teams, num_recommendations = recommendations.shape
+    comparison_table = pd.DataFrame({
+        'itemID': np.repeat(np.asarray(item_ids), num_teams * num_recommendations),
+        'team': np.tile(np.repeat(np.asarray(teams)[team_order], num_recommendations), num_items),
+        'rec_nr': np.tile([str(i + 1) for i in range(num_recommendations)], num_items * num_teams),
+        'rec_item': recommendations.ravel()
+    })
+    item_positions = pd.Index(items['itemID']).get_indexer(comparison_table['rec_item'])
+    is_known = item_positions >= 0
+    comparison_table = comparison_table[is_known].reset_index(drop=True)
+    item_info = items.drop(columns='itemID').iloc[item_positions[is_known]].reset_index(drop=True)
+    return pd.concat([comparison_table, item_info], axis='columns')
+
+
+# Split a comparison table (ordered by items as in "item_ids") into consecutive partitions of items.
+def split_table_by_items(comparison_table: pd.DataFrame, item_ids: Sequence[int],
+                         num_partition_items: Iterable[int]) -> List[pd.DataFrame]:
+    row_item_positions = pd.Index(item_ids).get_indexer(comparison_table['itemID'])  # sorted
+    partition_ends = np.cumsum(list(num_partition_items))
+    row_ends = np.searchsorted(row_item_positions, partition_ends, side='left')
+    row_starts = np.concatenate([[0], row_ends[:-1]])
+    return [comparison_table.iloc[start:end] for start, end in zip(row_starts, row_ends)]
+
+
+# Write multiple tables (with their paths) as CSVs in parallel.
+@instrumentation.instrument()
+def write_tables(tables: Iterable[Tuple[pd.DataFrame, pathlib.Path]],
+                 max_workers: Optional[int] = MAX_WRITE_WORKERS) -> None:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(table.to_csv, path, sep='|', index=False) for table, path in tables]
+        for future in futures:
+            future.result()  # re-raise exceptions
@@ -2,46 +2,74 @@
 
 Checks whether the submissions in identically-named files are actually the same. This can be used
 to compare an actual submission to a reproduced submission.
+Files are first compared via content hashes; only if these differ, both files are loaded and
+compared via row hashes to find the differing rows.
 """
 
 import csv
 import pathlib
+from typing import Any, Dict
 
+import numpy as np
 import pandas as pd
 
+import instrumentation
+import load_data
+
 
 SUBMISSION_DIR_1 = pathlib.Path('data/')
 SUBMISSION_DIR_2 = pathlib.Path('data/')
 
 
+# Compare two (differing) submissions. Return positions of differing rows and number of differing
+# cells. If the columns differ, all rows are considered different; if the number of rows differs,
+# additional rows of the longer submission are considered completely different.
+@instrumentation.instrument()
+def compare_submissions(submission_1: pd.DataFrame, submission_2: pd.DataFrame) -> Dict[str, Any]:
+    num_rows = max(len(submission_1), len(submission_2))
+    if list(submission_1) != list(submission_2):
+        return {'diff_rows': np.arange(num_rows), 'num_total_diff': num_rows * submission_1.shape[1]}
+    num_common_rows = min(len(submission_1), len(submission_2))
+    row_hashes_1 = pd.util.hash_pandas_object(submission_1.iloc[:num_common_rows], index=False).to_numpy()
+    row_hashes_2 = pd.util.hash_pandas_object(submission_2.iloc[:num_common_rows], index=False).to_numpy()
+    diff_rows = np.where(row_hashes_1 != row_hashes_2)[0]
+    num_total_diff = (submission_1.iloc[diff_rows].to_numpy() != submission_2.iloc[diff_rows].to_numpy()).sum()
+    num_total_diff += (num_rows - num_common_rows) * submission_1.shape[1]
+    diff_rows = np.concatenate([diff_rows, np.arange(num_common_rows, num_rows)])
+    return {'diff_rows': diff_rows, 'num_total_diff': int(num_total_diff)}
+
+
 if __name__ == '__main__':
     if not SUBMISSION_DIR_1.exists():
         FileNotFoundError(f'"{SUBMISSION_DIR_1}" does not exist.')
     if not SUBMISSION_DIR_2.exists():
         FileNotFoundError(f'"{SUBMISSION_DIR_2}" does not exist.')
-    submission_files_1 = list(SUBMISSION_DIR_1.glob('**/*_recommendation.csv'))
-    submission_files_2 = list(SUBMISSION_DIR_2.glob('**/*_recommendation.csv'))
-    submission_pairs = []
-    for submission_file_1 in submission_files_1:
-        submission_file_2 = [x for x in submission_files_2 if x.name == submission_file_1.name]
-        if len(submission_file_2) > 1:
-            RuntimeError('Found more than one match.')
-        elif len(submission_file_2) == 1:
-            submission_pairs.append((submission_file_1, submission_file_2[0]))
-            submission_files_2.remove(submission_file_2[0])
-        else:
-            print(f'"{submission_file_1}" has no matching file.')
-    for submission_file_2 in submission_files_2:
-        print(f'"{submission_file_2}" has no matching file.')
+    submission_files_1 = {}
+    for submission_file_1 in SUBMISSION_DIR_1.glob('**/*_recommendation.csv'):
+        if submission_file_1.name in submission_files_1:
+            raise RuntimeError(f'Found more than one file named "{submission_file_1.name}".')
+        submission_files_1[submission_file_1.name] = submission_file_1
+    submission_files_2 = {}
+    for submission_file_2 in SUBMISSION_DIR_2.glob('**/*_recommendation.csv'):
+        if submission_file_2.name in submission_files_2:
+            raise RuntimeError(f'Found more than one file named "{submission_file_2.name}".')
+        submission_files_2[submission_file_2.name] = submission_file_2
+    for file_name in submission_files_1.keys() ^ submission_files_2.keys():
+        print(f'"{submission_files_1.get(file_name, submission_files_2.get(file_name))}" has no matching file.')
     results = []
-    for submission_file_1, submission_file_2 in submission_pairs:
+    for file_name in sorted(submission_files_1.keys() & submission_files_2.keys()):
+        submission_file_1 = submission_files_1[file_name]
+        submission_file_2 = submission_files_2[file_name]
+        team_name = submission_file_1.stem.replace('_recommendation', '')
+        if load_data.compute_file_hash(submission_file_1) == load_data.compute_file_hash(submission_file_2):
+            results.append({'Team': team_name, 'Row_diff': 0, 'Total_diff': 0, 'Diff_rows': []})
+            continue
         submission_1 = pd.read_csv(submission_file_1, sep='|', quoting=csv.QUOTE_NONE, header=0,
                                    decimal='.', encoding='utf-8', escapechar=None)
         submission_2 = pd.read_csv(submission_file_2, sep='|', quoting=csv.QUOTE_NONE, header=0,
                                    decimal='.', encoding='utf-8', escapechar=None)
-        team_name = submission_file_1.stem.replace('_recommendation', '')
-        num_row_diff = (submission_1 != submission_2).any(axis='columns').sum()
-        num_total_diff = (submission_1 != submission_2).sum().sum()
-        results.append({'Team': team_name, 'Row_diff': num_row_diff, 'Total_diff': num_total_diff})
-    results = pd.DataFrame(results)
+        comparison = compare_submissions(submission_1, submission_2)
+        results.append({'Team': team_name, 'Row_diff': len(comparison['diff_rows']),
+                        'Total_diff': comparison['num_total_diff'], 'Diff_rows': list(comparison['diff_rows'])})
+    results = pd.DataFrame(results, columns=['Team', 'Row_diff', 'Total_diff', 'Diff_rows'])
     print(results)
@@ -2,57 +2,151 @@
 
 Finds all submission files named like `<<Teamname>>_recommendation.csv` in some directory and
 checks their validity against an unlabeled test set ("evaluation.csv") and several formatting rules.
+Files are checked in parallel. For each file, we report all violated rules and the number of
+affected rows, not only the first violated rule.
 """
 
+import concurrent.futures
 import csv
 import pathlib
-from typing import Sequence
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
 
+import instrumentation
+import load_data
+
 
 SUBMISSION_DIR = pathlib.Path('data/')
 DATA_DIR = pathlib.Path('data/')  # needs to contain "evaluation.csv" and "items.csv"
+NUM_PROCESSES = None  # None means one process per core
 
+_worker_test_values = None  # set once per worker process by initializer
+_worker_valid_itemIDs = None
 
-def check_submission_validity(submission: pd.DataFrame, test_values: pd.DataFrame,
-                              valid_itemIDs: Sequence[int]) -> str:
-    if isinstance(valid_itemIDs, pd.Series):
-        valid_itemIDs = list(valid_itemIDs)  # else check with .isin() might not work as expected
+
+# Sorted, duplicate-free array of item ids, allowing membership checks via binary search. Should be
+# created once and then passed to the checks.
+def prepare_valid_itemIDs(valid_itemIDs: Sequence[int]) -> np.ndarray:
+    return np.unique(np.asarray(valid_itemIDs))
+
+
+# Element-wise check whether "values" (any shape) are contained in a sorted array.
+def _isin_sorted(values: np.ndarray, sorted_values: np.ndarray) -> np.ndarray:
+    if len(sorted_values) == 0:
+        return np.zeros(values.shape, dtype=bool)
+    positions = np.searchsorted(sorted_values, values).clip(max=len(sorted_values) - 1)
+    return sorted_values[positions] == values
+
+
+# Check all formatting rules and return the violated ones, each with its message and number of
+# affected rows (empty list if valid). Rules are checked in the same order as in
+# "check_submission_validity()". If the columns are wrong, the content is not checked.
+def get_rule_violations(submission: pd.DataFrame, test_values: pd.DataFrame,
+                        valid_itemIDs: np.ndarray) -> List[Dict[str, Any]]:
+    violations = []
+    rec_columns = [f'rec_{i}' for i in range(1, 6)]
     if submission.shape[0] != test_values.shape[0]:
-        return 'Number of recommendations wrong (might be issue with header).'
+        violations.append({'rule': 'Number of recommendations wrong (might be issue with header).',
+                           'num_rows': abs(submission.shape[0] - test_values.shape[0])})
     if submission.shape[1] != 6:
-        return 'Number of columns wrong (index column might be saved).'
-    if list(submission) != ['itemID', 'rec_1', 'rec_2', 'rec_3', 'rec_4', 'rec_5']:
-        return 'At least one column name wrong (might be quoted).'
-    if (submission.dtypes != 'int64').any():
-        return 'At least one itemID is not an integer.'
-    if submission.isna().any().any():
-        return 'At least one NA.'
-    if sorted(submission['itemID']) != sorted(test_values['itemID']):
-        return 'At least one recommendation for a wrong itemID.'
-    if not submission[[f'rec_{i}' for i in range(1, 6)]].isin(valid_itemIDs).all().all():
-        return 'At least one non-existing itemID recommended.'
-    if (submission['itemID'] != test_values['itemID']).any():
-        return 'Order of itemID changed, else valid.'
+        violations.append({'rule': 'Number of columns wrong (index column might be saved).',
+                           'num_rows': submission.shape[0]})
+    if list(submission) != ['itemID'] + rec_columns:
+        violations.append({'rule': 'At least one column name wrong (might be quoted).',
+                           'num_rows': submission.shape[0]})
+    if submission.shape[1] != 6 or list(submission) != ['itemID'] + rec_columns:
+        return violations
+    values = submission.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    is_wrong_type = (submission.dtypes != 'int64').to_numpy()
+    if is_wrong_type.any():
+        # Rows with non-integer entries in columns of wrong type (all rows if entries integer-like):
+        wrong_type_values = values[:, is_wrong_type]
+        num_rows = (np.isnan(wrong_type_values) | (wrong_type_values % 1 != 0)).any(axis=1).sum()
+        violations.append({'rule': 'At least one itemID is not an integer.',
+                           'num_rows': num_rows if num_rows > 0 else submission.shape[0]})
+    is_na_row = submission.isna().any(axis='columns').to_numpy()
+    if is_na_row.any():
+        violations.append({'rule': 'At least one NA.', 'num_rows': is_na_row.sum()})
+    submission_itemIDs = np.sort(values[:, 0])
+    test_itemIDs = np.sort(test_values['itemID'].to_numpy())
+    if (len(submission_itemIDs) != len(test_itemIDs)) or (submission_itemIDs != test_itemIDs).any():
+        # Rows with unknown or duplicate itemID (if there are none, count missing itemIDs instead):
+        num_rows = (~_isin_sorted(submission_itemIDs, test_itemIDs)).sum() +\
+            (len(submission_itemIDs) - len(np.unique(submission_itemIDs)))
+        if num_rows == 0:
+            num_rows = (~_isin_sorted(test_itemIDs, submission_itemIDs)).sum()
+        violations.append({'rule': 'At least one recommendation for a wrong itemID.', 'num_rows': num_rows})
+    is_invalid_rec_row = ~_isin_sorted(values[:, 1:], valid_itemIDs).all(axis=1)
+    if is_invalid_rec_row.any():
+        violations.append({'rule': 'At least one non-existing itemID recommended.',
+                           'num_rows': is_invalid_rec_row.sum()})
+    if len(submission_itemIDs) == len(test_itemIDs):
+        num_rows = (values[:, 0] != test_values['itemID'].to_numpy()).sum()
+        if num_rows > 0:
+            violations.append({'rule': 'Order of itemID changed, else valid.', 'num_rows': num_rows})
+    return [{'rule': x['rule'], 'num_rows': int(x['num_rows'])} for x in violations]
+
+
+# Return message for first violated rule (or "Valid.").
+def check_submission_validity(submission: pd.DataFrame, test_values: pd.DataFrame,
+                              valid_itemIDs: Sequence[int]) -> str:
+    violations = get_rule_violations(submission=submission, test_values=test_values,
+                                     valid_itemIDs=prepare_valid_itemIDs(valid_itemIDs))
+    if len(violations) > 0:
+        return violations[0]['rule']
     return 'Valid.'
 
 
+@instrumentation.instrument()
+def read_submission(submission_file: pathlib.Path) -> pd.DataFrame:
+    return pd.read_csv(submission_file, sep='|', quoting=csv.QUOTE_NONE, header=0, decimal='.',
+                       encoding='utf-8', escapechar=None)
+
+
+def _init_worker(test_values: pd.DataFrame, valid_itemIDs: np.ndarray) -> None:
+    global _worker_test_values, _worker_valid_itemIDs
+    _worker_test_values = test_values
+    _worker_valid_itemIDs = valid_itemIDs
+
+
+def _check_submission_file(submission_file: pathlib.Path) -> List[Dict[str, Any]]:
+    return get_rule_violations(submission=read_submission(submission_file), test_values=_worker_test_values,
+                               valid_itemIDs=_worker_valid_itemIDs)
+
+
+# Check multiple submission files in parallel. Return a table with the validity status of each team
+# (first violated rule, as in "check_submission_validity()") and a table with all violations.
+@instrumentation.instrument()
+def check_submission_files(submission_files: Iterable[pathlib.Path], test_values: pd.DataFrame,
+                           valid_itemIDs: Sequence[int],
+                           num_processes: Optional[int] = NUM_PROCESSES) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    submission_files = list(submission_files)
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=num_processes, initializer=_init_worker,
+            initargs=(test_values, prepare_valid_itemIDs(valid_itemIDs))) as executor:
+        all_violations = list(executor.map(_check_submission_file, submission_files))
+    results = []
+    violation_results = []
+    for submission_file, violations in zip(submission_files, all_violations):
+        team_name = submission_file.stem.replace('_recommendation', '')
+        results.append({'Team': team_name, 'Validity': violations[0]['rule'] if len(violations) > 0 else 'Valid.'})
+        violation_results.extend({'Team': team_name, 'Rule': x['rule'], 'Rows': x['num_rows']} for x in violations)
+    return pd.DataFrame(results, columns=['Team', 'Validity']),\
+        pd.DataFrame(violation_results, columns=['Team', 'Rule', 'Rows'])
+
+
 if __name__ == '__main__':
     if not DATA_DIR.exists():
         FileNotFoundError(f'"{DATA_DIR}" does not exist.')
     if not SUBMISSION_DIR.exists():
         FileNotFoundError(f'"{SUBMISSION_DIR}" does not exist.')
-    items = pd.read_csv(DATA_DIR / 'items.csv', sep='|', quoting=csv.QUOTE_NONE)
-    test_values = pd.read_csv(DATA_DIR / 'evaluation.csv', sep='|', quoting=csv.QUOTE_NONE)
+    items = load_data.load_items(DATA_DIR)
+    test_values = load_data.load_evaluation(DATA_DIR)
     submission_files = SUBMISSION_DIR.glob('**/*_recommendation.csv')
-    results = []
-    for submission_file in submission_files:
-        submission = pd.read_csv(submission_file, sep='|', quoting=csv.QUOTE_NONE, header=0,
-                                 decimal='.', encoding='utf-8', escapechar=None)
-        team_name = submission_file.stem.replace('_recommendation', '')
-        validity_status = check_submission_validity(submission=submission, test_values=test_values,
-                                                    valid_itemIDs=items['itemID'])
-        results.append({'Team': team_name, 'Validity': validity_status})
-    results = pd.DataFrame(results)
+    results, violations = check_submission_files(submission_files=submission_files, test_values=test_values,
+                                                  valid_itemIDs=items['itemID'])
     print(results)
+    if len(violations) > 0:
+        print(violations)
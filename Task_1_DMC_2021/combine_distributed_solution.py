@@ -3,22 +3,89 @@
 Script that first reads in manually filled-out selection files, having the format defined by
 "prepare_distributed_solution.py". Selection files tell whose team's solution to use for each item.
 Next, we read in the the automatically created recommendations of the teams and combine them based
-on the manual input.
+on the manual input. Selection files are ingested incrementally via "ingest_manual_files.py".
+Alternatively, the recommendations of any number of teams can be combined automatically by rank
+fusion (reciprocal rank fusion or Borda count, optionally with team weights). In manual mode, items
+without (valid) manual selection are reported and, only if a fallback method is set, get fused
+recommendations.
+Submissions are aligned by itemID (not by row position).
 """
 
 
-import csv
 import pathlib
+from typing import Optional, Sequence
 
 import numpy as np
 import pandas as pd
 
+import build_comparison_tables
 import check_submission_validity
+import ingest_manual_files
+import instrumentation
+import load_data
 
 
 SUBMISSION_DIR = pathlib.Path('data/')
 DATA_DIR = pathlib.Path('data/')  # needs to contain "evaluation.csv" and "items.csv"
 COMBINED_GROUPS = ['Baratheon', 'Targaryen']
+COMBINATION_METHOD = 'manual'  # 'manual' (selection files), 'rrf' (reciprocal rank fusion), or 'borda'
+TEAM_WEIGHTS = None  # weights for rank fusion, in order of "COMBINED_GROUPS"; None means equal weights
+RRF_K = 60  # constant of reciprocal rank fusion, dampens influence of high ranks
+FALLBACK_METHOD = None  # in manual mode, fusion ('rrf' or 'borda') for items without valid selection; None: no fallback
+
+
+# Return None if valid
+def check_selection_validity(selection_table: pd.DataFrame) -> Optional[str]:
+    if list(selection_table) != ['itemID', 'group']:
+        return 'Column names wrong.'
+    return None
+
+
+# Combine recommendations (dimensions: team, item, rank) of multiple teams for each item by rank
+# fusion: each recommended item gets a (weighted) score from each team recommending it, depending on
+# its rank there ("rrf": 1 / (RRF_K + rank), "borda": number of recommendations - rank + 1). Scores of
+# the same recommended item (from multiple teams or repeated by one team) are summed. Ties are
+# broken by first occurrence (team order, then rank). Missing recommendations are -1.
+@instrumentation.instrument()
+def fuse_recommendations(recommendations: np.ndarray, method: str = 'rrf',
+                         team_weights: Optional[Sequence[float]] = None) -> np.ndarray:
+    num_teams, num_items, num_recommendations = recommendations.shape
+    ranks = np.arange(1, num_recommendations + 1)
+    if method == 'rrf':
+        rank_scores = 1 / (RRF_K + ranks)
+    elif method == 'borda':
+        rank_scores = num_recommendations - ranks + 1
+    else:
+        raise ValueError(f'Unknown fusion method "{method}".')
+    team_weights = np.ones(num_teams) if team_weights is None else np.asarray(team_weights, dtype=float)
+    scores = team_weights[:, np.newaxis, np.newaxis] * rank_scores[np.newaxis, np.newaxis, :]
+    is_valid = recommendations >= 0
+    candidates = pd.DataFrame({
+        'item': np.broadcast_to(np.arange(num_items)[np.newaxis, :, np.newaxis], recommendations.shape)[is_valid],
+        'rec': recommendations[is_valid],
+        'score': np.broadcast_to(scores, recommendations.shape)[is_valid],
+        'order': np.broadcast_to((np.arange(num_teams)[:, np.newaxis, np.newaxis] * num_recommendations +
+                                  ranks[np.newaxis, np.newaxis, :]), recommendations.shape)[is_valid]
+    })
+    candidates = candidates.groupby(['item', 'rec'], as_index=False).agg({'score': 'sum', 'order': 'min'})
+    candidates = candidates.sort_values(['item', 'score', 'order'], ascending=[True, False, True])
+    candidates['rank'] = candidates.groupby('item').cumcount()
+    candidates = candidates[candidates['rank'] < num_recommendations]
+    fused_recommendations = np.full((num_items, num_recommendations), -1, dtype=np.int64)
+    fused_recommendations[candidates['item'], candidates['rank']] = candidates['rec']
+    return fused_recommendations
+
+
+# For each item, use the recommendations of the manually selected team. Selections are a Series with
+# the team per item in order of the items in "recommendations"; returns -1 for items without a
+# valid selection.
+@instrumentation.instrument()
+def select_recommendations(recommendations: np.ndarray, teams: Sequence[str], selections: pd.Series) -> np.ndarray:
+    team_idx = pd.Index(teams).get_indexer(selections)
+    selected_recommendations = np.full(recommendations.shape[1:], -1, dtype=np.int64)
+    is_selected = team_idx >= 0
+    selected_recommendations[is_selected] = recommendations[team_idx[is_selected], np.where(is_selected)[0]]
+    return selected_recommendations
 
 
 if __name__ == '__main__':
@@ -26,32 +93,46 @@ if __name__ == '__main__':
         FileNotFoundError(f'"{DATA_DIR}" does not exist.')
     if not SUBMISSION_DIR.exists():
         FileNotFoundError(f'"{SUBMISSION_DIR}" does not exist.')
-    items = pd.read_csv(DATA_DIR / 'items.csv', sep='|', quoting=csv.QUOTE_NONE)
-    test_values = pd.read_csv(DATA_DIR / 'evaluation.csv', sep='|')
-    # Read in manual selections:
-    selection_files = [x for x in SUBMISSION_DIR.glob('**/selection_*.csv') if 'template' not in x.name]
-    selection_tables = []
-    for selection_file in selection_files:
-        selection_table = pd.read_csv(selection_file, sep='|', quoting=csv.QUOTE_NONE, header=0,
-                                      decimal='.', encoding='utf-8', escapechar=None)
-        if not selection_table['group'].isin(COMBINED_GROUPS).all():
-            print(f'Selection file "{selection_file.stem}" contains invalid group names.')
-        selection_tables.append(selection_table)
-    selection_table = pd.concat(selection_tables)
-    # Read in submissions (recommendations) and extract those parts were they are best according
-    # to the manual selections:
-    submission = pd.DataFrame({'itemID': test_values['itemID']})
-    submission[[f'rec_{i + 1}' for i in range(5)]] = -1
-    submission_files = list(SUBMISSION_DIR.glob('**/*_recommendation.csv'))
-    for group in COMBINED_GROUPS:
-        group_submission_files = [x for x in submission_files if group in x.stem]
-        if len(group_submission_files) != 1:
-            FileNotFoundError(f'No or multiple prediction files for group {group}.')
-        group_submission = pd.read_csv(group_submission_files[0], sep='|', quoting=csv.QUOTE_NONE,
-                                       header=0, decimal='.', encoding='utf-8', escapechar=None)
-        select_group_idx = np.where(selection_table['group'] == group)[0]
-        submission.iloc[select_group_idx, 1:] = group_submission.iloc[select_group_idx, 1:]
+    items = load_data.load_items(DATA_DIR)
+    test_values = load_data.load_evaluation(DATA_DIR)
+    item_ids = test_values['itemID'].to_numpy()
+    # Read in submissions (recommendations), aligned by itemID, and fuse them:
+    submission_files = build_comparison_tables.find_submission_files(SUBMISSION_DIR, COMBINED_GROUPS)
+    recommendations = build_comparison_tables.load_submissions(submission_files, item_ids=item_ids)
+    if COMBINATION_METHOD != 'manual':
+        combined_recommendations = fuse_recommendations(recommendations, method=COMBINATION_METHOD,
+                                                        team_weights=TEAM_WEIGHTS)
+    else:
+        # Read in manual selections (only new or changed selection files are parsed):
+        connection = ingest_manual_files.open_store(SUBMISSION_DIR)
+        ingest_manual_files.ingest_files(connection, kind='selection', submission_dir=SUBMISSION_DIR,
+                                         validate=check_selection_validity)
+        for selection_file, validity_result in ingest_manual_files.get_invalid_files(connection, kind='selection'):
+            print(f'Selection file "{pathlib.Path(selection_file).stem}" is invalid because ' +
+                  f'"{validity_result}", will be ignored.')
+        selection_table = ingest_manual_files.get_selections(connection)
+        connection.close()
+        for selection_file in selection_table.loc[~selection_table['group'].isin(COMBINED_GROUPS), 'path'].unique():
+            print(f'Selection file "{pathlib.Path(selection_file).stem}" contains invalid group names.')
+        # Extract those parts of submissions where they are best according to the manual selections:
+        selections = selection_table.drop_duplicates('itemID', keep='last').set_index('itemID')['group']
+        combined_recommendations = select_recommendations(recommendations, teams=COMBINED_GROUPS,
+                                                          selections=selections.reindex(item_ids))
+        is_selected = (combined_recommendations >= 0).all(axis=1)  # selected team might miss recommendations
+        if (~is_selected).any():
+            print(f'Items without valid manual selection (or with less than 5 selected recommendations): ' +
+                  f'{item_ids[~is_selected].tolist()}')
+        if (~is_selected).any() and FALLBACK_METHOD is not None:
+            print(f'These items get fused recommendations ("{FALLBACK_METHOD}").')
+            combined_recommendations[~is_selected] = fuse_recommendations(
+                recommendations[:, ~is_selected], method=FALLBACK_METHOD, team_weights=TEAM_WEIGHTS)
+    num_incomplete_items = (combined_recommendations < 0).any(axis=1).sum()
+    if num_incomplete_items > 0:
+        print(f'{num_incomplete_items} items have less than 5 distinct recommendations (filled with -1).')
+    submission = pd.DataFrame({'itemID': item_ids.astype('int64')})  # as in read submissions
+    submission[[f'rec_{i + 1}' for i in range(5)]] = combined_recommendations
     # Check and save final submission:
     print(check_submission_validity.check_submission_validity(
         submission=submission, test_values=test_values, valid_itemIDs=items['itemID']))
-    submission.to_csv(SUBMISSION_DIR / 'IT_Karlsruhe_1.csv', sep='|', index=False)
+    with instrumentation.stage('write_submission', rows=len(submission)):
+        submission.to_csv(SUBMISSION_DIR / 'IT_Karlsruhe_1.csv', sep='|', index=False)
@@ -0,0 +1,93 @@
+"""Compute item neighbors
+
+Script which precomputes the top co-occurring items ("neighbors") for every item in the catalog
+("items.csv"), using the scoring from "recommend_cooccurring_favorites.py". As a dense item-item
+matrix does not fit into memory, items are processed in blocks of rows, distributed over a process
+pool. Each block is written to a fixed-width binary table (NumPy structured array in a ".npy" file)
+as soon as it is finished, so the result can be memory-mapped later with "load_item_neighbors()".
+Items without co-occurring items have neighbor id -1 and score NaN.
+"""
+
+import multiprocessing
+import pathlib
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import tqdm
+
+import instrumentation
+import load_data
+import recommend_cooccurring_favorites
+
+
+DATA_DIR = pathlib.Path('data/')  # needs to contain "items.csv" and "transactions.csv"
+OUTPUT_DIR = pathlib.Path('data/')
+NUM_NEIGHBORS = 5
+BLOCK_SIZE = 2000  # number of items per block; determines peak memory of each worker
+NUM_PROCESSES = None  # None means one process per core
+
+_worker_matrices = None  # co-occurrence matrices, set once per worker process by initializer
+
+
+# Data type of one row of the on-disk neighbor table.
+def get_neighbor_dtype(num_neighbors: int = NUM_NEIGHBORS) -> np.dtype:
+    return np.dtype([('itemID', '<i4'), ('neighbors', '<i4', (num_neighbors,)),
+                     ('scores', '<f4', (num_neighbors,))])
+
+
+# Memory-map a neighbor table created by "compute_item_neighbors()".
+def load_item_neighbors(path: pathlib.Path) -> np.ndarray:
+    return np.load(path, mmap_mode='r')
+
+
+def _init_worker(matrices: Tuple) -> None:
+    global _worker_matrices
+    _worker_matrices = matrices
+
+
+def _compute_block(block: Tuple[int, np.ndarray, int]) -> Tuple[int, np.ndarray, np.ndarray, float]:
+    start, block_item_ids, num_neighbors = block
+    start_time = time.perf_counter()
+    item_session_matrix, popularity_matrix, matrix_item_ids = _worker_matrices
+    neighbors, scores = recommend_cooccurring_favorites.get_top_cooccurring_items(
+        block_item_ids, item_session_matrix=item_session_matrix, popularity_matrix=popularity_matrix,
+        matrix_item_ids=matrix_item_ids, num_items=num_neighbors)
+    return start, neighbors, scores, time.perf_counter() - start_time
+
+
+# Compute neighbors of all "item_ids" in parallel and write them to "output_path" block by block.
+# Return one row of timing information per block.
+@instrumentation.instrument()
+def compute_item_neighbors(item_ids: np.ndarray, transactions: pd.DataFrame, output_path: pathlib.Path,
+                           num_neighbors: int = NUM_NEIGHBORS, block_size: int = BLOCK_SIZE,
+                           num_processes: Optional[int] = NUM_PROCESSES) -> pd.DataFrame:
+    matrices = recommend_cooccurring_favorites.build_cooccurrence_matrices(transactions)
+    neighbor_table = np.lib.format.open_memmap(output_path, mode='w+', dtype=get_neighbor_dtype(num_neighbors),
+                                               shape=(len(item_ids),))
+    neighbor_table['itemID'] = item_ids
+    blocks = [(start, item_ids[start:(start + block_size)], num_neighbors)
+              for start in range(0, len(item_ids), block_size)]
+    timings = []
+    with multiprocessing.Pool(processes=num_processes, initializer=_init_worker, initargs=(matrices,)) as pool:
+        progress_bar = tqdm.tqdm(pool.imap_unordered(_compute_block, blocks), total=len(blocks))
+        for start, neighbors, scores, duration in progress_bar:
+            neighbor_table['neighbors'][start:(start + len(neighbors))] = neighbors
+            neighbor_table['scores'][start:(start + len(neighbors))] = scores
+            timings.append({'block_start': start, 'block_items': len(neighbors), 'block_time': duration})
+            progress_bar.set_postfix(last_block_time=f'{duration:.2f}s')
+    neighbor_table.flush()
+    del neighbor_table
+    return pd.DataFrame(timings).sort_values('block_start', ignore_index=True)
+
+
+if __name__ == '__main__':
+    items = load_data.load_items(DATA_DIR)
+    transactions = load_data.load_transactions(DATA_DIR)
+    start_time = time.perf_counter()
+    timings = compute_item_neighbors(item_ids=items['itemID'].to_numpy(), transactions=transactions,
+                                     output_path=OUTPUT_DIR / 'item_neighbors.npy')
+    print(f'Computed neighbors of {len(items)} items in {time.perf_counter() - start_time:.2f}s.')
+    print(timings['block_time'].describe())
+    timings.to_csv(OUTPUT_DIR / 'item_neighbors_timing.csv', sep='|', index=False)
@@ -2,14 +2,17 @@
 
 Reads manual scoring files having the format from "prepare_manual_scoring.py", checks their validity,
 and combines them to compute avergae scores.
+Files are ingested incrementally via "ingest_manual_files.py", i.e., only new or changed files are
+parsed and checked; average scores are computed from running per-team aggregates.
 """
 
-import csv
 import pathlib
 from typing import Optional
 
 import pandas as pd
 
+import ingest_manual_files
+import instrumentation
 import prepare_manual_scoring
 
 
@@ -38,16 +41,16 @@ def check_scoring_validity(scoring_table: pd.DataFrame) -> Optional[str]:
 if __name__ == '__main__':
     if not SUBMISSION_DIR.exists():
         FileNotFoundError(f'"{SUBMISSION_DIR}" does not exist.')
-    scoring_files = SUBMISSION_DIR.glob('**/*_scoring.csv')
-    scoring_tables = []
-    for scoring_file in scoring_files:
-        scoring_table = pd.read_csv(scoring_file, sep='|', quoting=csv.QUOTE_NONE, header=0,
-                                    decimal='.', encoding='utf-8', escapechar=None)
-        validity_result = check_scoring_validity(scoring_table)
-        if validity_result is not None:
-            print(f'Scoring file "{scoring_file.stem}" is invalid because "{validity_result}", ' +
-                  'will be ignored.')
-            continue
-        scoring_tables.append(scoring_table)
-    scoring_table = pd.concat(scoring_tables)
-    print(scoring_table.groupby('team')['scoring'].mean().sort_values(ascending=False).to_frame())
+    connection = ingest_manual_files.open_store(SUBMISSION_DIR)
+    with instrumentation.stage('load_scorings'):
+        ingest_manual_files.ingest_files(connection, kind='scoring', submission_dir=SUBMISSION_DIR,
+                                         validate=check_scoring_validity,
+                                         validation_config={'num_items': prepare_manual_scoring.NUM_ITEMS})
+    for scoring_file, validity_result in ingest_manual_files.get_invalid_files(connection, kind='scoring'):
+        print(f'Scoring file "{pathlib.Path(scoring_file).stem}" is invalid because "{validity_result}", ' +
+              'will be ignored.')
+    with instrumentation.stage('aggregate_scores') as measurement:
+        team_scores = ingest_manual_files.get_team_scores(connection)
+        measurement['rows'] = len(team_scores)
+    print(team_scores)
+    connection.close()
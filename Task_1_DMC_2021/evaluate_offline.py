@@ -0,0 +1,122 @@
+"""Evaluate offline
+
+Automatic offline evaluation of recommendations, as a quick complement to the manual scoring.
+We randomly split the sessions of the transactions into training and holdout sessions.
+Each item occurring in a holdout session together with other items becomes an evaluation item;
+its relevant items are the items it co-occurs with in holdout sessions. Recommendations for the
+evaluation items (from a recommender function trained on the training sessions, or from a
+submission file) are scored with hit rate, mean reciprocal rank (MRR), and NDCG, all computed
+vectorized over the evaluation items.
+Submission files were usually created with the full transactions (including holdout sessions), so
+their scores are optimistic and only comparable among each other.
+"""
+
+import pathlib
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+import check_submission_validity
+import instrumentation
+import load_data
+import recommend_cooccurring_favorites
+import recommend_global_favorites
+import recommend_similar_items
+
+
+SUBMISSION_DIR = pathlib.Path('data/')
+DATA_DIR = pathlib.Path('data/')  # needs to contain "items.csv" and "transactions.csv"
+HOLDOUT_FRACTION = 0.2  # fraction of sessions used for evaluation
+NUM_RECOMMENDATIONS = 5  # metrics consider the top "NUM_RECOMMENDATIONS" recommendations
+SEED = 25  # random seed for splitting sessions
+
+
+# Randomly assign sessions to training and holdout set, return corresponding transactions.
+@instrumentation.instrument()
+def split_transactions(transactions: pd.DataFrame, holdout_fraction: float = HOLDOUT_FRACTION,
+                       seed: int = SEED) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    session_ids = transactions['sessionID'].unique()
+    holdout_session_ids = pd.Series(session_ids).sample(frac=holdout_fraction, replace=False, random_state=seed)
+    is_holdout = transactions['sessionID'].isin(holdout_session_ids)
+    return transactions[~is_holdout].reset_index(drop=True), transactions[is_holdout].reset_index(drop=True)
+
+
+# Create all pairs of (evaluation) item and relevant item, i.e., items co-occurring in a session.
+@instrumentation.instrument()
+def get_relevant_pairs(holdout_transactions: pd.DataFrame) -> pd.DataFrame:
+    session_items = holdout_transactions[['sessionID', 'itemID']].drop_duplicates()
+    relevant_pairs = session_items.merge(session_items.rename(columns={'itemID': 'relevant_itemID'}))
+    relevant_pairs = relevant_pairs[relevant_pairs['itemID'] != relevant_pairs['relevant_itemID']]
+    return relevant_pairs[['itemID', 'relevant_itemID']].drop_duplicates().sort_values(
+        ['itemID', 'relevant_itemID'], ignore_index=True)
+
+
+# Compute hit rate, MRR, and NDCG (binary relevance) for all recommendations whose itemID occurs in
+# the relevant pairs; recommendations for other items are ignored.
+@instrumentation.instrument()
+def compute_metrics(recommendations: pd.DataFrame, relevant_pairs: pd.DataFrame,
+                    num_recommendations: int = NUM_RECOMMENDATIONS) -> Dict[str, float]:
+    recommendations = recommendations[recommendations['itemID'].isin(relevant_pairs['itemID'])]
+    rec_item_ids = recommendations[[f'rec_{i + 1}' for i in range(num_recommendations)]].to_numpy(dtype=np.int64)
+    query_item_ids = recommendations['itemID'].to_numpy(dtype=np.int64)
+    # Encode pairs of item ids as single integers to check relevance with one vectorized lookup:
+    key_base = max(rec_item_ids.max(initial=0), relevant_pairs['relevant_itemID'].max()) + 1
+    relevant_keys = relevant_pairs['itemID'].to_numpy(dtype=np.int64) * key_base +\
+        relevant_pairs['relevant_itemID'].to_numpy(dtype=np.int64)
+    is_hit = np.isin(query_item_ids[:, np.newaxis] * key_base + rec_item_ids, relevant_keys)
+    is_hit &= (rec_item_ids >= 0)
+    # Count each relevant item only once, even if recommended multiple times:
+    is_earlier_duplicate = ((rec_item_ids[:, :, np.newaxis] == rec_item_ids[:, np.newaxis, :]) &
+                            np.tri(num_recommendations, k=-1, dtype=bool)).any(axis=2)
+    is_hit &= ~is_earlier_duplicate
+    num_relevant = relevant_pairs.groupby('itemID').size().reindex(query_item_ids).to_numpy()
+    discounts = 1 / np.log2(np.arange(2, num_recommendations + 2))
+    ideal_dcg = np.cumsum(discounts)[np.minimum(num_relevant, num_recommendations) - 1]
+    first_hit_rank = np.where(is_hit.any(axis=1), is_hit.argmax(axis=1) + 1, np.inf)
+    return {'num_items': len(query_item_ids),
+            f'hit_rate@{num_recommendations}': is_hit.any(axis=1).mean(),
+            'mrr': (1 / first_hit_rank).mean(),
+            f'ndcg@{num_recommendations}': ((is_hit @ discounts) / ideal_dcg).mean()}
+
+
+# Train a recommender function (taking evaluation items and training transactions, returning
+# recommendations in submission format) and evaluate it.
+@instrumentation.instrument()
+def evaluate_recommender(recommender: Callable[[pd.DataFrame, pd.DataFrame], pd.DataFrame],
+                         train_transactions: pd.DataFrame, relevant_pairs: pd.DataFrame) -> Dict[str, float]:
+    evaluation = pd.DataFrame({'itemID': relevant_pairs['itemID'].unique()})
+    return compute_metrics(recommender(evaluation, train_transactions), relevant_pairs=relevant_pairs)
+
+
+def recommend_global_favorites_offline(evaluation: pd.DataFrame, transactions: pd.DataFrame) -> pd.DataFrame:
+    top_items = recommend_global_favorites.count_items([transactions]).get_top_items()
+    return recommend_global_favorites.recommend_globally(evaluation=evaluation, top_items=top_items)
+
+
+def recommend_cooccurring_favorites_offline(evaluation: pd.DataFrame, transactions: pd.DataFrame) -> pd.DataFrame:
+    return recommend_cooccurring_favorites.recommend_batchwise(
+        evaluation=evaluation, transactions=transactions,
+        similarity_index=recommend_similar_items.get_similarity_index(DATA_DIR))
+
+
+RECOMMENDERS = {'global-favorites': recommend_global_favorites_offline,
+                'cooccurring-favorites': recommend_cooccurring_favorites_offline}
+
+
+if __name__ == '__main__':
+    if not SUBMISSION_DIR.exists():
+        FileNotFoundError(f'"{SUBMISSION_DIR}" does not exist.')
+    transactions = load_data.load_transactions(DATA_DIR)
+    train_transactions, holdout_transactions = split_transactions(transactions)
+    relevant_pairs = get_relevant_pairs(holdout_transactions)
+    results = []
+    for recommender_name, recommender in RECOMMENDERS.items():
+        metrics = evaluate_recommender(recommender=recommender, train_transactions=train_transactions,
+                                       relevant_pairs=relevant_pairs)
+        results.append({'Recommender': recommender_name, **metrics})
+    for submission_file in SUBMISSION_DIR.glob('**/*_recommendation.csv'):
+        submission = check_submission_validity.read_submission(submission_file)
+        metrics = compute_metrics(submission, relevant_pairs=relevant_pairs)
+        results.append({'Recommender': submission_file.stem.replace('_recommendation', ''), **metrics})
+    print(pd.DataFrame(results))
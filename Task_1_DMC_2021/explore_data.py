@@ -4,16 +4,21 @@ Code snippets for interactively (e.g., in an IDE) exploring the data. Not optimi
 execution on a console (and Jakob was too lazy to create a notebook with textual interpretation).
 """
 
-import csv
-
+import numpy as np
 import pandas as pd
 
+import instrumentation
+import load_data
+import session_index
+
 
-# Load data
-# unnecessary options (default or recognized): header=0, decimal='.', encoding='utf-8', escapechar=None
-evaluation = pd.read_csv('data/evaluation.csv')
-items = pd.read_csv('data/items.csv', sep='|', quoting=csv.QUOTE_NONE)
-transactions = pd.read_csv('data/transactions.csv', sep='|')
+# Load data (parsing options and data types are defined in "load_data")
+with instrumentation.stage('load_data') as measurement:
+    evaluation = load_data.load_evaluation()
+    items = load_data.load_items()
+    transactions = load_data.load_transactions()
+    index = session_index.get_session_index()  # session -> items and item -> sessions, without scanning transactions
+    measurement['rows'] = len(transactions)
 assert len(evaluation) == 1000  # compare to number of lines in file (minus header)
 assert len(items) == 78334
 assert len(transactions) == 365143
@@ -34,8 +39,15 @@ transactions.head()
 transactions.dtypes
 transactions.nunique()
 assert len(transactions.groupby(['sessionID', 'itemID']).size().value_counts()) == 1  # check id
-transactions.groupby('sessionID').size().value_counts()
-transactions.groupby('itemID').size().value_counts()
+with instrumentation.stage('aggregate_sizes'):
+    session_sizes = np.diff(index['session_offsets'])
+    session_size_counts = pd.Series(session_sizes[session_sizes > 0]).value_counts()  # items per session
+    item_sizes = np.diff(index['item_offsets'])
+    item_size_counts = pd.Series(item_sizes[item_sizes > 0]).value_counts()  # sessions per item
+session_size_counts
+item_size_counts
+session_index.get_session_items(index, session_id=transactions['sessionID'].iloc[0])  # items and counts
+session_index.get_item_sessions(index, item_id=transactions['itemID'].iloc[0])  # sessions and counts
 transactions.drop(columns=['itemID', 'sessionID']).describe()
 transactions.groupby('click').size()
 transactions.groupby('basket').size()
@@ -0,0 +1,154 @@
+"""Ingest manual files
+
+Incremental ingestion of the manually filled-out files, i.e., scoring files (format from
+"prepare_manual_scoring.py") and selection files (format from "prepare_distributed_solution.py"),
+into a local SQLite database in the submission directory. Files are tracked by path and content
+hash; only new or changed files are parsed (and validated), files whose modification time and size
+did not change are not even hashed. As validity verdicts are stored, all files are re-validated if
+the validation (source code of the validation function or its configuration) changed. For scoring
+files, running sums and counts of the scores per team are maintained, so average scores can be
+queried without touching the individual scores.
+Used by "evaluate_manual_scoring.py" and "combine_distributed_solution.py".
+"""
+
+import csv
+import hashlib
+import inspect
+import json
+import pathlib
+import sqlite3
+from typing import Any, Callable, List, Optional, Tuple, Union
+
+import pandas as pd
+
+import instrumentation
+import load_data
+
+
+SUBMISSION_DIR = pathlib.Path('data/')
+STORE_FILE_NAME = 'manual_files.sqlite'  # stored in submission directory
+# File pattern, table, and columns of each kind of file:
+FILE_KINDS = {
+    'scoring': {'pattern': '**/*_scoring.csv', 'table': 'scorings', 'columns': ['itemID', 'team', 'scoring']},
+    'selection': {'pattern': '**/selection_*.csv', 'table': 'selections', 'columns': ['itemID', 'group']}
+}
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, kind TEXT NOT NULL, mtime_ns INTEGER NOT NULL,
+                                  size INTEGER NOT NULL, sha256 TEXT NOT NULL, validity TEXT, validation_key TEXT);
+CREATE TABLE IF NOT EXISTS scorings (path TEXT NOT NULL, itemID INTEGER, team TEXT, scoring INTEGER);
+CREATE INDEX IF NOT EXISTS scorings_path ON scorings (path);
+CREATE TABLE IF NOT EXISTS selections (path TEXT NOT NULL, itemID INTEGER, "group" TEXT);
+CREATE INDEX IF NOT EXISTS selections_path ON selections (path);
+CREATE TABLE IF NOT EXISTS team_scores (team TEXT PRIMARY KEY, scoring_sum INTEGER NOT NULL,
+                                        num_scorings INTEGER NOT NULL);
+'''
+
+
+def open_store(submission_dir: Union[str, pathlib.Path] = SUBMISSION_DIR) -> sqlite3.Connection:
+    connection = sqlite3.connect(pathlib.Path(submission_dir) / STORE_FILE_NAME)
+    connection.executescript(SCHEMA)
+    if 'validation_key' not in [x[1] for x in connection.execute('PRAGMA table_info(files)')]:  # older store
+        connection.execute('ALTER TABLE files ADD COLUMN validation_key TEXT')  # NULL, so files are re-validated
+    return connection
+
+
+# Fingerprint of the validation of files, i.e., of the source code of the validation function (its
+# bytecode if defined interactively) and of the configuration it depends on (e.g., constants it uses;
+# needs to be JSON-serializable).
+def get_validation_key(validate: Optional[Callable[[pd.DataFrame], Optional[str]]],
+                       validation_config: Any = None) -> str:
+    source = None
+    if validate is not None:
+        try:
+            source = inspect.getsource(validate)
+        except (OSError, TypeError):  # source not available
+            source = validate.__code__.co_code.hex()
+    validation = {'source': source, 'config': validation_config}
+    return hashlib.sha256(json.dumps(validation, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+# Add (sign = 1) or subtract (sign = -1) the scores from one scoring file to/from the per-team sums.
+def _update_team_scores(connection: sqlite3.Connection, path: str, sign: int) -> None:
+    file_team_scores = connection.execute(
+        'SELECT team, SUM(scoring), COUNT(*) FROM scorings WHERE path = ? GROUP BY team', (path,)).fetchall()
+    connection.executemany(
+        '''INSERT INTO team_scores VALUES (?, ?, ?) ON CONFLICT (team) DO UPDATE SET
+           scoring_sum = scoring_sum + excluded.scoring_sum, num_scorings = num_scorings + excluded.num_scorings''',
+        [(team, sign * scoring_sum, sign * num_scorings) for team, scoring_sum, num_scorings in file_team_scores])
+
+
+# Remove all information about one file from the store.
+def _remove_file(connection: sqlite3.Connection, path: str, kind: str) -> None:
+    if kind == 'scoring':
+        _update_team_scores(connection, path=path, sign=-1)
+    connection.execute(f'DELETE FROM {FILE_KINDS[kind]["table"]} WHERE path = ?', (path,))
+    connection.execute('DELETE FROM files WHERE path = ?', (path,))
+
+
+# Bring the store up-to-date with the files of one kind ("scoring" or "selection") in the submission
+# directory: parse, validate (with "validate", returning None if valid, else an error message), and
+# store new or changed files, remove deleted files. Files are also re-validated if the validation
+# changed ("validation_config" should contain all settings "validate" depends on besides its code).
+# Return paths of (re-)parsed files.
+@instrumentation.instrument()
+def ingest_files(connection: sqlite3.Connection, kind: str,
+                 submission_dir: Union[str, pathlib.Path] = SUBMISSION_DIR,
+                 validate: Optional[Callable[[pd.DataFrame], Optional[str]]] = None,
+                 validation_config: Any = None) -> List[str]:
+    file_kind = FILE_KINDS[kind]
+    files = {str(x): x for x in sorted(pathlib.Path(submission_dir).glob(file_kind['pattern']))
+             if 'template' not in x.name}
+    validation_key = get_validation_key(validate, validation_config)
+    stored_files = {path: (mtime_ns, size, sha256, is_validated) for path, mtime_ns, size, sha256, is_validated in
+                    connection.execute('SELECT path, mtime_ns, size, sha256, validation_key = ? FROM files ' +
+                                       'WHERE kind = ?', (validation_key, kind))}
+    ingested_paths = []
+    with connection:  # one transaction
+        for path in stored_files.keys() - files.keys():
+            _remove_file(connection, path=path, kind=kind)
+        for path, file in files.items():
+            file_stat = file.stat()
+            if path in stored_files:
+                mtime_ns, size, sha256, is_validated = stored_files[path]
+                if is_validated and (mtime_ns == file_stat.st_mtime_ns) and (size == file_stat.st_size):
+                    continue
+                file_hash = load_data.compute_file_hash(file)
+                if is_validated and (size == file_stat.st_size) and (sha256 == file_hash):
+                    connection.execute('UPDATE files SET mtime_ns = ? WHERE path = ?', (file_stat.st_mtime_ns, path))
+                    continue
+                _remove_file(connection, path=path, kind=kind)
+            else:
+                file_hash = load_data.compute_file_hash(file)
+            table = pd.read_csv(file, sep='|', quoting=csv.QUOTE_NONE, header=0, decimal='.',
+                                encoding='utf-8', escapechar=None)
+            validity = None if validate is None else validate(table)
+            connection.execute('INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?)', (
+                path, kind, file_stat.st_mtime_ns, file_stat.st_size, file_hash, validity, validation_key))
+            if validity is None:
+                columns = ', '.join(f'"{column}"' for column in file_kind['columns'])
+                placeholders = ', '.join('?' * (len(file_kind['columns']) + 1))
+                connection.executemany(
+                    f'INSERT INTO {file_kind["table"]} (path, {columns}) VALUES ({placeholders})',
+                    zip([path] * len(table), *[table[column].tolist() for column in file_kind['columns']]))
+                if kind == 'scoring':
+                    _update_team_scores(connection, path=path, sign=1)
+            ingested_paths.append(path)
+    return ingested_paths
+
+
+# Return paths and error messages of all stored files of one kind that are invalid.
+def get_invalid_files(connection: sqlite3.Connection, kind: str) -> List[Tuple[str, str]]:
+    return connection.execute('SELECT path, validity FROM files WHERE kind = ? AND validity IS NOT NULL ' +
+                              'ORDER BY path', (kind,)).fetchall()
+
+
+# Return average score per team (over all valid scoring files), sorted descendingly.
+def get_team_scores(connection: sqlite3.Connection) -> pd.DataFrame:
+    return pd.read_sql('SELECT team, CAST(scoring_sum AS REAL) / num_scorings AS scoring FROM team_scores ' +
+                       'WHERE num_scorings > 0 ORDER BY scoring DESC', connection, index_col='team')
+
+
+# Return all selections (itemID, group, and path of the selection file), ordered by file path.
+def get_selections(connection: sqlite3.Connection) -> pd.DataFrame:
+    return pd.read_sql('SELECT itemID, "group", path FROM selections ORDER BY path, rowid', connection)
+
@@ -0,0 +1,13 @@
+"""Instrumentation
+
+Opt-in measurement of named stages of the scripts. The implementation is shared by both tasks and
+lives in the top-level folder of the repo ("ds_lab_instrumentation.py", which also describes how
+to enable it); this module makes it importable from the task folder.
+"""
+
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parent.parent))  # top-level folder of repo
+
+from ds_lab_instrumentation import instrument, stage  # noqa: E402,F401
@@ -0,0 +1,118 @@
+"""Load data
+
+Shared loading code for the three DMC files ("items.csv", "transactions.csv", "evaluation.csv").
+Each CSV is parsed only once, with explicit compact data types, and then stored in a binary
+columnar cache (uncompressed Feather/Arrow files in a sub-directory of the data directory), which
+loads much faster than parsing the CSV. Loading still converts the whole table into a pandas data
+frame in memory, i.e., it is a fast cache, not a zero-copy view. A cached table is re-built if its
+CSV changed, which we detect via modification time and file size, falling back to a content hash
+if only the former changed.
+Cache files are written to a temporary file first and then moved into place, so several scripts
+can share (and build) the cache concurrently.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import pathlib
+from typing import Any, Callable, Dict, Union
+
+import pandas as pd
+import pyarrow.feather
+
+import instrumentation
+
+
+DATA_DIR = pathlib.Path('data/')  # needs to contain "evaluation.csv", "items.csv", and "transactions.csv"
+CACHE_DIR_NAME = 'cache'  # sub-directory of data directory
+# Options for parsing each CSV, in particular data types:
+READ_OPTIONS = {
+    'items': {'sep': '|', 'quoting': csv.QUOTE_NONE, 'dtype': {
+        'itemID': 'int32', 'title': 'object', 'author': 'category', 'publisher': 'category',
+        'main topic': 'category', 'subtopics': 'category'}},
+    'transactions': {'sep': '|', 'quoting': csv.QUOTE_NONE, 'dtype': {
+        'sessionID': 'int32', 'itemID': 'int32', 'click': 'int32', 'basket': 'int32', 'order': 'int32'}},
+    'evaluation': {'sep': '|', 'quoting': csv.QUOTE_NONE, 'dtype': {'itemID': 'int32'}}
+}
+
+
+# Compute SHA-256 hash of a file's content, reading the file in blocks.
+def compute_file_hash(path: pathlib.Path, block_size: int = 2 ** 20) -> str:
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+# Write a file with "write_function" (taking the path to write to) to a temporary file, which then
+# replaces "path" atomically, so concurrent readers never see partially written files.
+def write_atomically(path: pathlib.Path, write_function: Callable[[pathlib.Path], Any]) -> None:
+    temp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')  # unique for concurrent writers
+    try:
+        write_function(temp_path)
+        os.replace(temp_path, path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
+# Meta-data for detecting changes of a source file (get it before reading the file, so changes
+# during reading will invalidate the cache).
+def get_file_meta_data(path: pathlib.Path) -> Dict[str, Any]:
+    stat = path.stat()
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': compute_file_hash(path)}
+
+
+# Check whether the cached version of a source file (e.g., a CSV) is up-to-date (might update the
+# cache's meta-data). Changed files are detected via modification time and size; if only the
+# modification time changed, via content hash.
+def is_cache_valid(source_path: pathlib.Path, cache_path: pathlib.Path, meta_path: pathlib.Path) -> bool:
+    if not cache_path.exists() or not meta_path.exists():
+        return False
+    with open(meta_path) as meta_file:
+        meta_data = json.load(meta_file)
+    source_stat = source_path.stat()
+    if (meta_data['mtime_ns'] == source_stat.st_mtime_ns) and (meta_data['size'] == source_stat.st_size):
+        return True
+    if (meta_data['size'] != source_stat.st_size) or (meta_data['sha256'] != compute_file_hash(source_path)):
+        return False
+    meta_data['mtime_ns'] = source_stat.st_mtime_ns  # content unchanged, so avoid hashing next time
+    write_atomically(meta_path, lambda x: x.write_text(json.dumps(meta_data)))
+    return True
+
+
+# Load one of the tables, i.e., "items", "transactions", or "evaluation", from the cache if it is
+# up-to-date, else from the CSV (and then cache it). Either way, the table is fully in memory.
+def load_table(name: str, data_dir: Union[str, pathlib.Path] = DATA_DIR, use_cache: bool = True) -> pd.DataFrame:
+    data_dir = pathlib.Path(data_dir)
+    csv_path = data_dir / f'{name}.csv'
+    if not csv_path.exists():
+        raise FileNotFoundError(f'"{csv_path}" does not exist.')
+    if not use_cache:
+        return pd.read_csv(csv_path, **READ_OPTIONS[name])
+    cache_path = data_dir / CACHE_DIR_NAME / f'{name}.feather'
+    meta_path = data_dir / CACHE_DIR_NAME / f'{name}.json'
+    if is_cache_valid(source_path=csv_path, cache_path=cache_path, meta_path=meta_path):
+        return pyarrow.feather.read_table(cache_path, memory_map=True).to_pandas()
+    meta_data = get_file_meta_data(csv_path)
+    table = pd.read_csv(csv_path, **READ_OPTIONS[name])
+    cache_path.parent.mkdir(exist_ok=True)
+    write_atomically(cache_path, lambda x: pyarrow.feather.write_feather(table, x, compression='uncompressed'))
+    write_atomically(meta_path, lambda x: x.write_text(json.dumps(meta_data)))
+    return table
+
+
+@instrumentation.instrument()
+def load_items(data_dir: Union[str, pathlib.Path] = DATA_DIR) -> pd.DataFrame:
+    return load_table(name='items', data_dir=data_dir)
+
+
+@instrumentation.instrument()
+def load_transactions(data_dir: Union[str, pathlib.Path] = DATA_DIR) -> pd.DataFrame:
+    return load_table(name='transactions', data_dir=data_dir)
+
+
+@instrumentation.instrument()
+def load_evaluation(data_dir: Union[str, pathlib.Path] = DATA_DIR) -> pd.DataFrame:
+    return load_table(name='evaluation', data_dir=data_dir)
@@ -0,0 +1,111 @@
+"""Load test recommendations
+
+Script which measures latency and throughput of "serve_recommendations.py": first of in-process
+lookups (single items and bulk), then of the HTTP endpoint, which is started in a background thread
+and queried by several client threads with persistent connections. Query items are sampled from the
+evaluation items, plus some unknown items to exercise the fallback. Reports p50/p99 latency and
+requests per second.
+"""
+
+import concurrent.futures
+import http.client
+import pathlib
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+import load_data
+import serve_recommendations
+
+
+DATA_DIR = pathlib.Path('data/')  # needs to contain "evaluation.csv"
+SUBMISSION_PATH = serve_recommendations.SUBMISSION_PATH
+NUM_REQUESTS = 10000  # per measurement
+BULK_SIZE = 100  # items per bulk request
+NUM_CLIENTS = 8  # concurrent HTTP clients
+UNKNOWN_FRACTION = 0.01  # fraction of queries for items not in the submission
+SEED = 25
+
+
+# Summarize latencies (in seconds) of requests that ran during "total_time" seconds.
+def summarize(name: str, latencies: List[float], total_time: float) -> Dict[str, float]:
+    return {'measurement': name, 'num_requests': len(latencies),
+            'p50_us': np.percentile(latencies, 50) * 1e6, 'p99_us': np.percentile(latencies, 99) * 1e6,
+            'requests_per_s': len(latencies) / total_time}
+
+
+@instrumentation.instrument()
+def measure_in_process(lookup: serve_recommendations.RecommendationLookup,
+                       query_item_ids: np.ndarray) -> List[Dict[str, float]]:
+    results = []
+    latencies = []
+    start_time = time.perf_counter()
+    for item_id in query_item_ids.tolist():
+        request_start_time = time.perf_counter()
+        lookup.lookup(item_id)
+        latencies.append(time.perf_counter() - request_start_time)
+    results.append(summarize('in-process single', latencies, time.perf_counter() - start_time))
+    latencies = []
+    start_time = time.perf_counter()
+    for batch_start in range(0, len(query_item_ids), BULK_SIZE):
+        request_start_time = time.perf_counter()
+        lookup.lookup_many(query_item_ids[batch_start:batch_start + BULK_SIZE])
+        latencies.append(time.perf_counter() - request_start_time)
+    results.append(summarize(f'in-process bulk ({BULK_SIZE})', latencies, time.perf_counter() - start_time))
+    return results
+
+
+# Send all "paths" as GET requests over one persistent connection, return latencies.
+def _run_client(host: str, port: int, paths: List[str]) -> List[float]:
+    connection = http.client.HTTPConnection(host, port)
+    latencies = []
+    for path in paths:
+        request_start_time = time.perf_counter()
+        connection.request('GET', path)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - request_start_time)
+        if response.status != 200:
+            raise RuntimeError(f'Request "{path}" failed with status {response.status}.')
+    connection.close()
+    return latencies
+
+
+@instrumentation.instrument()
+def measure_http(host: str, port: int, query_item_ids: np.ndarray) -> List[Dict[str, float]]:
+    results = []
+    single_paths = [f'/recommendations?itemID={x}' for x in query_item_ids]
+    bulk_paths = ['/recommendations?itemID=' + ','.join(map(str, query_item_ids[i:i + BULK_SIZE]))
+                  for i in range(0, len(query_item_ids), BULK_SIZE)]
+    for name, paths in [('http single', single_paths), (f'http bulk ({BULK_SIZE})', bulk_paths)]:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=NUM_CLIENTS) as executor:
+            start_time = time.perf_counter()
+            client_latencies = executor.map(_run_client, [host] * NUM_CLIENTS, [port] * NUM_CLIENTS,
+                                            [paths[i::NUM_CLIENTS] for i in range(NUM_CLIENTS)])
+            latencies = [latency for latencies in client_latencies for latency in latencies]
+            results.append(summarize(f'{name}, {NUM_CLIENTS} clients', latencies, time.perf_counter() - start_time))
+    return results
+
+
+if __name__ == '__main__':
+    if not SUBMISSION_PATH.exists():
+        raise FileNotFoundError(f'"{SUBMISSION_PATH}" does not exist.')
+    rng = np.random.default_rng(SEED)
+    evaluation_item_ids = load_data.load_evaluation(DATA_DIR)['itemID'].to_numpy()
+    query_item_ids = rng.choice(evaluation_item_ids, size=NUM_REQUESTS, replace=True).astype(np.int64)
+    is_unknown = rng.random(NUM_REQUESTS) < UNKNOWN_FRACTION
+    query_item_ids[is_unknown] = -rng.integers(1, 1000, size=is_unknown.sum())  # no such items
+    lookup = serve_recommendations.RecommendationLookup(
+        SUBMISSION_PATH, fallback=serve_recommendations.create_similar_items_fallback(DATA_DIR))
+    results = measure_in_process(lookup, query_item_ids)
+    server = serve_recommendations.create_server(lookup, port=0)  # any free port
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    results.extend(measure_http(*server.server_address[:2], query_item_ids))
+    server.shutdown()
+    server.server_close()
+    print(pd.DataFrame(results).round(1).to_string(index=False))
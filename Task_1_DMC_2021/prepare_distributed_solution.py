@@ -6,12 +6,14 @@ so each participants gets to evaluate a different subset of items. Also, partici
 scores, but have to tell whose team's recommendations should be selected.
 """
 
-import csv
 import pathlib
 
 import numpy as np
 import pandas as pd
 
+import build_comparison_tables
+import load_data
+
 
 SUBMISSION_DIR = pathlib.Path('data/')
 DATA_DIR = pathlib.Path('data/')  # needs to contain "evaluation.csv" and "items.csv"
@@ -24,34 +26,22 @@ if __name__ == '__main__':
         FileNotFoundError(f'"{DATA_DIR}" does not exist.')
     if not SUBMISSION_DIR.exists():
         FileNotFoundError(f'"{SUBMISSION_DIR}" does not exist.')
-    test_values = pd.read_csv(DATA_DIR / 'evaluation.csv', sep='|')
-    items = pd.read_csv(DATA_DIR / 'items.csv', sep='|', quoting=csv.QUOTE_NONE)
-    items.rename(columns={'itemID': 'rec_item'}, inplace=True)  # for merge later
-    # Read in submisson files of groups to be combined:
-    submission_files = list(SUBMISSION_DIR.glob('**/*_recommendation.csv'))
-    submissions = []
-    for group in COMBINED_GROUPS:
-        group_submission_files = [x for x in submission_files if group in x.stem]
-        if len(group_submission_files) != 1:
-            FileNotFoundError(f'No or multiple prediction files for group {group}.')
-        submission = pd.read_csv(group_submission_files[0], sep='|', quoting=csv.QUOTE_NONE,
-                                 header=0, decimal='.', encoding='utf-8', escapechar=None)
-        submission['team'] = group
-        submissions.append(submission)
-    # Combine submissions and re-shape to enable comparison:
-    comparison_table = pd.concat(submissions)
-    comparison_table = comparison_table.melt(id_vars=['itemID', 'team'], value_name='rec_item',
-                                             var_name='rec_nr')  # distribute recs over rows
-    comparison_table['rec_nr'] = comparison_table['rec_nr'].str.replace('rec_', '')
-    # Add item info for human-friendly comparison:
-    comparison_table = comparison_table.merge(items)
-    comparison_table.sort_values(by=['itemID', 'team', 'rec_nr'], inplace=True)
-    comparison_table = test_values.merge(comparison_table)  # get original item order from test set
-    item_partitioning = np.array_split(test_values['itemID'], NUM_PARTICIPANTS)
-    for partition_id, partition_items in enumerate(item_partitioning):
+    test_values = load_data.load_evaluation(DATA_DIR)
+    items = load_data.load_items(DATA_DIR)
+    # Read in submisson files of groups to be combined (aligned to original item order from test set):
+    item_ids = test_values['itemID'].to_numpy()
+    submission_files = build_comparison_tables.find_submission_files(SUBMISSION_DIR, COMBINED_GROUPS)
+    recommendations = build_comparison_tables.load_submissions(submission_files, item_ids=item_ids)
+    # Combine submissions, distribute recs over rows, and add item info for human-friendly comparison:
+    comparison_table = build_comparison_tables.build_comparison_table(
+        recommendations, teams=COMBINED_GROUPS, item_ids=item_ids, items=items)
+    item_partitioning = np.array_split(item_ids, NUM_PARTICIPANTS)
+    comparison_partitions = build_comparison_tables.split_table_by_items(
+        comparison_table, item_ids=item_ids, num_partition_items=[len(x) for x in item_partitioning])
+    output_tables = []
+    for partition_id, (partition_items, partition_table) in enumerate(zip(item_partitioning, comparison_partitions)):
         id_string = str(partition_id).zfill(len(str(NUM_PARTICIPANTS)))  # use leading zeros to maintain order
-        comparison_table[comparison_table['itemID'].isin(list(partition_items))].to_csv(
-            SUBMISSION_DIR / f'comparison_{id_string}.csv', sep='|', index=False)
+        output_tables.append((partition_table, SUBMISSION_DIR / f'comparison_{id_string}.csv'))
         template_selection_table = pd.DataFrame({'itemID': partition_items, 'group': ''})
-        template_selection_table.to_csv(SUBMISSION_DIR / f'selection_template_{id_string}.csv',
-                                        sep='|', index=False)
+        output_tables.append((template_selection_table, SUBMISSION_DIR / f'selection_template_{id_string}.csv'))
+    build_comparison_tables.write_tables(output_tables)
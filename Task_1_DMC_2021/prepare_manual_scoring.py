@@ -9,10 +9,10 @@ recommendations for one evaluation item and team are scored together (instead of
 the five recommendations individually).
 """
 
-import csv
 import pathlib
 
-import pandas as pd
+import build_comparison_tables
+import load_data
 
 
 SUBMISSION_DIR = pathlib.Path('data/')
@@ -27,32 +27,24 @@ if __name__ == '__main__':
         FileNotFoundError(f'"{DATA_DIR}" does not exist.')
     if not SUBMISSION_DIR.exists():
         FileNotFoundError(f'"{SUBMISSION_DIR}" does not exist.')
-    test_values = pd.read_csv(DATA_DIR / 'evaluation.csv', sep='|')
+    test_values = load_data.load_evaluation(DATA_DIR)
     evaluation_item_ids = list(test_values['itemID'].sample(n=NUM_ITEMS, replace=False, random_state=SEED))
-    items = pd.read_csv(DATA_DIR / 'items.csv', sep='|', quoting=csv.QUOTE_NONE)
-    items.rename(columns={'itemID': 'rec_item'}, inplace=True)  # for merge later
-    submission_files = list(SUBMISSION_DIR.glob('**/*_recommendation.csv'))
+    evaluation_item_ids = sorted(evaluation_item_ids)  # order of items in comparison tables
+    items = load_data.load_items(DATA_DIR)
+    # Load submissions of all teams at once:
+    teams = list(dict.fromkeys(team for scoring_group in SCORING_GROUPING for team in scoring_group))
+    submission_files = build_comparison_tables.find_submission_files(SUBMISSION_DIR, teams)
+    recommendations = build_comparison_tables.load_submissions(submission_files, item_ids=evaluation_item_ids)
+    output_tables = []
     for scoring_group in SCORING_GROUPING:
-        submissions = []
-        for group in scoring_group:
-            group_submission_files = [x for x in submission_files if group in x.stem]
-            if len(group_submission_files) != 1:
-                FileNotFoundError(f'No or multiple prediction files for group {group}.')
-            submission = pd.read_csv(group_submission_files[0], sep='|', quoting=csv.QUOTE_NONE,
-                                     header=0, decimal='.', encoding='utf-8', escapechar=None)
-            submission = submission[submission['itemID'].isin(evaluation_item_ids)]
-            submission['team'] = group
-            submissions.append(submission)
-        comparison_table = pd.concat(submissions)
-        comparison_table = comparison_table.melt(id_vars=['itemID', 'team'], value_name='rec_item',
-                                                 var_name='rec_nr')  # distribute recs over rows
-        comparison_table['rec_nr'] = comparison_table['rec_nr'].str.replace('rec_', '')
-        comparison_table = comparison_table.merge(items)
-        comparison_table.sort_values(by=['itemID', 'team', 'rec_nr'], inplace=True)
+        comparison_table = build_comparison_tables.build_comparison_table(
+            recommendations[[teams.index(x) for x in scoring_group]], teams=scoring_group,
+            item_ids=evaluation_item_ids, items=items)
         grouping_string = '_'.join(comparison_table['team'].unique())
         comparison_file_name = grouping_string + '_comparison.csv'
-        comparison_table.to_csv(SUBMISSION_DIR / comparison_file_name, sep='|', index=False)
+        output_tables.append((comparison_table, SUBMISSION_DIR / comparison_file_name))
         template_scoring_table = comparison_table[['itemID', 'team']].drop_duplicates()
         template_scoring_table['scoring'] = -1
         template_scoring_file_name = grouping_string + '_scoring_template.csv'
-        template_scoring_table.to_csv(SUBMISSION_DIR / template_scoring_file_name, sep='|', index=False)
+        output_tables.append((template_scoring_table, SUBMISSION_DIR / template_scoring_file_name))
+    build_comparison_tables.write_tables(output_tables)
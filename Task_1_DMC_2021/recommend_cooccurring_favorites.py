@@ -4,38 +4,191 @@ Simple solution script which scans the training data for all transactions contai
 item at-hand and recommnends the most popular co-occurrring items. Defaults to the globally
 most popular items if the item-at-hand does not occur in the training data. We determine popularity
 only by clicks, but we could also use "basket" or "order" or a combination of these.
+Optionally, items without co-occurring items get content-based recommendations from
+"recommend_similar_items.py" instead of the global favorites.
+
+Besides the item-wise scan, there is a batch mode which represents all transactions as a sparse
+session-item matrix and computes the co-occurrence scores for all evaluation items with sparse
+matrix products (in blocks of items) instead of scanning the transactions once per item.
 """
 
-import csv
+from typing import Any, Dict, Optional, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
+import scipy.sparse
 
+import instrumentation
+import load_data
+import recommend_global_favorites
+import recommend_similar_items
+import session_index
 
 INPUT_DIR = 'data/'
 OUTPUT_DIR = 'data/'
+NUM_RECOMMENDATIONS = 5
+POPULARITY_WEIGHTS = {'click': 1, 'basket': 0, 'order': 0}  # how transaction columns contribute to popularity
+USE_BATCH_MODE = True  # if False, scan transactions separately for each evaluation item
+BATCH_SIZE = 10000  # number of evaluation items whose co-occurrences are computed at once in batch mode
+USE_CONTENT_FALLBACK = True  # if False, items without co-occurring items get global favorites only
 
-# Read data
-evaluation = pd.read_csv(INPUT_DIR + 'evaluation.csv')
-transactions = pd.read_csv(INPUT_DIR + 'transactions.csv', sep='|', quoting=csv.QUOTE_NONE)
 
-# Determine defaults
-global_item_ranking = transactions.groupby('itemID')['click'].sum().sort_values(ascending=False)
-global_top_items = list(global_item_ranking[:5].index.values)
+# Compute popularity of each transaction (row) as weighted sum of clicks, baskets, and orders.
+def get_popularity(transactions: pd.DataFrame,
+                   weights: Dict[str, float] = POPULARITY_WEIGHTS) -> pd.Series:
+    return sum(transactions[column] * weight for column, weight in weights.items())
 
-# Add recommendations
-evaluation[[f'rec_{i + 1}' for i in range(5)]] = None  # initialize empty columns
-for i, itemID in enumerate(evaluation['itemID']):
-    relevant_sessions = transactions.loc[transactions['itemID'] == itemID, 'sessionID']
-    if len(relevant_sessions) == 0:  # item not in training data
-        evaluation.iloc[i, 1:] = global_top_items
-    else:
-        relevant_data = transactions[transactions['sessionID'].isin(relevant_sessions) &
-                                     (transactions['itemID'] != itemID)]
-        relevant_item_ranking = relevant_data.groupby('itemID')['click'].sum().sort_values(ascending=False)
-        top_items = list(relevant_item_ranking[:5].index.values)
-        if len(top_items) < 5:  # if not enough co-occurring items, fill with globally popular items
-            top_items.extend(global_top_items[:(5 - len(top_items))])
+
+# Return the "num_items" globally most popular items (same counting as "recommend_global_favorites").
+def get_global_top_items(transactions: pd.DataFrame, num_items: int = NUM_RECOMMENDATIONS) -> list:
+    item_counter = recommend_global_favorites.count_items([transactions])
+    return item_counter.get_top_items(num_items=num_items, weights=POPULARITY_WEIGHTS)
+
+
+# Original approach: for each evaluation item, look up the sessions containing it and the items in
+# these sessions (in the session index, instead of scanning all transactions).
+@instrumentation.instrument()
+def recommend_itemwise(evaluation: pd.DataFrame, transactions: pd.DataFrame, num_items: int = NUM_RECOMMENDATIONS,
+                       similarity_index: Optional[Dict[str, Any]] = None,
+                       transactions_index: Optional[Dict[str, np.ndarray]] = None) -> pd.DataFrame:
+    evaluation = evaluation[['itemID']].copy()
+    if transactions_index is None:
+        transactions_index = session_index.build_session_index(transactions)
+    popularity_weights = np.array([POPULARITY_WEIGHTS.get(x, 0) for x in session_index.COUNT_COLUMNS])
+    global_top_items = get_global_top_items(transactions, num_items=num_items)
+    evaluation[[f'rec_{i + 1}' for i in range(num_items)]] = None  # initialize empty columns
+    for i, itemID in enumerate(evaluation['itemID']):
+        relevant_sessions, _ = session_index.get_item_sessions(transactions_index, itemID)
+        if len(relevant_sessions) == 0:  # item not in training data
+            top_items = []
+        else:
+            relevant_items, relevant_counts = session_index.get_sessions_items(
+                transactions_index, np.unique(relevant_sessions))
+            is_other_item = relevant_items != itemID
+            relevant_item_ranking = pd.Series(relevant_counts[is_other_item] @ popularity_weights).groupby(
+                relevant_items[is_other_item]).sum().sort_values(ascending=False)
+            top_items = list(relevant_item_ranking[:num_items].index.values)
+        if (len(top_items) == 0) and (similarity_index is not None):  # use content-based fallback
+            top_items = [x for x in recommend_similar_items.get_similar_items(
+                similarity_index, [itemID], num_items=num_items)[0] if x != -1]
+        if len(top_items) < num_items:  # if not enough co-occurring items, fill with globally popular items
+            top_items.extend(global_top_items[:(num_items - len(top_items))])
         evaluation.iloc[i, 1:] = top_items
+    return evaluation
+
+
+# Create sparse matrices from the transactions: a binary item-session matrix (which items occur
+# in which session) and a session-item matrix containing the popularity of each item in each
+# session. Also return the item ids corresponding to the item dimension of these matrices.
+@instrumentation.instrument()
+def build_cooccurrence_matrices(transactions: pd.DataFrame) -> Tuple[scipy.sparse.csr_matrix,
+                                                                       scipy.sparse.csr_matrix,
+                                                                       np.ndarray]:
+    matrix_item_ids, item_idx = np.unique(transactions['itemID'].to_numpy(), return_inverse=True)
+    _, session_idx = np.unique(transactions['sessionID'].to_numpy(), return_inverse=True)
+    shape = (session_idx.max() + 1, len(matrix_item_ids))
+    occurrence_matrix = scipy.sparse.csr_matrix(
+        (np.ones(len(transactions)), (session_idx, item_idx)), shape=shape)
+    occurrence_matrix.data[:] = 1  # duplicate session-item pairs were summed up
+    popularity_matrix = scipy.sparse.csr_matrix(
+        (get_popularity(transactions).to_numpy(dtype=float), (session_idx, item_idx)), shape=shape)
+    return occurrence_matrix.T.tocsr(), popularity_matrix, matrix_item_ids
+
+
+# For each row of a sparse score matrix, select the column indices with the "num_items" highest
+# scores (ties broken by column index). All explicitly stored entries, including zeros, are
+# candidates. Missing entries of the resulting index/score matrices are -1/NaN.
+def select_top_columns(scores: scipy.sparse.coo_matrix,
+                       num_items: int = NUM_RECOMMENDATIONS) -> Tuple[np.ndarray, np.ndarray]:
+    order = np.lexsort((scores.col, -scores.data, scores.row))
+    rows = scores.row[order]
+    ranks = np.arange(len(rows)) - np.searchsorted(rows, rows, side='left')
+    keep = ranks < num_items
+    top_columns = np.full((scores.shape[0], num_items), -1, dtype=np.int64)
+    top_columns[rows[keep], ranks[keep]] = scores.col[order][keep]
+    top_scores = np.full((scores.shape[0], num_items), np.nan)
+    top_scores[rows[keep], ranks[keep]] = scores.data[order][keep]
+    return top_columns, top_scores
+
+
+# For each query item, find the "num_items" co-occurring items with the highest popularity in the
+# sessions containing the query item (query item itself excluded). Works on the matrices from
+# "build_cooccurrence_matrices()". Return item ids and scores; missing entries are -1/NaN.
+def get_top_cooccurring_items(query_item_ids: Sequence[int], item_session_matrix: scipy.sparse.csr_matrix,
+                              popularity_matrix: scipy.sparse.csr_matrix, matrix_item_ids: np.ndarray,
+                              num_items: int = NUM_RECOMMENDATIONS) -> Tuple[np.ndarray, np.ndarray]:
+    query_item_ids = np.asarray(query_item_ids)
+    query_idx = np.searchsorted(matrix_item_ids, query_item_ids)
+    query_idx[query_idx == len(matrix_item_ids)] = 0  # ids larger than all known ids
+    is_known = matrix_item_ids[query_idx] == query_item_ids
+    known_rows = np.where(is_known)[0]
+    query_matrix = item_session_matrix[query_idx[known_rows]]
+    # Co-occurrence pattern (which items share at least one session) and popularity scores:
+    cooccurrence = (query_matrix @ item_session_matrix.T).tocoo()
+    popularity = (query_matrix @ popularity_matrix).tocsr()
+    is_other_item = cooccurrence.col != query_idx[known_rows][cooccurrence.row]
+    rows = cooccurrence.row[is_other_item]
+    columns = cooccurrence.col[is_other_item]
+    scores = np.asarray(popularity[rows, columns], dtype=float).ravel() if len(rows) > 0 else np.zeros(0)
+    top_columns, top_scores = select_top_columns(scipy.sparse.coo_matrix(
+        (scores, (rows, columns)), shape=cooccurrence.shape), num_items=num_items)
+    top_items = np.full((len(query_item_ids), num_items), -1, dtype=np.int64)
+    top_items[known_rows] = np.where(top_columns >= 0, matrix_item_ids[top_columns], -1)
+    result_scores = np.full((len(query_item_ids), num_items), np.nan)
+    result_scores[known_rows] = top_scores
+    return top_items, result_scores
+
+
+# Replace missing entries (-1) in each row of recommendations with the fallback items (like the
+# item-wise approach, start with the first fallback item, no matter which items are already there).
+def fill_recommendations(top_items: np.ndarray, fallback_items: Sequence[int]) -> np.ndarray:
+    top_items = top_items.copy()
+    num_found = (top_items >= 0).sum(axis=1)
+    for i in range(top_items.shape[1]):
+        is_missing = num_found <= i
+        top_items[is_missing, i] = np.asarray(fallback_items)[i - num_found[is_missing]]
+    return top_items
+
+
+# Batch approach: compute co-occurrences for all evaluation items with sparse matrix products.
+@instrumentation.instrument()
+def recommend_batchwise(evaluation: pd.DataFrame, transactions: pd.DataFrame, num_items: int = NUM_RECOMMENDATIONS,
+                        batch_size: int = BATCH_SIZE,
+                        similarity_index: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
+    global_top_items = get_global_top_items(transactions, num_items=num_items)
+    item_session_matrix, popularity_matrix, matrix_item_ids = build_cooccurrence_matrices(transactions)
+    query_item_ids = evaluation['itemID'].to_numpy()
+    top_items = np.empty((len(query_item_ids), num_items), dtype=np.int64)
+    for start in range(0, len(query_item_ids), batch_size):
+        batch_query_item_ids = query_item_ids[start:(start + batch_size)]
+        batch_items, _ = get_top_cooccurring_items(
+            batch_query_item_ids, item_session_matrix=item_session_matrix,
+            popularity_matrix=popularity_matrix, matrix_item_ids=matrix_item_ids, num_items=num_items)
+        if similarity_index is not None:  # use content-based fallback
+            is_cold_start = (batch_items == -1).all(axis=1)
+            batch_items[is_cold_start] = recommend_similar_items.get_similar_items(
+                similarity_index, batch_query_item_ids[is_cold_start], num_items=num_items)
+        top_items[start:(start + batch_size)] = fill_recommendations(batch_items, global_top_items)
+    recommendations = pd.DataFrame({'itemID': query_item_ids})
+    recommendations[[f'rec_{i + 1}' for i in range(num_items)]] = top_items
+    return recommendations
+
+
+if __name__ == '__main__':
+    # Read data
+    evaluation = load_data.load_evaluation(INPUT_DIR)
+    transactions = load_data.load_transactions(INPUT_DIR)
+    similarity_index = recommend_similar_items.get_similarity_index(INPUT_DIR) if USE_CONTENT_FALLBACK else None
+
+    # Add recommendations
+    if USE_BATCH_MODE:
+        evaluation = recommend_batchwise(evaluation=evaluation, transactions=transactions,
+                                         similarity_index=similarity_index)
+    else:
+        evaluation = recommend_itemwise(evaluation=evaluation, transactions=transactions,
+                                        similarity_index=similarity_index,
+                                        transactions_index=session_index.get_session_index(INPUT_DIR))
 
-# Write result
-evaluation.to_csv(OUTPUT_DIR + 'Jakob-cooccurring-favorites_recommendation.csv', sep='|', index=False)
+    # Write result
+    with instrumentation.stage('write_submission', rows=len(evaluation)):
+        evaluation.to_csv(OUTPUT_DIR + 'Jakob-cooccurring-favorites_recommendation.csv', sep='|', index=False)
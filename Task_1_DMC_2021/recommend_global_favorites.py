@@ -3,23 +3,104 @@
 Simple solution script which scans the training data for the globally most popular items and always
 recommends them, independent from the evaluation item at hand. Here, we determine popularity only
 by clicks, but we could also use "basket" or "order" or a combination of these.
+
+The transactions can also be streamed in chunks (instead of loading them completely) and counted
+with "ItemCounter", whose memory only depends on the number of items.
 """
 
-import csv
+import pathlib
+from typing import Dict, Iterable, Sequence
 
+import numpy as np
 import pandas as pd
 
+import instrumentation
+import load_data
+
 
 INPUT_DIR = 'data/'
 OUTPUT_DIR = 'data/'
+NUM_RECOMMENDATIONS = 5
+POPULARITY_WEIGHTS = {'click': 1, 'basket': 0, 'order': 0}  # how transaction columns contribute to popularity
+USE_STREAMING = True  # if False, load all transactions into memory at once
+CHUNK_SIZE = 10 ** 6  # number of transactions per chunk in streaming mode
+
+
+# Array-backed counters of clicks, baskets, and orders per item. Can be updated chunk-wise;
+# arrays are indexed by item id, so memory is proportional to the (maximum) item id.
+class ItemCounter:
+
+    COLUMNS = ['click', 'basket', 'order']
+
+    def __init__(self):
+        self.counts = np.zeros((0, len(self.COLUMNS)), dtype=np.int64)
+        self.is_present = np.zeros(0, dtype=bool)  # whether item occured in any transaction
+
+    # Add clicks, baskets, and orders from (a chunk of) transactions.
+    def update(self, transactions: pd.DataFrame) -> None:
+        if len(transactions) == 0:
+            return
+        item_ids = transactions['itemID'].to_numpy()
+        num_items = max(len(self.is_present), item_ids.max() + 1)
+        if num_items > len(self.is_present):  # grow arrays
+            self.counts = np.pad(self.counts, ((0, num_items - len(self.counts)), (0, 0)))
+            self.is_present = np.pad(self.is_present, (0, num_items - len(self.is_present)))
+        for i, column in enumerate(self.COLUMNS):
+            self.counts[:, i] += np.bincount(item_ids, weights=transactions[column],
+                                             minlength=num_items).astype(np.int64)
+        self.is_present[item_ids] = True
+
+    # Return the weighted popularity of all items which occured, indexed by item id.
+    def get_popularity(self, weights: Dict[str, float] = POPULARITY_WEIGHTS) -> pd.Series:
+        item_ids = np.where(self.is_present)[0]
+        weight_vector = np.array([weights.get(column, 0) for column in self.COLUMNS])
+        return pd.Series(self.counts[item_ids] @ weight_vector, index=item_ids)
+
+    # Return the "num_items" most popular items (ties broken by lower item id).
+    def get_top_items(self, num_items: int = NUM_RECOMMENDATIONS,
+                      weights: Dict[str, float] = POPULARITY_WEIGHTS) -> list:
+        popularity = self.get_popularity(weights=weights)
+        order = np.lexsort((popularity.index.values, -popularity.values))
+        return list(popularity.index.values[order[:num_items]])
+
+
+# Count items from an iterable of transaction chunks (or from a single data frame in a list).
+@instrumentation.instrument()
+def count_items(transaction_chunks: Iterable[pd.DataFrame]) -> ItemCounter:
+    item_counter = ItemCounter()
+    for transaction_chunk in transaction_chunks:
+        item_counter.update(transaction_chunk)
+    return item_counter
+
+
+# Count items while streaming the transactions CSV in chunks of "chunk_size" rows.
+@instrumentation.instrument()
+def count_items_streaming(transactions_path: pathlib.Path, chunk_size: int = CHUNK_SIZE) -> ItemCounter:
+    read_options = load_data.READ_OPTIONS['transactions']
+    with pd.read_csv(transactions_path, usecols=['itemID'] + ItemCounter.COLUMNS, chunksize=chunk_size,
+                     **read_options) as transaction_chunks:
+        return count_items(transaction_chunks)
+
+
+# Recommend the same items for each evaluation item.
+@instrumentation.instrument()
+def recommend_globally(evaluation: pd.DataFrame, top_items: Sequence[int]) -> pd.DataFrame:
+    evaluation = evaluation[['itemID']].copy()
+    evaluation[[f'rec_{i + 1}' for i in range(len(top_items))]] = top_items
+    return evaluation
+
 
-# Read data
-evaluation = pd.read_csv(INPUT_DIR + 'evaluation.csv')
-transactions = pd.read_csv(INPUT_DIR + 'transactions.csv', sep='|', quoting=csv.QUOTE_NONE)
+if __name__ == '__main__':
+    # Read data
+    evaluation = load_data.load_evaluation(INPUT_DIR)
 
-# Determine most-clicked items and add recommendations
-top_items = list(transactions.groupby('itemID')['click'].sum().sort_values(ascending=False)[:5].index.values)
-evaluation[[f'rec_{i + 1}' for i in range(5)]] = top_items
+    # Determine most-clicked items and add recommendations
+    if USE_STREAMING:
+        item_counter = count_items_streaming(pathlib.Path(INPUT_DIR) / 'transactions.csv')
+    else:
+        item_counter = count_items([load_data.load_transactions(INPUT_DIR)])
+    evaluation = recommend_globally(evaluation=evaluation, top_items=item_counter.get_top_items())
 
-# Write result
-evaluation.to_csv(OUTPUT_DIR + 'Jakob-global-favorites_recommendation.csv', sep='|', index=False)
+    # Write result
+    with instrumentation.stage('write_submission', rows=len(evaluation)):
+        evaluation.to_csv(OUTPUT_DIR + 'Jakob-global-favorites_recommendation.csv', sep='|', index=False)
@@ -0,0 +1,122 @@
+"""Recommend similar items
+
+Content-based solution script which recommends the items most similar to the evaluation item at
+hand, regarding the item attributes from "items.csv" (title, author, publisher, main topic,
+subtopics). Does not need transactions, so it also works for items without any (cold start), and
+therefore serves as fallback in "recommend_cooccurring_favorites.py".
+Items are represented by sparse feature vectors (TF-IDF for the title, one-hot encoding for the
+other attributes). A nearest-neighbor index (cosine distance) over these vectors is built once
+and persisted; it is re-built if "items.csv" changes.
+"""
+
+import pathlib
+from typing import Any, Dict, Sequence, Union
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse
+import sklearn.feature_extraction.text
+import sklearn.neighbors
+import sklearn.preprocessing
+
+import instrumentation
+import load_data
+import recommend_global_favorites
+
+
+INPUT_DIR = 'data/'
+OUTPUT_DIR = 'data/'
+INDEX_FILE_NAME = 'similarity_index.joblib'  # stored in input directory
+NUM_RECOMMENDATIONS = 5
+FEATURE_WEIGHTS = {'title': 1, 'author': 1, 'publisher': 0.5, 'main topic': 0.5, 'subtopics': 0.5}
+
+
+# One-hot encode a categorical attribute as sparse matrix (missing values get no 1 at all).
+def _one_hot_encode(values: pd.Series) -> scipy.sparse.csr_matrix:
+    codes, categories = pd.factorize(values)
+    is_present = codes >= 0
+    return scipy.sparse.csr_matrix((np.ones(is_present.sum()), (np.where(is_present)[0], codes[is_present])),
+                                   shape=(len(values), len(categories)))
+
+
+# Create sparse feature matrix with one (normalized) row per item.
+def build_item_features(items: pd.DataFrame,
+                        feature_weights: Dict[str, float] = FEATURE_WEIGHTS) -> scipy.sparse.csr_matrix:
+    feature_matrices = {
+        'title': sklearn.feature_extraction.text.TfidfVectorizer(sublinear_tf=True).fit_transform(
+            items['title'].astype('object').fillna('')),
+        'author': _one_hot_encode(items['author']),
+        'publisher': _one_hot_encode(items['publisher']),
+        'main topic': _one_hot_encode(items['main topic']),
+        # format of subtopics is like "[FM,FMB]":
+        'subtopics': sklearn.feature_extraction.text.CountVectorizer(
+            token_pattern=r'[^\[\],\s]+', lowercase=False, binary=True).fit_transform(
+                items['subtopics'].astype('object').fillna(''))
+    }
+    features = scipy.sparse.hstack([sklearn.preprocessing.normalize(feature_matrices[name]) * weight
+                                    for name, weight in feature_weights.items()], format='csr')
+    return sklearn.preprocessing.normalize(features)
+
+
+# Build nearest-neighbor index over the items. "items_hash" allows to detect outdated indexes.
+@instrumentation.instrument()
+def build_similarity_index(items: pd.DataFrame, items_hash: str = '') -> Dict[str, Any]:
+    features = build_item_features(items)
+    nearest_neighbors = sklearn.neighbors.NearestNeighbors(metric='cosine', algorithm='brute')
+    nearest_neighbors.fit(features)
+    return {'item_ids': items['itemID'].to_numpy(), 'features': features,
+            'nearest_neighbors': nearest_neighbors, 'items_hash': items_hash}
+
+
+# Load the index for the items in "data_dir" if it exists and is up-to-date, else build and save it.
+@instrumentation.instrument()
+def get_similarity_index(data_dir: Union[str, pathlib.Path] = INPUT_DIR) -> Dict[str, Any]:
+    data_dir = pathlib.Path(data_dir)
+    index_path = data_dir / INDEX_FILE_NAME
+    items_hash = load_data.compute_file_hash(data_dir / 'items.csv')
+    if index_path.exists():
+        similarity_index = joblib.load(index_path)
+        if similarity_index['items_hash'] == items_hash:
+            return similarity_index
+    similarity_index = build_similarity_index(load_data.load_items(data_dir), items_hash=items_hash)
+    load_data.write_atomically(index_path, lambda x: joblib.dump(similarity_index, x))
+    return similarity_index
+
+
+# For each query item, find the "num_items" most similar other items (batch query). Unknown items
+# get -1 entries.
+def get_similar_items(similarity_index: Dict[str, Any], query_item_ids: Sequence[int],
+                      num_items: int = NUM_RECOMMENDATIONS) -> np.ndarray:
+    query_item_ids = np.asarray(query_item_ids)
+    query_rows = pd.Index(similarity_index['item_ids']).get_indexer(query_item_ids)
+    known_rows = np.where(query_rows >= 0)[0]
+    similar_items = np.full((len(query_item_ids), num_items), -1, dtype=np.int64)
+    if len(known_rows) == 0:
+        return similar_items
+    neighbor_rows = similarity_index['nearest_neighbors'].kneighbors(
+        similarity_index['features'][query_rows[known_rows]], n_neighbors=num_items + 1, return_distance=False)
+    # Remove query item itself (usually, but not always, its own nearest neighbor), else last item:
+    is_other_item = neighbor_rows != query_rows[known_rows, np.newaxis]
+    is_other_item[is_other_item.all(axis=1), -1] = False
+    neighbor_rows = neighbor_rows[is_other_item].reshape(len(known_rows), num_items)
+    similar_items[known_rows] = similarity_index['item_ids'][neighbor_rows]
+    return similar_items
+
+
+if __name__ == '__main__':
+    # Read data
+    evaluation = load_data.load_evaluation(INPUT_DIR)
+    similarity_index = get_similarity_index(INPUT_DIR)
+
+    # Add recommendations (globally popular items for items not in "items.csv")
+    global_top_items = recommend_global_favorites.count_items_streaming(
+        pathlib.Path(INPUT_DIR) / 'transactions.csv').get_top_items(num_items=NUM_RECOMMENDATIONS)
+    top_items = get_similar_items(similarity_index, evaluation['itemID'])
+    top_items[(top_items == -1).all(axis=1)] = global_top_items
+    evaluation = evaluation[['itemID']].copy()
+    evaluation[[f'rec_{i + 1}' for i in range(NUM_RECOMMENDATIONS)]] = top_items
+
+    # Write result
+    with instrumentation.stage('write_submission', rows=len(evaluation)):
+        evaluation.to_csv(OUTPUT_DIR + 'Jakob-similar-items_recommendation.csv', sep='|', index=False)
@@ -0,0 +1,195 @@
+"""Serve recommendations
+
+Lookup layer and local HTTP endpoint for precomputed recommendations, i.e., a submission file
+(format checked by "check_submission_validity.py") created by one of the "recommend_*.py" scripts.
+The submission is converted once into a dense binary table indexed by itemID (row = itemID,
+columns = recommendations, -1 for unknown items), which is memory-mapped, so single and bulk
+lookups are plain array indexing. Items not in the table get recommendations computed on demand
+(content-based, from "recommend_similar_items.py"), which are kept in an LRU cache.
+A background thread polls the submission file and reloads the table when the file changes.
+"""
+
+import functools
+import http.server
+import json
+import pathlib
+import sys
+import threading
+import time
+import urllib.parse
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import check_submission_validity
+import instrumentation
+import load_data
+import recommend_global_favorites
+import recommend_similar_items
+
+
+SUBMISSION_PATH = pathlib.Path('data/Jakob-cooccurring-favorites_recommendation.csv')
+DATA_DIR = pathlib.Path('data/')  # needs to contain "items.csv" and "transactions.csv" (for fallback)
+NUM_RECOMMENDATIONS = 5
+FALLBACK_CACHE_SIZE = 10000  # number of items whose on-demand recommendations are cached
+RELOAD_INTERVAL = 5  # seconds between checks for a changed submission file
+HOST = 'localhost'
+PORT = 8000
+
+
+# Save table as ".npy" (via file object, as "np.save()" would append ".npy" to other paths).
+def _save_table(path: pathlib.Path, table: np.ndarray) -> None:
+    with open(path, 'wb') as file:
+        np.save(file, table)
+
+
+# Convert a submission file into a table indexed by itemID and save it as ".npy" in the cache
+# directory next to the submission (unless the table is up-to-date, which is checked as for the
+# cached data in "load_data.py"). Return path of table.
+@instrumentation.instrument()
+def build_lookup_table(submission_path: pathlib.Path, num_recommendations: int = NUM_RECOMMENDATIONS) -> pathlib.Path:
+    table_path = submission_path.parent / load_data.CACHE_DIR_NAME / f'{submission_path.stem}.npy'
+    meta_path = table_path.with_suffix('.json')
+    if load_data.is_cache_valid(source_path=submission_path, cache_path=table_path, meta_path=meta_path):
+        return table_path
+    meta_data = load_data.get_file_meta_data(submission_path)
+    submission = check_submission_validity.read_submission(submission_path)
+    item_ids = submission['itemID'].to_numpy()
+    table = np.full((item_ids.max() + 1, num_recommendations), -1, dtype=np.int32)
+    table[item_ids] = submission[[f'rec_{i + 1}' for i in range(num_recommendations)]].to_numpy()
+    table_path.parent.mkdir(exist_ok=True)
+    load_data.write_atomically(table_path, lambda x: _save_table(x, table))  # readers never see partial tables
+    load_data.write_atomically(meta_path, lambda x: x.write_text(json.dumps(meta_data)))
+    return table_path
+
+
+# Holds the memory-mapped table of one submission file and answers lookups.
+class RecommendationLookup:
+
+    def __init__(self, submission_path: pathlib.Path, fallback: Optional[Callable[[int], List[int]]] = None,
+                 fallback_cache_size: int = FALLBACK_CACHE_SIZE):
+        self.submission_path = pathlib.Path(submission_path)
+        self.fallback = None if fallback is None else functools.lru_cache(maxsize=fallback_cache_size)(fallback)
+        self.table = None
+        self.submission_stat = None  # modification time and size of loaded submission file
+        self.reload()
+
+    # (Re-)load table from the submission file. Replacing the reference is atomic, so concurrent
+    # lookups either use the old or the new table.
+    def reload(self) -> None:
+        submission_stat = self._get_submission_stat()
+        self.table = np.load(build_lookup_table(self.submission_path), mmap_mode='r')
+        self.submission_stat = submission_stat
+
+    def _get_submission_stat(self) -> Tuple[int, int]:
+        stat = self.submission_path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    # Reload table if the submission file changed (modification time or size differs, e.g., also if
+    # the file was replaced by an older one). Return whether it was reloaded.
+    def reload_if_changed(self) -> bool:
+        if not self.submission_path.exists() or self._get_submission_stat() == self.submission_stat:
+            return False
+        self.reload()
+        return True
+
+    # Start daemon thread which checks for changes of the submission file every "interval" seconds.
+    def start_reload_thread(self, interval: float = RELOAD_INTERVAL) -> threading.Thread:
+        def poll() -> None:
+            while True:
+                time.sleep(interval)
+                if self.reload_if_changed():
+                    print(f'Reloaded "{self.submission_path}".', file=sys.stderr)
+
+        thread = threading.Thread(target=poll, daemon=True)
+        thread.start()
+        return thread
+
+    # Recommendations for one item (empty if unknown and there is no fallback).
+    def lookup(self, item_id: int) -> List[int]:
+        table = self.table
+        if 0 <= item_id < len(table) and table[item_id, 0] >= 0:
+            return table[item_id].tolist()
+        if self.fallback is not None:
+            return self.fallback(item_id)
+        return []
+
+    # Recommendations for multiple items as array (one row per item, -1 for unknown items without
+    # fallback).
+    def lookup_many(self, item_ids: Sequence[int]) -> np.ndarray:
+        table = self.table
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        is_in_range = (item_ids >= 0) & (item_ids < len(table))
+        recommendations = np.full((len(item_ids), table.shape[1]), -1, dtype=np.int64)
+        recommendations[is_in_range] = table[item_ids[is_in_range]]
+        if self.fallback is not None:
+            for row in np.where(recommendations[:, 0] < 0)[0]:
+                fallback_recommendations = self.fallback(int(item_ids[row]))[:table.shape[1]]
+                recommendations[row, :len(fallback_recommendations)] = fallback_recommendations
+        return recommendations
+
+
+# Create fallback for items not in the submission: content-based recommendations, or globally popular
+# items if the item is not in "items.csv" either.
+def create_similar_items_fallback(data_dir: pathlib.Path = DATA_DIR,
+                                  num_items: int = NUM_RECOMMENDATIONS) -> Callable[[int], List[int]]:
+    similarity_index = recommend_similar_items.get_similarity_index(data_dir)
+    global_top_items = [int(x) for x in recommend_global_favorites.count_items_streaming(
+        data_dir / 'transactions.csv').get_top_items(num_items=num_items)]
+
+    def fallback(item_id: int) -> List[int]:
+        similar_items = recommend_similar_items.get_similar_items(similarity_index, [item_id], num_items=num_items)[0]
+        if (similar_items == -1).all():
+            return global_top_items
+        return similar_items.tolist()
+
+    return fallback
+
+
+# Create HTTP server answering "GET /recommendations?itemID=1,2,3" with a JSON object mapping each
+# itemID to its recommendations.
+def create_server(lookup: RecommendationLookup, host: str = HOST, port: int = PORT) -> http.server.ThreadingHTTPServer:
+
+    class RecommendationHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep connections alive
+        disable_nagle_algorithm = True  # else small responses are delayed
+
+        def do_GET(self) -> None:
+            url = urllib.parse.urlsplit(self.path)
+            query = urllib.parse.parse_qs(url.query)
+            if url.path != '/recommendations' or 'itemID' not in query:
+                self.send_error(404, 'Use "/recommendations?itemID=<id>[,<id>...]".')
+                return
+            try:
+                item_ids = [int(x) for value in query['itemID'] for x in value.split(',')]
+            except ValueError:
+                self.send_error(400, 'Item ids need to be integers.')
+                return
+            if len(item_ids) == 1:
+                result = {str(item_ids[0]): lookup.lookup(item_ids[0])}
+            else:
+                result = dict(zip(map(str, item_ids), lookup.lookup_many(item_ids).tolist()))
+            body = json.dumps(result).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            pass  # logging each request would dominate latency
+
+    return http.server.ThreadingHTTPServer((host, port), RecommendationHandler)
+
+
+if __name__ == '__main__':
+    if not SUBMISSION_PATH.exists():
+        raise FileNotFoundError(f'"{SUBMISSION_PATH}" does not exist.')
+    lookup = RecommendationLookup(SUBMISSION_PATH, fallback=create_similar_items_fallback(DATA_DIR))
+    lookup.start_reload_thread()
+    server = create_server(lookup)
+    print(f'Serving recommendations on http://{HOST}:{PORT}/recommendations?itemID=<id>')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
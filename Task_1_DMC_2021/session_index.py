@@ -0,0 +1,118 @@
+"""Session index
+
+Array-backed index of the transactions in both directions, i.e., session -> items and
+item -> sessions, in compressed sparse row (CSR) format: for each session id (item id), the
+offsets array tells where its items (sessions) start in a flat int32 array, which is accompanied by
+the click/basket/order counts of the corresponding transactions. Offsets are indexed by id directly
+(ids are small non-negative integers), so a lookup takes time proportional to the number of
+results instead of a scan over all transactions.
+The index is persisted as ".npy" files in the cache directory (each written atomically, see
+"load_data.py"), memory-mapped when loading, and re-built if "transactions.csv" changes (detected
+as for the cached tables in "load_data.py", i.e., the file is only hashed if its modification time
+changed).
+"""
+
+import json
+import pathlib
+from typing import Any, Dict, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+import load_data
+
+
+DATA_DIR = pathlib.Path('data/')  # needs to contain "transactions.csv"
+INDEX_DIR_NAME = 'session_index'  # sub-directory of cache directory
+META_FILE_NAME = 'transactions.json'  # meta-data of the "transactions.csv" the index was built from
+COUNT_COLUMNS = ['click', 'basket', 'order']
+
+
+# Sort transactions by "key_column" and create CSR offsets (indexed by key id), the values of
+# "value_column" in this order, and the corresponding counts.
+def _build_csr(transactions: pd.DataFrame, key_column: str,
+               value_column: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    keys = transactions[key_column].to_numpy()
+    order = np.lexsort((transactions[value_column].to_numpy(), keys))
+    offsets = np.zeros(keys.max(initial=-1) + 2, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=len(offsets) - 1), out=offsets[1:])
+    values = transactions[value_column].to_numpy(dtype=np.int32)[order]
+    counts = transactions[COUNT_COLUMNS].to_numpy(dtype=np.int32)[order]
+    return offsets, values, counts
+
+
+# Create index (dictionary of arrays) from the transactions.
+@instrumentation.instrument()
+def build_session_index(transactions: pd.DataFrame) -> Dict[str, np.ndarray]:
+    if (transactions['sessionID'] < 0).any() or (transactions['itemID'] < 0).any():
+        raise ValueError('Session ids and item ids need to be non-negative.')
+    session_offsets, session_items, session_counts = _build_csr(transactions, 'sessionID', 'itemID')
+    item_offsets, item_sessions, item_counts = _build_csr(transactions, 'itemID', 'sessionID')
+    return {'session_offsets': session_offsets, 'session_items': session_items, 'session_counts': session_counts,
+            'item_offsets': item_offsets, 'item_sessions': item_sessions, 'item_counts': item_counts}
+
+
+# Save array as ".npy" (via file object, as "np.save()" would append ".npy" to other paths).
+def _save_array(path: pathlib.Path, array: np.ndarray) -> None:
+    with open(path, 'wb') as file:
+        np.save(file, array)
+
+
+def save_session_index(session_index: Dict[str, np.ndarray], index_dir: pathlib.Path,
+                       meta_data: Dict[str, Any]) -> None:
+    index_dir.mkdir(parents=True, exist_ok=True)
+    for name, array in session_index.items():
+        load_data.write_atomically(index_dir / f'{name}.npy', lambda x: _save_array(x, array))
+    load_data.write_atomically(index_dir / META_FILE_NAME, lambda x: x.write_text(json.dumps(meta_data)))
+
+
+def load_session_index(index_dir: pathlib.Path) -> Dict[str, np.ndarray]:
+    return {x.stem: np.load(x, mmap_mode='r') for x in index_dir.glob('*.npy')}
+
+
+# Load the index for the transactions in "data_dir" if it exists and is up-to-date, else build and
+# save it.
+@instrumentation.instrument()
+def get_session_index(data_dir: Union[str, pathlib.Path] = DATA_DIR) -> Dict[str, np.ndarray]:
+    data_dir = pathlib.Path(data_dir)
+    index_dir = data_dir / load_data.CACHE_DIR_NAME / INDEX_DIR_NAME
+    transactions_path = data_dir / 'transactions.csv'
+    if load_data.is_cache_valid(source_path=transactions_path, cache_path=index_dir,
+                                meta_path=index_dir / META_FILE_NAME):  # meta-data saved last, after arrays
+        return load_session_index(index_dir)
+    meta_data = load_data.get_file_meta_data(transactions_path)
+    session_index = build_session_index(load_data.load_transactions(data_dir))
+    save_session_index(session_index, index_dir=index_dir, meta_data=meta_data)
+    return session_index
+
+
+# Return the values (and counts) stored for one id; empty if the id is unknown.
+def _lookup(offsets: np.ndarray, values: np.ndarray, counts: np.ndarray, key: int) -> Tuple[np.ndarray, np.ndarray]:
+    if not 0 <= key < len(offsets) - 1:
+        return values[:0], counts[:0]
+    start, end = offsets[key], offsets[key + 1]
+    return values[start:end], counts[start:end]
+
+
+# Return ids of the sessions containing an item, and the click/basket/order counts of the item there.
+def get_item_sessions(session_index: Dict[str, np.ndarray], item_id: int) -> Tuple[np.ndarray, np.ndarray]:
+    return _lookup(session_index['item_offsets'], session_index['item_sessions'], session_index['item_counts'],
+                   item_id)
+
+
+# Return ids of the items in a session, and their click/basket/order counts.
+def get_session_items(session_index: Dict[str, np.ndarray], session_id: int) -> Tuple[np.ndarray, np.ndarray]:
+    return _lookup(session_index['session_offsets'], session_index['session_items'],
+                   session_index['session_counts'], session_id)
+
+
+# Return items (and counts) of multiple sessions, concatenated (unknown sessions contribute nothing).
+def get_sessions_items(session_index: Dict[str, np.ndarray], session_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    offsets = session_index['session_offsets']
+    session_ids = np.asarray(session_ids, dtype=np.int64)
+    is_known = (session_ids >= 0) & (session_ids < len(offsets) - 1)
+    starts = offsets[np.where(is_known, session_ids, 0)]
+    lengths = np.where(is_known, offsets[np.where(is_known, session_ids + 1, 0)] - starts, 0)
+    positions = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return session_index['session_items'][positions], session_index['session_counts'][positions]
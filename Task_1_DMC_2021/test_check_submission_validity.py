@@ -0,0 +1,110 @@
+"""Tests of the submission validity check
+
+For each submission file, the first violated rule needs to be the message of the original check,
+which stopped at the first violated rule, whether the file is checked alone or together with other
+files in parallel. Submissions are read from files, like in the script, as reading determines
+the column types.
+"""
+
+import pathlib
+from typing import Callable, Dict, Sequence
+
+import pandas as pd
+import pytest
+
+import check_submission_validity
+
+
+# Original check (before reporting all violated rules), from the original script.
+def check_submission_validity_baseline(submission: pd.DataFrame, test_values: pd.DataFrame,
+                                       valid_itemIDs: Sequence[int]) -> str:
+    if isinstance(valid_itemIDs, pd.Series):
+        valid_itemIDs = list(valid_itemIDs)  # else check with .isin() might not work as expected
+    if submission.shape[0] != test_values.shape[0]:
+        return 'Number of recommendations wrong (might be issue with header).'
+    if submission.shape[1] != 6:
+        return 'Number of columns wrong (index column might be saved).'
+    if list(submission) != ['itemID', 'rec_1', 'rec_2', 'rec_3', 'rec_4', 'rec_5']:
+        return 'At least one column name wrong (might be quoted).'
+    if (submission.dtypes != 'int64').any():
+        return 'At least one itemID is not an integer.'
+    if submission.isna().any().any():
+        return 'At least one NA.'
+    if sorted(submission['itemID']) != sorted(test_values['itemID']):
+        return 'At least one recommendation for a wrong itemID.'
+    if not submission[[f'rec_{i}' for i in range(1, 6)]].isin(valid_itemIDs).all().all():
+        return 'At least one non-existing itemID recommended.'
+    if (submission['itemID'] != test_values['itemID']).any():
+        return 'Order of itemID changed, else valid.'
+    return 'Valid.'
+
+
+TEST_VALUES = pd.DataFrame({'itemID': [11, 12, 13, 14, 15, 16]})
+VALID_ITEM_IDS = pd.Series(range(10, 40))
+VALID_SUBMISSION = TEST_VALUES.assign(**{f'rec_{i}': TEST_VALUES['itemID'] + 10 + i for i in range(1, 6)})
+
+
+def _set_value(submission: pd.DataFrame, row: int, column: str, value) -> pd.DataFrame:
+    submission = submission.copy()
+    submission[column] = submission[column].astype(object)
+    submission.loc[row, column] = value
+    return submission
+
+
+# Modifications of the valid submission, each violating one rule or several rules at once.
+MODIFICATIONS: Dict[str, Callable[[pd.DataFrame], pd.DataFrame]] = {
+    'valid': lambda x: x,
+    'missing_row': lambda x: x.iloc[:-1],
+    'extra_row': lambda x: pd.concat([x, x.iloc[:1]], ignore_index=True),
+    'index_column': lambda x: x.reset_index(),
+    'column_name': lambda x: x.rename(columns={'rec_3': 'rec3'}),
+    'float': lambda x: _set_value(x, 2, 'rec_2', 17.5),
+    'float_integer_like': lambda x: _set_value(x, 2, 'rec_2', 17.0),
+    'string': lambda x: _set_value(x, 1, 'rec_4', 'abc'),
+    'na': lambda x: _set_value(x, 3, 'rec_1', None),
+    'wrong_item': lambda x: _set_value(x, 4, 'itemID', 99),
+    'duplicate_item': lambda x: _set_value(x, 4, 'itemID', 11),
+    'non_existing_rec': lambda x: _set_value(x, 0, 'rec_5', 99),
+    'order': lambda x: x.iloc[::-1],
+    'non_existing_rec_and_order': lambda x: _set_value(x, 0, 'rec_5', 99).iloc[::-1],
+    'na_and_wrong_item': lambda x: _set_value(_set_value(x, 3, 'rec_1', None), 4, 'itemID', 99),
+}
+
+
+@pytest.fixture
+def submission_files(tmp_path: pathlib.Path) -> Dict[str, pathlib.Path]:
+    files = {}
+    for name, modify in MODIFICATIONS.items():
+        files[name] = tmp_path / f'{name}_recommendation.csv'
+        modify(VALID_SUBMISSION).to_csv(files[name], sep='|', index=False)
+    return files
+
+
+def test_messages_equal_baseline(submission_files: Dict[str, pathlib.Path]) -> None:
+    for name, submission_file in submission_files.items():
+        submission = check_submission_validity.read_submission(submission_file)
+        expected = check_submission_validity_baseline(submission, TEST_VALUES, VALID_ITEM_IDS)
+        assert check_submission_validity.check_submission_validity(submission, TEST_VALUES, VALID_ITEM_IDS) ==\
+            expected, name
+
+
+def test_files_equal_baseline(submission_files: Dict[str, pathlib.Path]) -> None:
+    results, violations = check_submission_validity.check_submission_files(
+        submission_files.values(), test_values=TEST_VALUES, valid_itemIDs=VALID_ITEM_IDS, num_processes=2)
+    for name, submission_file in submission_files.items():
+        expected = check_submission_validity_baseline(check_submission_validity.read_submission(submission_file),
+                                                      TEST_VALUES, VALID_ITEM_IDS)
+        assert results.set_index('Team').loc[name, 'Validity'] == expected, name
+        team_violations = violations[violations['Team'] == name]
+        if expected == 'Valid.':
+            assert len(team_violations) == 0
+        else:
+            assert team_violations['Rule'].iloc[0] == expected
+            assert (team_violations['Rows'] > 0).all()
+    rules = violations.groupby('Team')['Rule'].apply(list)
+    assert rules['na_and_wrong_item'] == ['At least one itemID is not an integer.', 'At least one NA.',
+                                          'At least one recommendation for a wrong itemID.',
+                                          'At least one non-existing itemID recommended.',  # NA is not an itemID
+                                          'Order of itemID changed, else valid.']
+    assert violations.set_index(['Team', 'Rule']).loc[
+        ('non_existing_rec_and_order', 'Order of itemID changed, else valid.'), 'Rows'] == 6
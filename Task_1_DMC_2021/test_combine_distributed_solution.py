@@ -0,0 +1,53 @@
+"""Tests of combining the teams' submissions
+
+Rank fusion (reciprocal rank fusion or Borda count) needs to give the hand-computed recommendations,
+with ties broken in favor of earlier teams and earlier ranks and missing recommendations (-1)
+ignored. Manual selection needs to take each item's recommendations from the selected team and
+return -1 for items without a valid selection.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import combine_distributed_solution
+
+
+# Recommendations (team x item x rank) of two teams for five items.
+RECOMMENDATIONS = np.array([
+    [[1, 2, 3], [1, 2, 3], [1, 2, 3], [1, -1, -1], [-1, -1, -1]],
+    [[2, 4, 1], [4, 5, 3], [4, 5, 6], [-1, -1, -1], [-1, -1, -1]]
+])
+
+
+@pytest.mark.parametrize('method,expected', [
+    # item 1: RRF favors the item recommended by both teams (score 2/63 > 1/61), Borda the top ranks
+    ('rrf', [[2, 1, 4], [3, 1, 4], [1, 4, 2], [1, -1, -1], [-1, -1, -1]]),
+    ('borda', [[2, 1, 4], [1, 4, 2], [1, 4, 2], [1, -1, -1], [-1, -1, -1]])
+])
+def test_fuse_recommendations(method: str, expected: list) -> None:
+    actual = combine_distributed_solution.fuse_recommendations(RECOMMENDATIONS, method=method)
+    np.testing.assert_array_equal(actual, np.array(expected))
+
+
+@pytest.mark.parametrize('method,expected', [
+    ('rrf', [4, 5, 6]),  # weighted rank 3 of second team (2/63) still beats rank 1 of first team (1/61)
+    ('borda', [4, 5, 1])
+])
+def test_fuse_recommendations_weighted(method: str, expected: list) -> None:
+    actual = combine_distributed_solution.fuse_recommendations(RECOMMENDATIONS[:, [2]], method=method,
+                                                               team_weights=[1, 2])
+    np.testing.assert_array_equal(actual, np.array([expected]))
+
+
+def test_fuse_recommendations_unknown_method() -> None:
+    with pytest.raises(ValueError):
+        combine_distributed_solution.fuse_recommendations(RECOMMENDATIONS, method='mean')
+
+
+def test_select_recommendations() -> None:
+    selections = pd.Series(['B', 'C', np.nan, 'A', 'B'])  # "C" is not a combined team
+    actual = combine_distributed_solution.select_recommendations(RECOMMENDATIONS, teams=['A', 'B'],
+                                                                 selections=selections)
+    expected = np.array([[2, 4, 1], [-1, -1, -1], [-1, -1, -1], [1, -1, -1], [-1, -1, -1]])
+    np.testing.assert_array_equal(actual, expected)
@@ -0,0 +1,76 @@
+"""Tests of ingesting manual files
+
+Only new or changed files need to be (re-)parsed, deleted files need to be removed, and the running
+score sums per team need to equal the scores of the current files; a changed validation needs to
+trigger re-validation of all files.
+"""
+
+import os
+import pathlib
+import sqlite3
+import sys
+from typing import Iterator, Optional
+
+import pandas as pd
+import pytest
+
+import ingest_manual_files
+
+
+MAX_SCORING = 3  # configuration of the validation
+
+
+def check_scoring(scoring_table: pd.DataFrame) -> Optional[str]:
+    if (scoring_table['scoring'] > MAX_SCORING).any():
+        return 'Scoring too high.'
+    return None
+
+
+def write_scoring_file(path: pathlib.Path, scorings: dict) -> None:
+    pd.DataFrame({'itemID': range(len(scorings)), 'team': list(scorings.keys()),
+                  'scoring': list(scorings.values())}).to_csv(path, sep='|', index=False)
+
+
+@pytest.fixture
+def connection(tmp_path: pathlib.Path) -> Iterator[sqlite3.Connection]:
+    connection = ingest_manual_files.open_store(tmp_path)
+    yield connection
+    connection.close()
+
+
+def ingest(connection: sqlite3.Connection, submission_dir: pathlib.Path) -> list:
+    paths = ingest_manual_files.ingest_files(connection, kind='scoring', submission_dir=submission_dir,
+                                             validate=check_scoring, validation_config={'max_scoring': MAX_SCORING})
+    return [pathlib.Path(x).name for x in paths]
+
+
+def test_change_detection(connection: sqlite3.Connection, tmp_path: pathlib.Path) -> None:
+    write_scoring_file(tmp_path / 'a_scoring.csv', {'A': 1, 'B': 3})
+    write_scoring_file(tmp_path / 'b_scoring.csv', {'A': 3, 'B': 2})
+    write_scoring_file(tmp_path / 'c_scoring_template.csv', {'A': 0, 'B': 0})
+    assert ingest(connection, tmp_path) == ['a_scoring.csv', 'b_scoring.csv']
+    assert ingest_manual_files.get_team_scores(connection)['scoring'].to_dict() == {'A': 2, 'B': 2.5}
+    assert ingest(connection, tmp_path) == []  # nothing changed
+    file_stat = (tmp_path / 'a_scoring.csv').stat()
+    os.utime(tmp_path / 'a_scoring.csv', ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 10 ** 9))
+    assert ingest(connection, tmp_path) == []  # modification time changed, but not content
+    write_scoring_file(tmp_path / 'a_scoring.csv', {'A': 3, 'B': 1})
+    assert ingest(connection, tmp_path) == ['a_scoring.csv']
+    assert ingest_manual_files.get_team_scores(connection)['scoring'].to_dict() == {'A': 3, 'B': 1.5}
+    (tmp_path / 'b_scoring.csv').unlink()
+    assert ingest(connection, tmp_path) == []
+    assert ingest_manual_files.get_team_scores(connection)['scoring'].to_dict() == {'A': 3, 'B': 1}
+
+
+def test_revalidation(connection: sqlite3.Connection, tmp_path: pathlib.Path,
+                      monkeypatch: pytest.MonkeyPatch) -> None:
+    write_scoring_file(tmp_path / 'a_scoring.csv', {'A': 1, 'B': 2})
+    write_scoring_file(tmp_path / 'b_scoring.csv', {'A': 4, 'B': 4})
+    assert ingest(connection, tmp_path) == ['a_scoring.csv', 'b_scoring.csv']
+    assert ingest_manual_files.get_invalid_files(connection, kind='scoring') == [
+        (str(tmp_path / 'b_scoring.csv'), 'Scoring too high.')]
+    assert ingest(connection, tmp_path) == []
+    monkeypatch.setattr(sys.modules[__name__], 'MAX_SCORING', 5)
+    assert ingest(connection, tmp_path) == ['a_scoring.csv', 'b_scoring.csv']
+    assert ingest_manual_files.get_invalid_files(connection, kind='scoring') == []
+    assert ingest_manual_files.get_team_scores(connection)['scoring'].to_dict() == {'A': 2.5, 'B': 3}
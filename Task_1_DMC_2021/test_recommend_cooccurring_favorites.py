@@ -0,0 +1,65 @@
+"""Tests of the co-occurrence recommender
+
+The item-wise mode (via the session index) and the batch mode (via sparse matrix products, in
+several batches) need to give the same recommendations as the original script, which scanned the
+transactions once per evaluation item. Clicks are distinct primes larger than the number of
+sessions, so popularity sums cannot tie and the rankings are unique.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import recommend_cooccurring_favorites
+
+
+NUM_SESSIONS = 60
+NUM_ITEMS = 40
+PRIMES = [x for x in range(NUM_SESSIONS + 1, 1000) if all(x % y != 0 for y in range(2, int(x ** 0.5) + 1))]
+
+
+# Each session contains 1 to 6 distinct items; each item has a fixed number of clicks. Item 0 only
+# occurs alone, so it has no co-occurring items.
+def generate_transactions(seed: int = 25) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    rows = [{'sessionID': NUM_SESSIONS, 'itemID': 0}]
+    for session_id in range(NUM_SESSIONS):
+        for item_id in rng.choice(np.arange(1, NUM_ITEMS), size=int(rng.integers(1, 7)), replace=False):
+            rows.append({'sessionID': session_id, 'itemID': int(item_id)})
+    transactions = pd.DataFrame(rows)
+    transactions['click'] = [PRIMES[x] for x in transactions['itemID']]
+    transactions['basket'] = 0
+    transactions['order'] = 0
+    return transactions
+
+
+# Original approach (before the batch mode and the session index), from the original script.
+def recommend_baseline(evaluation: pd.DataFrame, transactions: pd.DataFrame) -> pd.DataFrame:
+    evaluation = evaluation[['itemID']].copy()
+    global_item_ranking = transactions.groupby('itemID')['click'].sum().sort_values(ascending=False)
+    global_top_items = list(global_item_ranking[:5].index.values)
+    evaluation[[f'rec_{i + 1}' for i in range(5)]] = None  # initialize empty columns
+    for i, itemID in enumerate(evaluation['itemID']):
+        relevant_sessions = transactions.loc[transactions['itemID'] == itemID, 'sessionID']
+        if len(relevant_sessions) == 0:  # item not in training data
+            evaluation.iloc[i, 1:] = global_top_items
+        else:
+            relevant_data = transactions[transactions['sessionID'].isin(relevant_sessions) &
+                                         (transactions['itemID'] != itemID)]
+            relevant_item_ranking = relevant_data.groupby('itemID')['click'].sum().sort_values(ascending=False)
+            top_items = list(relevant_item_ranking[:5].index.values)
+            if len(top_items) < 5:  # if not enough co-occurring items, fill with globally popular items
+                top_items.extend(global_top_items[:(5 - len(top_items))])
+            evaluation.iloc[i, 1:] = top_items
+    return evaluation.astype('int64')
+
+
+@pytest.mark.parametrize('batch_size', [1, 7, 1000])
+def test_modes_equal_baseline(batch_size: int) -> None:
+    transactions = generate_transactions()
+    evaluation = pd.DataFrame({'itemID': [0, 1000] + list(range(NUM_ITEMS - 1, 0, -2))})  # 1000 is unknown
+    expected = recommend_baseline(evaluation, transactions)
+    itemwise = recommend_cooccurring_favorites.recommend_itemwise(evaluation, transactions)
+    pd.testing.assert_frame_equal(itemwise.astype('int64'), expected)
+    batchwise = recommend_cooccurring_favorites.recommend_batchwise(evaluation, transactions, batch_size=batch_size)
+    pd.testing.assert_frame_equal(batchwise.astype('int64'), expected)
@@ -0,0 +1,99 @@
+"""Test fixtures
+
+Synthetic raw auction-verification data in the format of "Process4.csv" (small domain) and
+"result*.csv" (large domain, split into partitions). Each product permutation allocates products
+to bidders one after another; products may be auctioned several times within a permutation
+(parallel cases), as in the original large-domain dataset. The datasets are also provided
+pre-processed as by "prepare_data.py" (without chunking).
+"""
+
+import pathlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dataset_schema
+import prepare_data
+
+
+NUM_PERMUTATIONS = 40
+NUM_PARTITIONS = 3  # of large-domain dataset
+INITIAL_CAPACITIES = [2, 3, 2, 1]
+WINNER_BITS = {1: (1, 0, 0), 2: (0, 1, 0), 3: (1, 1, 0), 4: (0, 0, 1)}  # binary encoding (weights 1, 2, 4)
+
+
+def _encode_price(price: int, is_small_domain: bool) -> str:
+    if is_small_domain:
+        return f'price = {price}'
+    return ' AND '.join(f'price_{2 ** k}_{(price >> k) & 1} > 0' for k in range(7))
+
+
+# Generate a raw dataset (one row per verification query).
+def generate_raw_dataset(is_small_domain: bool, num_permutations: int = NUM_PERMUTATIONS,
+                         seed: int = 25) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    rows = []
+    for _ in range(num_permutations):
+        capacities = list(INITIAL_CAPACITIES)
+        allocation = {}
+        num_auctions = int(rng.integers(6, 9))
+        products = rng.integers(1, 7, size=num_auctions)  # with repetitions, i.e., parallel cases
+        for position, product in enumerate(products.tolist()):
+            final_price = int(rng.integers(1, 9 if is_small_domain else 100))
+            base_row = {'id': product, 'lowestprice': final_price, 'capB1': capacities[0], 'capB2': capacities[1],
+                        'capB3': capacities[2], 'capB4': capacities[3], 'revenue': 0, 'last round': False,
+                        'final allocation': np.nan}
+            for price in range(max(1, final_price - 3), final_price + 1):  # price determination
+                rows.append({**base_row, 'property': f'EF (product = {product} AND ' +
+                             f'{_encode_price(price, is_small_domain)} AND step = {int(rng.integers(100))})',
+                             'winner': 0, 'lowestprice': price, 'result': price == final_price})
+            winner = int(rng.choice([bidder for bidder in range(1, 5) if capacities[bidder - 1] > 0]))
+            allocation[product] = (final_price, winner)
+            for bidder in range(1, winner + 1):  # winner determination
+                if is_small_domain:
+                    formula = f'EF (product = {product} AND winner = {bidder})'
+                else:
+                    formula = f'EF (product = {product} AND {_encode_price(final_price, False)} AND ' +\
+                        ' AND '.join(f'winner_{2 ** k}_{bit} > 0' for k, bit in enumerate(WINNER_BITS[bidder])) + ')'
+                is_final = (position == num_auctions - 1) and (bidder == winner)
+                rows.append({**base_row, 'property': formula, 'result': bidder == winner, 'last round': is_final,
+                             'winner': bidder if (is_small_domain or bidder == winner) else 0})
+                if is_final:
+                    rows[-1]['revenue'] = sum(price for price, _ in allocation.values())
+                    rows[-1]['final allocation'] = ' '.join(
+                        f'product{x}: price {allocation[x][0]} winner {allocation[x][1]}' for x in sorted(allocation))
+            capacities[winner - 1] -= 1
+    dataset = pd.DataFrame(rows)
+    dataset['time'] = rng.gamma(2, 3, size=len(dataset))
+    dataset['marking'] = rng.integers(100, 10000, size=len(dataset))
+    dataset['edges'] = rng.integers(100, 20000, size=len(dataset))
+    return dataset[['property', 'id', 'winner', 'lowestprice', 'capB1', 'capB2', 'capB3', 'capB4', 'revenue',
+                    'last round', 'result', 'time', 'marking', 'edges', 'final allocation']]
+
+
+# Path (or glob pattern) of a raw dataset written to a temporary directory, for both domains.
+@pytest.fixture(params=['small', 'large'])
+def raw_dataset_path(request, tmp_path: pathlib.Path) -> str:
+    dataset = generate_raw_dataset(is_small_domain=(request.param == 'small'))
+    if request.param == 'small':
+        dataset.to_csv(tmp_path / 'Process4.csv', index=False)
+        return str(tmp_path / 'Process4.csv')
+    for i, partition in enumerate(np.array_split(dataset, NUM_PARTITIONS)):
+        partition.to_csv(tmp_path / f'result{i}.csv', index=False)
+    return str(tmp_path / 'result*.csv')
+
+
+# Path (without file ending) of the pre-processed dataset (CSV, Parquet, and formula dictionary),
+# created like in "prepare_data.py" without chunking.
+@pytest.fixture
+def dataset_path(raw_dataset_path: str, tmp_path: pathlib.Path) -> pathlib.Path:
+    output_path = tmp_path / 'auction_verification'
+    dataset = prepare_data.preprocess_dataset(prepare_data.read_raw_dataset(raw_dataset_path))
+    dataset = dataset_schema.apply_schema(dataset, intern_formulas=False)
+    dataset_schema.save_formula_dictionary(dataset_schema.get_formula_dictionary(
+        dataset[dataset_schema.FORMULA_COLUMN]), output_path)
+    dataset.to_csv(output_path.with_suffix('.csv'), index=False)
+    dataset.to_parquet(output_path.with_suffix('.parquet'), index=False,
+                       compression=prepare_data.PARQUET_COMPRESSION)
+    return output_path
@@ -0,0 +1,198 @@
+"""Cross-validation
+
+Parallel cross-validation runner for the prediction experiments in "explore_data.py". The feature
+matrix (with NAs filled), the target, and the assignment of rows to test folds are created once as
+contiguous arrays and placed in shared memory, where worker processes access them read-only (no
+copy of the dataset per fold or per process). Folds run in parallel on all cores.
+Supports the splits sketched in "explore_data.py": random (KFold), leave-one-permutation-out, and
+leave-one-capacity-setting-out. Each of them assigns each row to exactly one test fold, so a fold
+is defined by its number alone. Besides train/test scores, fit time and scoring time of each fold
+as well as the size of the fitted model are recorded.
+Fold results are cached on disk ("experiment_cache.py"), so re-running an experiment (or a sweep
+over hyperparameters) only computes the folds not computed before.
+"""
+
+import concurrent.futures
+import multiprocessing.shared_memory
+import pickle
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import sklearn.base
+import sklearn.metrics
+import sklearn.model_selection
+import sklearn.tree
+
+import experiment_cache
+import formula_parsing
+import instrumentation
+import prepare_data
+
+
+SPLIT_SCHEMES = ['random', 'permutation', 'capacity']
+NUM_RANDOM_FOLDS = 10
+METRICS = {'r2': sklearn.metrics.r2_score, 'mcc': sklearn.metrics.matthews_corrcoef}
+NUM_WORKERS = None  # number of processes; None means number of cores
+USE_CACHE = True  # if False, always compute all folds (and do not store results)
+SEED = 25
+
+_shared_arrays = {}  # arrays in shared memory, attached in each worker process
+
+
+# Assign each row to the test fold it belongs to. Return array with one fold number per row.
+def get_fold_ids(dataset: pd.DataFrame, split_scheme: str = 'permutation',
+                 num_random_folds: int = NUM_RANDOM_FOLDS) -> np.ndarray:
+    if split_scheme == 'random':
+        fold_ids = np.empty(len(dataset), dtype=np.int32)
+        cv = sklearn.model_selection.KFold(n_splits=num_random_folds, shuffle=True, random_state=SEED)
+        for fold_idx, (_, test_idx) in enumerate(cv.split(X=dataset)):
+            fold_ids[test_idx] = fold_idx
+        return fold_ids
+    if split_scheme == 'permutation':
+        return pd.factorize(dataset['id.product_permutation'], sort=True)[0].astype(np.int32)
+    if split_scheme == 'capacity':
+        return dataset.groupby([x for x in dataset.columns if 'capacity' in x]).ngroup().to_numpy(dtype=np.int32)
+    raise ValueError(f'Unknown split scheme "{split_scheme}" (must be one of {SPLIT_SCHEMES}).')
+
+
+# Create feature matrix as contiguous array. As sklearn's trees internally work on float32, we
+# store this type right away (integer features in the datasets are small enough to be exact).
+def create_feature_matrix(dataset: pd.DataFrame, features: Sequence[str], dtype: Any = np.float32) -> np.ndarray:
+    return np.ascontiguousarray(dataset[list(features)].fillna(0).to_numpy(dtype=dtype))
+
+
+# Copy array into a new shared-memory block. Return the block and what is needed to attach it.
+def _share_array(array: np.ndarray) -> Tuple[multiprocessing.shared_memory.SharedMemory, Dict[str, Any]]:
+    shared_memory = multiprocessing.shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shared_memory.buf)[:] = array
+    return shared_memory, {'name': shared_memory.name, 'shape': array.shape, 'dtype': array.dtype.str}
+
+
+# Initializer of worker processes: attach shared-memory blocks as read-only arrays.
+def _attach_arrays(array_specs: Dict[str, Dict[str, Any]]) -> None:
+    for array_name, spec in array_specs.items():
+        shared_memory = multiprocessing.shared_memory.SharedMemory(name=spec['name'])
+        array = np.ndarray(spec['shape'], dtype=spec['dtype'], buffer=shared_memory.buf)
+        array.flags.writeable = False
+        _shared_arrays[array_name] = (shared_memory, array)  # keep reference to block, else it is closed
+
+
+# Train and evaluate model on one fold (of the arrays in shared memory).
+@instrumentation.instrument()
+def _run_fold(fold_idx: int, model: sklearn.base.BaseEstimator, metric: str,
+              return_model: bool) -> Dict[str, Any]:
+    start_time = time.perf_counter()
+    X = _shared_arrays['X'][1]
+    y = _shared_arrays['y'][1]
+    is_test = _shared_arrays['fold_ids'][1] == fold_idx
+    X_train, y_train, X_test, y_test = X[~is_test], y[~is_test], X[is_test], y[is_test]
+    model = sklearn.base.clone(model)
+    model.fit(X_train, y_train)
+    fit_end_time = time.perf_counter()
+    metric_func = METRICS[metric]
+    result = {'fold': fold_idx, 'num_train': len(y_train), 'num_test': len(y_test),
+              f'train_{metric}': metric_func(y_true=y_train, y_pred=model.predict(X_train)),
+              f'test_{metric}': metric_func(y_true=y_test, y_pred=model.predict(X_test))}
+    end_time = time.perf_counter()
+    result.update({'fit_time': fit_end_time - start_time, 'score_time': end_time - fit_end_time,
+                   'model_size': len(pickle.dumps(model))})
+    if return_model:
+        result['model'] = model
+    return result
+
+
+# Describe an experiment (for the cache key; the data itself is hashed separately).
+def _describe_experiment(features: Sequence[str], target: str, model: sklearn.base.BaseEstimator, metric: str,
+                         split_scheme: str) -> Dict[str, Any]:
+    return {'features': list(features), 'target': target, 'split_scheme': split_scheme,
+            'model': f'{type(model).__module__}.{type(model).__qualname__}', 'params': model.get_params(),
+            'metric': metric}
+
+
+# Cross-validate a model predicting "target" from "features" with one of the "SPLIT_SCHEMES".
+# Return one row per fold with train/test score of "metric" (name from "METRICS"), timings, and
+# model size (plus fitted model, if desired). Folds in the cache are not computed again.
+@instrumentation.instrument()
+def run_cross_validation(dataset: pd.DataFrame, features: Sequence[str], target: str,
+                         model: sklearn.base.BaseEstimator, metric: str, split_scheme: str = 'permutation',
+                         num_workers: Optional[int] = NUM_WORKERS, return_models: bool = False,
+                         cache: Optional[sqlite3.Connection] = None) -> pd.DataFrame:
+    if metric not in METRICS:
+        raise ValueError(f'Unknown metric "{metric}" (must be one of {list(METRICS)}).')
+    fold_ids = get_fold_ids(dataset, split_scheme=split_scheme)
+    arrays = {'X': create_feature_matrix(dataset, features), 'y': dataset[target].to_numpy(),
+              'fold_ids': fold_ids}
+    if arrays['y'].dtype == object:
+        raise ValueError(f'Target "{target}" needs a numeric or boolean type without NAs.')
+    description = _describe_experiment(features=features, target=target, model=model, metric=metric,
+                                       split_scheme=split_scheme)
+    results = {}
+    if cache is None and USE_CACHE:
+        cache = experiment_cache.open_cache()
+    if cache is not None:
+        experiment_key = experiment_cache.get_experiment_key(description, arrays)
+        results = experiment_cache.load_fold_results(cache, experiment_key, with_models=return_models)
+    missing_folds = [x for x in range(fold_ids.max() + 1) if x not in results]
+    if len(missing_folds) == 0:
+        return pd.DataFrame([results[x] for x in sorted(results)])
+    shared_memories = {}
+    try:
+        array_specs = {}
+        for array_name, array in arrays.items():
+            shared_memories[array_name], array_specs[array_name] = _share_array(array)
+        del arrays  # only shared copies needed from now on
+        with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers, initializer=_attach_arrays,
+                                                    initargs=(array_specs,)) as executor:
+            futures = [executor.submit(_run_fold, fold_idx, model, metric, return_models)
+                       for fold_idx in missing_folds]
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+                results[result['fold']] = result
+                if cache is not None:  # save each fold immediately, so interrupted runs can be resumed
+                    experiment_cache.save_fold_results(cache, experiment_key=experiment_key,
+                                                       description=description, results=[result])
+    finally:
+        for shared_memory in shared_memories.values():
+            shared_memory.close()
+            shared_memory.unlink()
+    return pd.DataFrame([results[x] for x in sorted(results)])
+
+
+# Cross-validate a model for each combination of hyperparameters in "param_grid" (dictionary of
+# hyperparameter name -> list of values). Return the fold results of all combinations, with
+# additional columns for the hyperparameters.
+@instrumentation.instrument()
+def run_parameter_sweep(dataset: pd.DataFrame, features: Sequence[str], target: str,
+                        model: sklearn.base.BaseEstimator, param_grid: Dict[str, List[Any]], metric: str,
+                        split_scheme: str = 'permutation', num_workers: Optional[int] = NUM_WORKERS,
+                        cache: Optional[sqlite3.Connection] = None) -> pd.DataFrame:
+    results = []
+    for params in sklearn.model_selection.ParameterGrid(param_grid):
+        param_results = run_cross_validation(
+            dataset=dataset, features=features, target=target, model=sklearn.base.clone(model).set_params(**params),
+            metric=metric, split_scheme=split_scheme, num_workers=num_workers, cache=cache)
+        results.append(param_results.assign(**params))
+    return pd.concat(results, ignore_index=True)
+
+
+if __name__ == '__main__':
+    dataset = prepare_data.load_dataset('data/auction_verification')
+    dataset = dataset.join(formula_parsing.decode_formulas(dataset['property.formula']))
+    dataset['verification.time'] = dataset['verification.time'].astype(float)
+    features = [x for x in dataset.columns if x.startswith('pro') and x != 'property.formula']
+    experiments: List[Tuple[str, sklearn.base.BaseEstimator, str]] = [
+        ('verification.time', sklearn.tree.DecisionTreeRegressor(random_state=SEED), 'r2'),
+        ('verification.result', sklearn.tree.DecisionTreeClassifier(random_state=SEED), 'mcc')
+    ]
+    param_grid = {'max_depth': [3, 10, None]}
+    for split_scheme in SPLIT_SCHEMES:
+        for target, model, metric in experiments:
+            start_time = time.perf_counter()
+            results = run_parameter_sweep(dataset=dataset, features=features, target=target, model=model,
+                                          param_grid=param_grid, metric=metric, split_scheme=split_scheme)
+            print(f'--- Target: {target}, split: {split_scheme}, {len(results)} folds in',
+                  f'{time.perf_counter() - start_time:.1f} s ---')
+            print(results.drop(columns=['fold']).groupby(list(param_grid), dropna=False).mean().round(3).to_string())
@@ -0,0 +1,120 @@
+"""Dataset schema
+
+Declared column types of the pre-processed auction-verification datasets (the large-domain
+dataset has some additional id columns). Each column gets the narrowest type sufficient for the
+value range of the data (with some head room): small integers become int8/int16, integer columns
+with NAs use the corresponding nullable types ("Int8", "Int16"), and the verification outcomes are
+booleans. The long formula strings, which repeat over many rows, are interned, i.e., stored as
+categorical (integer codes referring to a dictionary of distinct formulas). The formula dictionary
+is also saved as a separate file next to the dataset, so codes are stable, no matter whether the
+dataset is loaded from CSV or Parquet. Before casting, integer columns are checked to fit into their
+declared types (else an error is raised instead of silently wrapping values around).
+Run this script to get a report of the memory footprint of both datasets with and without schema.
+"""
+
+import pathlib
+from typing import Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+
+
+SCHEMA = {
+    'id.product_permutation': 'int32', 'id.iteration': 'int16', 'id.product_position': 'int8',
+    'id.product_case': 'int16',
+    'process.b1.capacity': 'int8', 'process.b2.capacity': 'int8', 'process.b3.capacity': 'int8',
+    'process.b4.capacity': 'int8',
+    'property.formula': 'category', 'property.product': 'int8', 'property.winner': 'Int8', 'property.price': 'int16',
+    'verification.is_final': 'bool', 'verification.result': 'bool', 'verification.time': 'float64',
+    'verification.markings': 'int32', 'verification.edges': 'int32',
+    'allocation.revenue': 'Int16',
+    **{f'allocation.p{product}.{variable}': dtype for product in range(1, 7)
+       for variable, dtype in [('price', 'Int16'), ('winner', 'Int8')]}
+}
+FORMULA_COLUMN = 'property.formula'
+FORMULA_DICTIONARY_SUFFIX = '_formulas.csv'  # appended to dataset path (without file ending)
+DATASET_PATHS = ['data/auction_verification', 'data/auction_verification_large']
+
+
+# Return path of the formula dictionary belonging to a dataset (path without file ending).
+def get_formula_dictionary_path(dataset_path: Union[str, pathlib.Path]) -> pathlib.Path:
+    dataset_path = pathlib.Path(dataset_path)
+    return dataset_path.with_name(dataset_path.name + FORMULA_DICTIONARY_SUFFIX)
+
+
+# Return the distinct formulas in order of first occurrence (also works on several chunks of data,
+# e.g., when pre-processing chunk-wise, if "known_formulas" from previous chunks are provided).
+def get_formula_dictionary(formulas: pd.Series, known_formulas: Iterable[str] = ()) -> pd.Series:
+    formula_dictionary = pd.Series(list(known_formulas), dtype='object')
+    new_formulas = pd.Series(formulas.unique(), dtype='object')
+    new_formulas = new_formulas[~new_formulas.isin(formula_dictionary)]
+    formula_dictionary = pd.concat([formula_dictionary, new_formulas], ignore_index=True)
+    return formula_dictionary.rename(FORMULA_COLUMN).rename_axis('formula_id')
+
+
+def save_formula_dictionary(formula_dictionary: pd.Series, dataset_path: Union[str, pathlib.Path]) -> None:
+    formula_dictionary.to_csv(get_formula_dictionary_path(dataset_path), index=True)
+
+
+# Load formula dictionary of dataset (None if it does not exist).
+def load_formula_dictionary(dataset_path: Union[str, pathlib.Path]) -> Optional[pd.Series]:
+    dictionary_path = get_formula_dictionary_path(dataset_path)
+    if not dictionary_path.exists():
+        return None
+    return pd.read_csv(dictionary_path, index_col='formula_id', dtype={FORMULA_COLUMN: 'object'})[FORMULA_COLUMN]
+
+
+# Raise an error if the values of a column do not fit into the (integer) type declared for it.
+def _check_value_range(values: pd.Series, dtype: str) -> None:
+    if not pd.api.types.is_integer_dtype(dtype):
+        return
+    values = values.dropna()
+    type_info = np.iinfo(dtype.lower())  # range of nullable type (e.g., "Int8") is same as for NumPy type
+    if len(values) > 0 and ((values.min() < type_info.min) or (values.max() > type_info.max)):
+        raise ValueError(f'Values of column "{values.name}" (range [{values.min()}, {values.max()}]) do not ' +
+                         f'fit into type "{dtype}".')
+
+
+# Cast all columns of the dataset which are in the schema (after checking that values fit into the
+# integer types). Formulas are interned with the categories from "formula_dictionary" (order of
+# first occurrence in the dataset if not provided); if "intern_formulas" is False, they remain strings.
+@instrumentation.instrument()
+def apply_schema(dataset: pd.DataFrame, formula_dictionary: Optional[pd.Series] = None,
+                 intern_formulas: bool = True) -> pd.DataFrame:
+    dtypes = {column: dtype for column, dtype in SCHEMA.items() if column in dataset.columns}
+    formula_dtype = dtypes.pop(FORMULA_COLUMN, None)
+    for column, dtype in dtypes.items():
+        _check_value_range(dataset[column], dtype)
+    dataset = dataset.astype(dtypes)
+    if intern_formulas and (formula_dtype is not None):
+        if formula_dictionary is None:
+            formula_dictionary = get_formula_dictionary(dataset[FORMULA_COLUMN])
+        dataset[FORMULA_COLUMN] = pd.Categorical(dataset[FORMULA_COLUMN], categories=formula_dictionary.values)
+        if dataset[FORMULA_COLUMN].isna().sum() > 0:
+            raise ValueError('Some formulas are not contained in the formula dictionary.')
+    return dataset
+
+
+# Compare memory usage (in bytes) of each column of a dataset before and after applying the schema.
+def get_memory_report(dataset_before: pd.DataFrame, dataset_after: pd.DataFrame) -> pd.DataFrame:
+    report = pd.DataFrame({'dtype_before': dataset_before.dtypes.astype(str),
+                           'dtype_after': dataset_after.dtypes.astype(str),
+                           'bytes_before': dataset_before.memory_usage(deep=True, index=False),
+                           'bytes_after': dataset_after.memory_usage(deep=True, index=False)})
+    report.loc['total', ['bytes_before', 'bytes_after']] = report[['bytes_before', 'bytes_after']].sum()
+    report['ratio'] = report['bytes_after'] / report['bytes_before']
+    return report
+
+
+if __name__ == '__main__':
+    for dataset_path in DATASET_PATHS:
+        # Types as inferred by pandas (with integer columns containing NAs repaired as "Int64"):
+        dataset = pd.read_csv(pathlib.Path(dataset_path).with_suffix('.csv'))
+        float_cols = [x for x in dataset.columns[dataset.dtypes == 'float'] if (dataset[x].dropna() % 1 == 0).all()]
+        dataset[float_cols] = dataset[float_cols].astype('Int64')
+        report = get_memory_report(dataset, apply_schema(dataset, load_formula_dictionary(dataset_path)))
+        print(f'--- {dataset_path}: {report.loc["total", "bytes_before"] / 2**20:.2f} MiB ->',
+              f'{report.loc["total", "bytes_after"] / 2**20:.2f} MiB ---')
+        print(report.to_string())
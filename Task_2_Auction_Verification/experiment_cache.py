@@ -0,0 +1,88 @@
+"""Experiment cache
+
+On-disk cache (SQLite database) for the fold results of "cross_validation.py". An experiment is
+identified by a hash of its description (features, target, split scheme, model class,
+hyperparameters, metric) and of the arrays it trains on (feature matrix, target, fold assignment),
+so any change of the dataset version invalidates the cached results as well. Results are stored
+per fold (scores, timings, size of the fitted model), and each fold is saved as soon as it is
+finished, so only missing experiment/fold combinations need to be computed, and interrupted runs
+(e.g., hyperparameter sweeps) can be resumed. Fitted models are only stored if requested.
+"""
+
+import hashlib
+import json
+import pathlib
+import pickle
+import sqlite3
+from typing import Any, Dict, Iterable, Union
+
+import numpy as np
+import pandas as pd
+
+
+CACHE_PATH = pathlib.Path('data/cache/experiments.sqlite')
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS experiments (experiment_key TEXT PRIMARY KEY, description TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS fold_results (experiment_key TEXT NOT NULL, fold INTEGER NOT NULL, result TEXT NOT NULL,
+                                         model BLOB, PRIMARY KEY (experiment_key, fold));
+'''
+
+
+def open_cache(cache_path: Union[str, pathlib.Path] = CACHE_PATH) -> sqlite3.Connection:
+    cache_path = pathlib.Path(cache_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(cache_path)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+# Hash the (JSON-serializable) description of an experiment together with the data it uses.
+def get_experiment_key(description: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> str:
+    hasher = hashlib.sha256(json.dumps(description, sort_keys=True, default=str).encode('utf-8'))
+    for array_name, array in sorted(arrays.items()):
+        hasher.update(f'{array_name}|{array.dtype.str}|{array.shape}'.encode('utf-8'))
+        hasher.update(np.ascontiguousarray(array).data)
+    return hasher.hexdigest()
+
+
+# Return cached results of an experiment as dictionary (fold number -> result). If "with_models",
+# only return folds whose fitted model is stored as well (and add the model to the result).
+def load_fold_results(connection: sqlite3.Connection, experiment_key: str,
+                      with_models: bool = False) -> Dict[int, Dict[str, Any]]:
+    fold_results = {}
+    query = 'SELECT fold, result, model FROM fold_results WHERE experiment_key = ?'
+    if with_models:
+        query += ' AND model IS NOT NULL'
+    for fold, result, model in connection.execute(query, (experiment_key,)):
+        fold_results[fold] = json.loads(result)
+        if with_models:
+            fold_results[fold]['model'] = pickle.loads(model)
+    return fold_results
+
+
+# Store the results of some folds of an experiment (replacing existing results of these folds).
+def save_fold_results(connection: sqlite3.Connection, experiment_key: str, description: Dict[str, Any],
+                      results: Iterable[Dict[str, Any]]) -> None:
+    with connection:  # one transaction
+        connection.execute('INSERT OR IGNORE INTO experiments VALUES (?, ?)',
+                           (experiment_key, json.dumps(description, sort_keys=True, default=str)))
+        for result in results:
+            model = pickle.dumps(result['model']) if 'model' in result else None
+            result = {key: value for key, value in result.items() if key != 'model'}
+            connection.execute('INSERT OR REPLACE INTO fold_results VALUES (?, ?, ?, ?)',
+                               (experiment_key, result['fold'], json.dumps(result, default=float), model))
+
+
+# Summarize all cached experiments: one row per experiment with its description and the mean of
+# each (numeric) result over its cached folds.
+def get_experiments(connection: sqlite3.Connection) -> pd.DataFrame:
+    descriptions = pd.DataFrame([dict(json.loads(description), experiment_key=experiment_key) for
+                                 experiment_key, description in connection.execute('SELECT * FROM experiments')])
+    fold_results = pd.DataFrame([dict(json.loads(result), experiment_key=experiment_key) for
+                                 experiment_key, result in connection.execute(
+                                     'SELECT experiment_key, result FROM fold_results')])
+    if len(descriptions) == 0 or len(fold_results) == 0:
+        return descriptions
+    summary = fold_results.drop(columns=['fold']).groupby('experiment_key').mean(numeric_only=True)
+    summary['num_folds'] = fold_results.groupby('experiment_key').size()
+    return descriptions.merge(summary, left_on='experiment_key', right_index=True, how='left')
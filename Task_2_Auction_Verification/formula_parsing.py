@@ -0,0 +1,69 @@
+"""Formula parsing
+
+Parsing of the string columns of the raw auction-verification data, i.e., the formula (property)
+to be verified and the final allocation. As there are far fewer distinct strings than rows, each
+distinct string is parsed once (with one regular expression extracting all relevant tokens), and
+the results are mapped back to the rows.
+In the large-domain dataset, formulas encode prices and winners binarily, e.g.,
+"winner_1_1 > 0 AND winner_2_0 > 0 AND winner_4_0 > 0" means winner 1 * 1 + 2 * 0 + 4 * 0 = 1.
+We decode the individual bits (also usable as features) as well as the integer values.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+
+
+FORMULA_BIT_REGEX = re.compile(r'(winner|price)_([0-9]+)_([01]) > 0')  # groups: variable, weight, bit
+# why "[ ]?" -> in some datasets there is an additional whitespace in the string, in others not
+ALLOCATION_PATTERN = r'product(?P<product>[1-6]): [ ]?price (?P<price>[0-9]+) winner (?P<winner>[0-9])'
+NUM_PRODUCTS = 6
+
+
+# Decode the binary-encoded variables of formulas. Return one row per formula, with columns for the
+# individual bits ("property.formula.<variable>_<weight>") and the integer value of each variable
+# ("property.formula.<variable>"). Only columns of variables occurring in any formula are created;
+# values are NA for formulas not containing the variable.
+@instrumentation.instrument()
+def decode_formulas(formulas: pd.Series) -> pd.DataFrame:
+    codes, unique_formulas = pd.factorize(formulas)
+    matches = [FORMULA_BIT_REGEX.findall(x) for x in unique_formulas]
+    if sum(len(x) for x in matches) == 0:
+        return pd.DataFrame(index=formulas.index)
+    tokens = pd.DataFrame([token for formula_matches in matches for token in formula_matches],
+                          columns=['variable', 'weight', 'bit']).astype({'weight': 'int64', 'bit': 'int64'})
+    tokens['formula'] = np.repeat(np.arange(len(unique_formulas)), [len(x) for x in matches])
+    # If a bit occurs multiple times in a formula, the last occurrence counts:
+    tokens = tokens.drop_duplicates(['formula', 'variable', 'weight'], keep='last')
+    bits = tokens.pivot(index='formula', columns=['variable', 'weight'], values='bit')
+    bits = bits.reindex(range(len(unique_formulas)))
+    decoded_formulas = pd.DataFrame(index=bits.index)
+    for variable in sorted(bits.columns.get_level_values('variable').unique()):
+        variable_bits = bits[variable].sort_index(axis='columns')
+        for weight in variable_bits.columns:
+            decoded_formulas[f'property.formula.{variable}_{weight}'] = variable_bits[weight].astype('Int64')
+        decoded_formulas[f'property.formula.{variable}'] = (variable_bits * variable_bits.columns).sum(
+            axis='columns', min_count=1).astype('Int64')
+    return decoded_formulas.reindex(codes).reset_index(drop=True).set_index(formulas.index)
+
+
+# Extract price and winner of each product from final-allocation strings. Return one row per
+# allocation, with columns "allocation.p<product>.price" and "allocation.p<product>.winner" (NA if
+# product not contained in allocation).
+@instrumentation.instrument()
+def parse_allocations(allocations: pd.Series, num_products: int = NUM_PRODUCTS) -> pd.DataFrame:
+    codes, unique_allocations = pd.factorize(allocations.fillna(''))
+    tokens = pd.Series(unique_allocations, dtype='object').str.extractall(ALLOCATION_PATTERN)
+    tokens = tokens.reset_index(level='match', drop=True).astype('int64')
+    tokens = tokens[~tokens.set_index('product', append=True).index.duplicated()]  # first match counts
+    values = tokens.pivot(columns='product', values=['price', 'winner'])
+    parsed_allocations = pd.DataFrame(index=range(len(unique_allocations)))
+    for product in range(1, num_products + 1):
+        for variable in ['price', 'winner']:
+            column = values[(variable, product)] if (variable, product) in values.columns else pd.NA
+            parsed_allocations[f'allocation.p{product}.{variable}'] = column
+    parsed_allocations = parsed_allocations.astype('Int64')
+    return parsed_allocations.reindex(codes).reset_index(drop=True).set_index(allocations.index)
@@ -0,0 +1,137 @@
+"""Pre-verification
+
+Rule-based short-circuit for verification queries: some verification results are (almost)
+determined by cheap columns known before verifying, e.g., if the verification is final, the result
+is true (see "explore_data.py"). We mine such rules from the data in two ways:
+    - crosstab: a single column having a certain value (NA included), e.g.,
+      "verification.is_final == True -> result True"
+    - tree: leaves of a classification tree on all cheap columns
+A rule is used if it is supported by enough rows and its purity (share of rows with the rule's
+result) is high enough (default: exact rules only). Queries matched by a rule are answered without
+verification, the others are verified as usual. For the large-domain dataset, the capacities are
+not used, as pre-processing made them depend on the verification result.
+To estimate savings and error rate on unseen data, we replay each dataset with rules mined on the
+other product permutations (group-wise cross-validation): for each method, we report the share of
+queries answered, the share of "verification.time" saved, and the error rate of the answers.
+"""
+
+from typing import Any, Dict, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import sklearn.model_selection
+import sklearn.tree
+
+import cross_validation
+import formula_parsing
+import instrumentation
+import prepare_data
+
+
+DATASET_PATHS = ['data/auction_verification', 'data/auction_verification_large']
+TARGET = 'verification.result'
+CAPACITY_COLUMNS = [f'process.b{bidder}.capacity' for bidder in range(1, 5)]
+MIN_SUPPORT = 20  # minimum number of rows matching a rule
+MIN_PURITY = 1.0  # minimum share of matching rows with the result of the rule
+MAX_DEPTH = 10  # of tree for mining rules
+NUM_FOLDS = 10  # for replay
+SEED = 25
+
+
+# Return the columns which are known before verification (and might be used for rules). In the
+# large-domain dataset (which has product cases), capacities were adjusted with the verification
+# result during pre-processing (see "prepare_data.py"), so they would leak the target.
+def get_cheap_columns(dataset: pd.DataFrame) -> list:
+    columns = [x for x in dataset.columns if x.startswith('pro') and x != 'property.formula']
+    if 'id.product_case' in dataset.columns:
+        columns = [x for x in columns if x not in CAPACITY_COLUMNS]
+    return columns + ['verification.is_final']
+
+
+# Find all values of single columns (NA included) which determine the result. Return one rule per
+# row, ordered by decreasing support.
+@instrumentation.instrument()
+def mine_crosstab_rules(dataset: pd.DataFrame, columns: Sequence[str], target: str = TARGET,
+                        min_support: int = MIN_SUPPORT, min_purity: float = MIN_PURITY) -> pd.DataFrame:
+    rules = []
+    for column in columns:
+        value_stats = dataset.groupby(column, dropna=False)[target].agg(['size', 'mean'])
+        value_stats = value_stats.rename(columns={'size': 'support', 'mean': 'share_true'}).rename_axis('value')
+        rules.append(value_stats.reset_index().assign(column=column))
+    rules = pd.concat(rules, ignore_index=True)
+    rules['prediction'] = rules['share_true'] >= 0.5
+    rules['purity'] = rules['share_true'].where(rules['prediction'], 1 - rules['share_true'])
+    rules = rules[(rules['support'] >= min_support) & (rules['purity'] >= min_purity)]
+    rules = rules.sort_values('support', ascending=False, kind='stable', ignore_index=True)
+    return rules[['column', 'value', 'prediction', 'support', 'purity']]
+
+
+# Answer queries with the first (i.e., best-supported) matching rule. Return nullable boolean
+# series (NA if no rule matches).
+def apply_crosstab_rules(dataset: pd.DataFrame, rules: pd.DataFrame) -> pd.Series:
+    predictions = pd.Series(pd.NA, index=dataset.index, dtype='boolean')
+    for column, value, prediction in rules[['column', 'value', 'prediction']].itertuples(index=False):
+        is_match = dataset[column].isna() if pd.isna(value) else (dataset[column] == value).fillna(False)
+        predictions[is_match & predictions.isna()] = prediction
+    return predictions
+
+
+# Fit a classification tree and keep its leaves which have enough support and purity as rules.
+# Return the tree and the prediction of each rule leaf.
+@instrumentation.instrument()
+def mine_tree_rules(dataset: pd.DataFrame, columns: Sequence[str], target: str = TARGET,
+                    min_support: int = MIN_SUPPORT, min_purity: float = MIN_PURITY,
+                    max_depth: int = MAX_DEPTH) -> Tuple[sklearn.tree.DecisionTreeClassifier, Dict[int, bool]]:
+    model = sklearn.tree.DecisionTreeClassifier(max_depth=max_depth, min_samples_leaf=min_support, random_state=SEED)
+    model.fit(cross_validation.create_feature_matrix(dataset, columns), dataset[target].to_numpy(dtype=bool))
+    leaf_stats = model.tree_.value[:, 0, :] / model.tree_.value[:, 0, :].sum(axis=1, keepdims=True)  # class shares
+    is_leaf = model.tree_.children_left == -1
+    is_rule = is_leaf & (model.tree_.n_node_samples >= min_support) & (leaf_stats.max(axis=1) >= min_purity)
+    return model, {int(node): bool(model.classes_[leaf_stats[node].argmax()]) for node in np.where(is_rule)[0]}
+
+
+def apply_tree_rules(dataset: pd.DataFrame, columns: Sequence[str], model: sklearn.tree.DecisionTreeClassifier,
+                     leaf_rules: Dict[int, bool]) -> pd.Series:
+    leaves = model.apply(cross_validation.create_feature_matrix(dataset, columns))
+    return pd.Series(leaves, index=dataset.index).map(leaf_rules).astype('boolean')
+
+
+# Evaluate answers of the pre-verifier (NA = not answered, i.e., verified as usual).
+def evaluate_predictions(dataset: pd.DataFrame, predictions: pd.Series, target: str = TARGET) -> Dict[str, Any]:
+    is_answered = predictions.notna().to_numpy()
+    is_wrong = is_answered & (predictions.fillna(False).to_numpy() != dataset[target].to_numpy(dtype=bool))
+    times = dataset['verification.time'].to_numpy(dtype=float)
+    return {'answered_share': is_answered.mean(), 'time_saved': times[is_answered].sum(),
+            'time_saved_share': times[is_answered].sum() / times.sum(), 'num_wrong': is_wrong.sum(),
+            'error_rate_answered': is_wrong.sum() / max(is_answered.sum(), 1), 'error_rate_all': is_wrong.mean()}
+
+
+# Replay the dataset: for each fold of product permutations, mine rules on the other permutations
+# and answer the fold's queries. Return evaluation for each method.
+@instrumentation.instrument()
+def replay(dataset: pd.DataFrame, columns: Sequence[str], num_folds: int = NUM_FOLDS) -> pd.DataFrame:
+    groups = cross_validation.get_fold_ids(dataset, split_scheme='permutation')
+    cv = sklearn.model_selection.GroupKFold(n_splits=min(num_folds, groups.max() + 1))
+    predictions = {method: pd.Series(pd.NA, index=dataset.index, dtype='boolean')
+                   for method in ['crosstab', 'tree', 'crosstab + tree']}
+    for train_idx, test_idx in cv.split(X=dataset, groups=groups):
+        train_data, test_data = dataset.iloc[train_idx], dataset.iloc[test_idx]
+        crosstab_predictions = apply_crosstab_rules(test_data, mine_crosstab_rules(train_data, columns))
+        tree_predictions = apply_tree_rules(test_data, columns, *mine_tree_rules(train_data, columns))
+        predictions['crosstab'].iloc[test_idx] = crosstab_predictions
+        predictions['tree'].iloc[test_idx] = tree_predictions
+        predictions['crosstab + tree'].iloc[test_idx] = crosstab_predictions.fillna(tree_predictions)
+    return pd.DataFrame([{'method': method, **evaluate_predictions(dataset, method_predictions)}
+                         for method, method_predictions in predictions.items()])
+
+
+if __name__ == '__main__':
+    for dataset_path in DATASET_PATHS:
+        dataset = prepare_data.load_dataset(dataset_path)
+        dataset = dataset.join(formula_parsing.decode_formulas(dataset['property.formula']))
+        columns = get_cheap_columns(dataset)
+        print(f'--- {dataset_path}: rules mined on all data ---')
+        print(mine_crosstab_rules(dataset, columns).to_string(index=False))
+        print(f'Pure tree leaves: {len(mine_tree_rules(dataset, columns)[1])}')
+        print(f'--- {dataset_path}: replay with rules mined on other permutations ---')
+        print(replay(dataset, columns).round(3).to_string(index=False))
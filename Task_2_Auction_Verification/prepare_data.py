@@ -10,19 +10,110 @@ For the large dataset,
     - add two further ids
     - make winner column consistent to small dataset
     - make capacities in rows with known winner consistent to small dataset
+
+Partitions of a dataset are discovered automatically and parsed concurrently with explicit data
+types. Besides CSV, each pre-processed dataset is also saved in a compressed columnar format
+(Parquet), which is much faster to load (use "load_dataset()").
+Columns get the narrow types declared in "dataset_schema.py"; the distinct formulas are saved as a
+separate formula dictionary, which is used to intern the formulas when loading a dataset.
+Finally, invariants of the pre-processed datasets are checked ("validate_dataset.py").
+By default, both datasets are pre-processed; pass "small" or "large" on the command line to only
+pre-process one of them (e.g., to run both in parallel).
+Optionally, datasets are pre-processed in chunks, carrying the state of the derived ids (counters,
+values of the previous row) from chunk to chunk, so memory does not depend on the dataset size.
 """
 
+import argparse
+import concurrent.futures
+import pathlib
+import re
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
 import pandas as pd
+import pyarrow
+import pyarrow.parquet
+
+import dataset_schema
+import formula_parsing
+import instrumentation
+import validate_dataset
 
 
-# If entry of "INPUT_PATHS" is a list, these datasets will be merged
-INPUT_PATHS = ['data/Process4.csv', [f'data/result{i}.csv' for i in range(6)]]
+# If entry of "INPUT_PATHS" is a glob pattern, all matching partitions will be merged (in order of
+# the number in their name)
+INPUT_PATHS = ['data/Process4.csv', 'data/result*.csv']
 OUTPUT_PATHS = ['data/auction_verification.csv', 'data/auction_verification_large.csv']
+DATASET_NAMES = ['small', 'large']  # for selecting datasets on the command line
+NUM_READ_WORKERS = None  # number of threads parsing partitions; None means default of ThreadPoolExecutor
+PARQUET_COMPRESSION = 'zstd'
+USE_CHUNKING = False  # if True, pre-process datasets chunk by chunk instead of loading them completely
+CHUNK_SIZE = 100000  # number of rows per chunk (if chunking is used)
+RAW_DTYPES = {
+    'property': 'object', 'id': 'int64', 'winner': 'int64', 'lowestprice': 'int64', 'capB1': 'int64',
+    'capB2': 'int64', 'capB3': 'int64', 'capB4': 'int64', 'revenue': 'int64', 'last round': 'bool',
+    'result': 'bool', 'time': 'float64', 'marking': 'int64', 'edges': 'int64', 'final allocation': 'object'
+}
+
+
+# Return the files matching a path (which might be a glob pattern), sorted by the number in their name.
+def find_partitions(input_path: str) -> List[pathlib.Path]:
+    input_path = pathlib.Path(input_path)
+    partitions = list(input_path.parent.glob(input_path.name))
+    if len(partitions) == 0:
+        raise FileNotFoundError(f'No files match "{input_path}".')
+    return sorted(partitions, key=lambda x: [int(y) if y.isdigit() else y for y in re.split('([0-9]+)', x.name)])
+
+
+# Read all partitions of a raw dataset (in parallel) and concatenate them.
+@instrumentation.instrument()
+def read_raw_dataset(input_path: str) -> pd.DataFrame:
+    partitions = find_partitions(input_path)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=NUM_READ_WORKERS) as executor:
+        datasets = list(executor.map(lambda x: pd.read_csv(x, dtype=RAW_DTYPES), partitions))
+    return pd.concat(datasets, ignore_index=True)
+
+
+# Load a pre-processed dataset (path without file ending) from Parquet if available, else from CSV.
+# Column types follow "dataset_schema.py", with formulas interned.
+@instrumentation.instrument()
+def load_dataset(path: Union[str, pathlib.Path]) -> pd.DataFrame:
+    path = pathlib.Path(path)
+    if path.with_suffix('.parquet').exists():
+        dataset = pd.read_parquet(path.with_suffix('.parquet'))
+    else:
+        dataset = pd.read_csv(path.with_suffix('.csv'), dtype={column: dtype for column, dtype in
+                                                               dataset_schema.SCHEMA.items()
+                                                               if column != dataset_schema.FORMULA_COLUMN})
+    return dataset_schema.apply_schema(dataset, formula_dictionary=dataset_schema.load_formula_dictionary(path))
 
 
-# Conduct various pre-processing steps and return pre-processed dataset.
-def preprocess_dataset(dataset: pd.DataFrame) -> pd.DataFrame():
+# State of the pre-processing at the end of the rows processed so far (initial values: before the
+# first row), so a dataset can be pre-processed in consecutive chunks.
+def get_initial_state() -> Dict[str, Any]:
+    return {'prev_is_final': True, 'prev_is_winner_known': True, 'prev_product': 0, 'num_permutations': 0,
+            'prev_permutation': 0, 'permutation_num_rows': 0, 'permutation_num_products': 0,
+            'permutation_product_cases': {}}
+
+
+# For rows belonging to the last permutation of the previous chunk (assuming permutation ids are
+# non-decreasing), return the counts carried over from that chunk (else 0).
+def _get_carry(permutations: pd.Series, prev_permutation: int, carry: Union[int, pd.Series]) -> pd.Series:
+    is_prev_permutation = (permutations == prev_permutation).fillna(False).to_numpy()
+    return pd.Series(np.where(is_prev_permutation, carry, 0), index=permutations.index)
+
+
+# Conduct various pre-processing steps and return pre-processed dataset. The dataset might be one
+# chunk of a larger dataset: then, the domain needs to be provided and the state from the previous
+# chunk, which will be updated for the next chunk.
+@instrumentation.instrument()
+def preprocess_dataset(dataset: pd.DataFrame, is_small_domain: Optional[bool] = None,
+                       state: Optional[Dict[str, Any]] = None) -> pd.DataFrame():
     dataset = dataset.copy()
+    if state is None:  # whole dataset
+        state = get_initial_state()
+    if is_small_domain is None:
+        is_small_domain = dataset['lowestprice'].max() < 10
     # Replace numeric placeholders with proper NaNs (after making sure a nullable int type is used):
     dataset[['winner', 'revenue']] = dataset[['winner', 'revenue']].astype('Int64').replace(0, float('nan'))
     # Use more intutive column names, which also group columns logically:
@@ -34,47 +125,64 @@ def preprocess_dataset(dataset: pd.DataFrame) -> pd.DataFrame():
         'marking': 'verification.markings', 'edges': 'verification.edges'
     }, inplace=True)
     # Extract numeric values out of final-allocation string:
-    dataset['final allocation'].fillna('', inplace=True)
-    for i in range(1, 7):
-        # why "[ ]?" -> in some datasets there is an additional whitespace in the string, in others not
-        dataset[[f'allocation.p{i}.price', f'allocation.p{i}.winner']] = dataset['final allocation'].str.extract(
-            f'product{i}: [ ]?price ([0-9]+) winner ([0-9])').astype(float).astype('Int64')
-    dataset.drop(columns='final allocation', inplace=True)
-    if dataset['property.price'].max() < 10:  # small-domain dataset
+    dataset = pd.concat([dataset.drop(columns='final allocation'),
+                         formula_parsing.parse_allocations(dataset['final allocation'])], axis='columns')
+    if is_small_domain:
         # Identify product permutations and the iterations within each permutation setting:
-        dataset['id.product_permutation'] = dataset['verification.is_final'].shift(fill_value=True).cumsum()
-        dataset['id.iteration'] = dataset.groupby('id.product_permutation').cumcount() + 1
+        dataset['id.product_permutation'] = dataset['verification.is_final'].shift(
+            fill_value=state['prev_is_final']).cumsum() + state['num_permutations']
+        dataset['id.iteration'] = dataset.groupby('id.product_permutation').cumcount() + 1 + _get_carry(
+            dataset['id.product_permutation'], state['prev_permutation'], state['permutation_num_rows'])
+        state['prev_is_final'] = bool(dataset['verification.is_final'].iloc[-1])
     else:  # large-domain dataset
         # Extract winner from binary encoding (wasn't done in dataset for rows with result == false):
-        dataset.loc[dataset['property.formula'].str.contains('winner_1_1 > 0 AND winner_2_0 > 0 AND winner_4_0 > 0'),
-                    'property.winner'] = 1
-        dataset.loc[dataset['property.formula'].str.contains('winner_1_0 > 0 AND winner_2_1 > 0 AND winner_4_0 > 0'),
-                    'property.winner'] = 2
-        dataset.loc[dataset['property.formula'].str.contains('winner_1_1 > 0 AND winner_2_1 > 0 AND winner_4_0 > 0'),
-                    'property.winner'] = 3
-        dataset.loc[dataset['property.formula'].str.contains('winner_1_0 > 0 AND winner_2_0 > 0 AND winner_4_1 > 0'),
-                    'property.winner'] = 4
+        formula_values = formula_parsing.decode_formulas(dataset['property.formula'])
+        winner_bits = ['property.formula.winner_1', 'property.formula.winner_2', 'property.formula.winner_4']
+        if all(x in formula_values.columns for x in winner_bits):
+            is_winner_encoded = formula_values[winner_bits].notna().all(axis='columns') &\
+                formula_values['property.formula.winner'].isin([1, 2, 3, 4])
+            dataset.loc[is_winner_encoded, 'property.winner'] = formula_values.loc[
+                is_winner_encoded, 'property.formula.winner']
         # Do not reduce capacity already in rows where winner is sucessfully determined:
         for bidder in range(1, 5):
             dataset[f'process.b{bidder}.capacity'] += dataset['verification.result'] &\
                 (dataset['property.winner'] == bidder).fillna(False)
         # Identify product permutations and the iterations within each permutation setting:
-        dataset['id.product_permutation'] =\
-            (dataset['property.winner'].isna() & dataset['property.winner'].shift(fill_value=0).notna() &
-             (dataset['process.b1.capacity'] == 2) & (dataset['process.b2.capacity'] == 3) &
-             (dataset['process.b3.capacity'] == 2) & (dataset['process.b4.capacity'] == 1)).cumsum().astype('Int64')
-        dataset['id.iteration'] = dataset.groupby('id.product_permutation').cumcount() + 1
+        dataset['after_winner'] = dataset['property.winner'].isna() &\
+            dataset['property.winner'].notna().shift(fill_value=state['prev_is_winner_known'])
+        is_new_permutation = dataset['after_winner'] &\
+            (dataset['process.b1.capacity'] == 2) & (dataset['process.b2.capacity'] == 3) &\
+            (dataset['process.b3.capacity'] == 2) & (dataset['process.b4.capacity'] == 1)
+        dataset['id.product_permutation'] = (is_new_permutation.astype(bool).cumsum() +
+                                             state['num_permutations']).astype('Int64')
+        dataset['id.iteration'] = dataset.groupby('id.product_permutation').cumcount() + 1 + _get_carry(
+            dataset['id.product_permutation'], state['prev_permutation'], state['permutation_num_rows'])
         # Identify product position within each permutation setting:
-        dataset['new_product'] = (dataset['property.product'] != dataset['property.product'].shift(fill_value=0)) |\
-            (dataset['id.product_permutation'] != dataset['id.product_permutation'].shift(fill_value=0))
-        dataset['id.product_position'] = dataset.groupby(['id.product_permutation'])['new_product'].cumsum()
+        dataset['new_product'] =\
+            (dataset['property.product'] != dataset['property.product'].shift(fill_value=state['prev_product'])) |\
+            (dataset['id.product_permutation'] !=
+             dataset['id.product_permutation'].shift(fill_value=state['prev_permutation']))
+        dataset['id.product_position'] = dataset.groupby(['id.product_permutation'])['new_product'].cumsum() +\
+            _get_carry(dataset['id.product_permutation'], state['prev_permutation'],
+                       state['permutation_num_products'])
         dataset.drop(columns='new_product', inplace=True)
         # Identify parallel cases for each product within a permutation:
-        dataset['after_winner'] = dataset['property.winner'].isna() &\
-            dataset['property.winner'].shift(fill_value=0).notna()
         dataset['id.product_case'] = dataset.groupby(
-            ['id.product_permutation', 'property.product'])['after_winner'].cumsum()
+            ['id.product_permutation', 'property.product'])['after_winner'].cumsum() + _get_carry(
+                dataset['id.product_permutation'], state['prev_permutation'],
+                dataset['property.product'].map(state['permutation_product_cases']).fillna(0).astype('int64'))
         dataset.drop(columns='after_winner', inplace=True)
+        last_permutation_rows = dataset[dataset['id.product_permutation'] == dataset['id.product_permutation'].iloc[-1]]
+        state['prev_is_winner_known'] = bool(dataset['property.winner'].notna().iloc[-1])
+        state['prev_product'] = dataset['property.product'].iloc[-1]
+        state['permutation_num_products'] = dataset['id.product_position'].iloc[-1]
+        last_product_cases = last_permutation_rows.groupby('property.product')['id.product_case'].last().to_dict()
+        if last_permutation_rows['id.product_permutation'].iloc[0] != state['prev_permutation']:  # new permutation
+            state['permutation_product_cases'] = {}
+        state['permutation_product_cases'].update(last_product_cases)  # products not in chunk keep their cases
+    state['num_permutations'] = dataset['id.product_permutation'].iloc[-1]
+    state['prev_permutation'] = dataset['id.product_permutation'].iloc[-1]
+    state['permutation_num_rows'] = dataset['id.iteration'].iloc[-1]
     # Re-order columns
     dataset = dataset[[x for x in dataset.columns if x.startswith('id')] +
                       [x for x in dataset.columns if x.startswith('process')] +
@@ -84,11 +192,65 @@ def preprocess_dataset(dataset: pd.DataFrame) -> pd.DataFrame():
     return dataset
 
 
-assert len(INPUT_PATHS) == len(OUTPUT_PATHS)
-for input_path, output_path in zip(INPUT_PATHS, OUTPUT_PATHS):
-    if isinstance(input_path, list):
-        dataset = pd.concat([pd.read_csv(x) for x in input_path], ignore_index=True)
-    else:
-        dataset = pd.read_csv(input_path)
-    dataset = preprocess_dataset(dataset)
-    dataset.to_csv(output_path, index=False)
+# Pre-process a raw dataset (all partitions matching "input_path") chunk by chunk, so only one chunk
+# needs to be in memory, and write the result incrementally (CSV, Parquet). Output is the same as
+# when pre-processing the whole dataset at once. Return violations of dataset invariants.
+@instrumentation.instrument()
+def preprocess_dataset_chunked(input_path: str, output_path: str,
+                               chunk_size: int = CHUNK_SIZE) -> Dict[str, np.ndarray]:
+    partitions = find_partitions(input_path)
+    # Domain needs to be known before processing the first chunk:
+    is_small_domain = max(pd.read_csv(x, usecols=['lowestprice'], dtype={'lowestprice': RAW_DTYPES['lowestprice']})[
+        'lowestprice'].max() for x in partitions) < 10
+    state = get_initial_state()
+    formula_dictionary = dataset_schema.get_formula_dictionary(pd.Series([], dtype='object'))
+    validator = validate_dataset.DatasetValidator()
+    parquet_writer = None
+    with open(output_path, 'w', newline='') as csv_file:
+        for partition in partitions:
+            for chunk in pd.read_csv(partition, dtype=RAW_DTYPES, chunksize=chunk_size):
+                chunk = preprocess_dataset(chunk, is_small_domain=is_small_domain, state=state)
+                chunk = dataset_schema.apply_schema(chunk, intern_formulas=False)
+                formula_dictionary = dataset_schema.get_formula_dictionary(
+                    chunk[dataset_schema.FORMULA_COLUMN], known_formulas=formula_dictionary)
+                validator.update(chunk)
+                chunk.to_csv(csv_file, index=False, header=(parquet_writer is None))
+                if parquet_writer is None:
+                    table = pyarrow.Table.from_pandas(chunk, preserve_index=False)
+                    parquet_writer = pyarrow.parquet.ParquetWriter(
+                        pathlib.Path(output_path).with_suffix('.parquet'), schema=table.schema,
+                        compression=PARQUET_COMPRESSION)
+                else:
+                    table = pyarrow.Table.from_pandas(chunk, schema=parquet_writer.schema, preserve_index=False)
+                parquet_writer.write_table(table)
+    parquet_writer.close()
+    dataset_schema.save_formula_dictionary(formula_dictionary, pathlib.Path(output_path).with_suffix(''))
+    return validator.get_violations()
+
+
+if __name__ == '__main__':
+    assert len(INPUT_PATHS) == len(OUTPUT_PATHS) == len(DATASET_NAMES)
+    parser = argparse.ArgumentParser(description='Pre-process the auction-verification datasets.')
+    parser.add_argument('datasets', nargs='*',
+                        help=f'datasets to be pre-processed, from {DATASET_NAMES} (default: all)')
+    datasets = parser.parse_args().datasets or DATASET_NAMES
+    if any(x not in DATASET_NAMES for x in datasets):
+        parser.error(f'Datasets must be from {DATASET_NAMES}.')
+    for input_path, output_path, dataset_name in zip(INPUT_PATHS, OUTPUT_PATHS, DATASET_NAMES):
+        if dataset_name not in datasets:
+            continue
+        if USE_CHUNKING:
+            violations = preprocess_dataset_chunked(input_path=input_path, output_path=output_path)
+        else:
+            dataset = read_raw_dataset(input_path)
+            dataset = preprocess_dataset(dataset)
+            dataset = dataset_schema.apply_schema(dataset, intern_formulas=False)  # formulas interned when loading
+            dataset_schema.save_formula_dictionary(dataset_schema.get_formula_dictionary(
+                dataset[dataset_schema.FORMULA_COLUMN]), pathlib.Path(output_path).with_suffix(''))
+            with instrumentation.stage('write_dataset', rows=len(dataset)):
+                dataset.to_csv(output_path, index=False)
+                dataset.to_parquet(pathlib.Path(output_path).with_suffix('.parquet'), index=False,
+                                   compression=PARQUET_COMPRESSION)
+            violations = validate_dataset.check_dataset(dataset)
+        print(f'Invariants of "{output_path}" (violating rows):')
+        print(validate_dataset.summarize_violations(violations).to_string(index=False))
@@ -0,0 +1,105 @@
+"""Schedule verification
+
+Simulation of scheduling verification queries on a farm of parallel workers, using predicted
+verification times. We replay a dataset as one batch of pending queries (all known up-front, as
+in a full sweep over product permutations) and assign them in a certain order to the worker that
+becomes free first. Orders:
+    - FIFO: order of the dataset (as recorded)
+    - SPT: shortest predicted time first (minimizes mean latency if predictions are exact)
+    - LPT: longest predicted time first (list-scheduling heuristic for bin packing, i.e., makespan)
+The predicted times are out-of-fold predictions of a regression tree (as in "explore_data.py"),
+with folds grouped by product permutation, so a query's time is never predicted by a model which
+has seen its permutation. Orders based on the actual times are reported as optimistic bounds.
+For each number of workers, we report makespan, mean latency (time from start of the batch until a
+query is finished), and throughput (queries per second).
+"""
+
+import heapq
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+import sklearn.model_selection
+import sklearn.tree
+
+import cross_validation
+import formula_parsing
+import instrumentation
+import prepare_data
+
+
+DATASET_PATHS = ['data/auction_verification', 'data/auction_verification_large']
+NUM_WORKERS_LIST = [1, 4, 16, 64]  # simulated farm sizes
+NUM_FOLDS = 10  # for out-of-fold prediction of verification times
+MAX_DEPTH = 10  # of regression tree predicting verification times
+SEED = 25
+
+
+# Predict verification times out-of-fold (folds consist of whole product permutations).
+@instrumentation.instrument()
+def predict_times(dataset: pd.DataFrame, features: Sequence[str], num_folds: int = NUM_FOLDS) -> np.ndarray:
+    X = cross_validation.create_feature_matrix(dataset, features)
+    y = dataset['verification.time'].to_numpy(dtype=float)
+    groups = cross_validation.get_fold_ids(dataset, split_scheme='permutation')
+    model = sklearn.tree.DecisionTreeRegressor(max_depth=MAX_DEPTH, random_state=SEED)
+    cv = sklearn.model_selection.GroupKFold(n_splits=min(num_folds, groups.max() + 1))
+    return sklearn.model_selection.cross_val_predict(model, X=X, y=y, groups=groups, cv=cv, n_jobs=-1)
+
+
+# Assign jobs (with actual processing "times") in the given "order" to the worker that becomes free
+# first. Return completion time of each job (in original job order).
+def simulate_schedule(times: np.ndarray, order: np.ndarray, num_workers: int) -> np.ndarray:
+    completion_times = np.empty(len(times))
+    if num_workers == 1:  # no need to simulate
+        completion_times[order] = np.cumsum(times[order])
+        return completion_times
+    worker_free_times = [0.0] * num_workers  # heap
+    for job_idx, job_time in zip(order.tolist(), times[order].tolist()):
+        completion_time = worker_free_times[0] + job_time
+        heapq.heapreplace(worker_free_times, completion_time)
+        completion_times[job_idx] = completion_time
+    return completion_times
+
+
+# Compute order of the jobs for each scheduling policy (stable sort, so ties keep FIFO order).
+def get_orders(predicted_times: np.ndarray, actual_times: np.ndarray) -> Dict[str, np.ndarray]:
+    return {
+        'FIFO': np.arange(len(actual_times)),
+        'SPT (predicted)': np.argsort(predicted_times, kind='stable'),
+        'LPT (predicted)': np.argsort(-predicted_times, kind='stable'),
+        'SPT (actual)': np.argsort(actual_times, kind='stable'),
+        'LPT (actual)': np.argsort(-actual_times, kind='stable')
+    }
+
+
+# Simulate all scheduling policies for all farm sizes. Return one row per policy and farm size,
+# with metrics absolute and relative to FIFO.
+@instrumentation.instrument()
+def evaluate_schedules(predicted_times: np.ndarray, actual_times: np.ndarray,
+                       num_workers_list: List[int] = NUM_WORKERS_LIST) -> pd.DataFrame:
+    results = []
+    for num_workers in num_workers_list:
+        for policy, order in get_orders(predicted_times=predicted_times, actual_times=actual_times).items():
+            completion_times = simulate_schedule(times=actual_times, order=order, num_workers=num_workers)
+            makespan = completion_times.max()
+            results.append({'num_workers': num_workers, 'policy': policy, 'makespan': makespan,
+                            'mean_latency': completion_times.mean(), 'throughput': len(actual_times) / makespan})
+    results = pd.DataFrame(results)
+    fifo_results = results[results['policy'] == 'FIFO'].set_index('num_workers')
+    for metric in ['makespan', 'mean_latency']:
+        results[f'{metric}_vs_fifo'] = results[metric] / results['num_workers'].map(fifo_results[metric])
+    return results
+
+
+if __name__ == '__main__':
+    for dataset_path in DATASET_PATHS:
+        dataset = prepare_data.load_dataset(dataset_path)
+        dataset = dataset.join(formula_parsing.decode_formulas(dataset['property.formula']))
+        features = [x for x in dataset.columns if x.startswith('pro') and x != 'property.formula']
+        actual_times = dataset['verification.time'].to_numpy(dtype=float)
+        predicted_times = predict_times(dataset, features=features)
+        print(f'--- {dataset_path}: {len(dataset)} queries, total verification time {actual_times.sum():.1f} s,',
+              f'Spearman correlation of predicted and actual time',
+              f'{pd.Series(predicted_times).corr(pd.Series(actual_times), method="spearman"):.3f} ---')
+        print(evaluate_schedules(predicted_times=predicted_times, actual_times=actual_times).round(3).to_string(
+            index=False))
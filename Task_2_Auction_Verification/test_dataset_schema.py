@@ -0,0 +1,28 @@
+"""Tests of the dataset schema
+
+Applying the schema must keep all values (and formula codes must agree between CSV and Parquet,
+see "test_prepare_data.py"); values out of the range of a declared integer type are an error.
+"""
+
+import pathlib
+
+import pandas as pd
+import pytest
+
+import dataset_schema
+import prepare_data
+
+
+def test_apply_schema_keeps_values(raw_dataset_path: str) -> None:
+    dataset = prepare_data.preprocess_dataset(prepare_data.read_raw_dataset(raw_dataset_path))
+    schema_dataset = dataset_schema.apply_schema(dataset)
+    assert all(str(schema_dataset[x].dtype) == dtype for x, dtype in dataset_schema.SCHEMA.items() if x in dataset)
+    pd.testing.assert_frame_equal(schema_dataset.astype(dataset.dtypes), dataset)
+
+
+@pytest.mark.parametrize('value', [-129, 128])
+def test_apply_schema_out_of_range(dataset_path: pathlib.Path, value: int) -> None:
+    dataset = pd.read_csv(dataset_path.with_suffix('.csv'))
+    dataset.loc[5, 'property.product'] = value  # declared as int8
+    with pytest.raises(ValueError, match='property.product'):
+        dataset_schema.apply_schema(dataset)
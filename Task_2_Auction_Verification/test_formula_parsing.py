@@ -0,0 +1,38 @@
+"""Tests of formula parsing
+
+Parsing each distinct string once needs to give the same values as the original row-wise string
+operations (one "str.extract()" per product for allocations, one "str.contains()" per winner for
+binary-encoded formulas).
+"""
+
+import pandas as pd
+import pytest
+
+import conftest
+import formula_parsing
+
+
+@pytest.mark.parametrize('is_small_domain', [True, False])
+def test_parse_allocations_equals_row_wise(is_small_domain: bool) -> None:
+    allocations = conftest.generate_raw_dataset(is_small_domain=is_small_domain)['final allocation']
+    allocations.iloc[::2] = allocations.iloc[::2].str.replace(': price', ':  price')  # whitespace variant
+    parsed_allocations = formula_parsing.parse_allocations(allocations)
+    for product in range(1, formula_parsing.NUM_PRODUCTS + 1):
+        expected = allocations.fillna('').str.extract(f'product{product}: [ ]?price ([0-9]+) winner ([0-9])').astype(
+            float).astype('Int64')
+        expected.columns = [f'allocation.p{product}.price', f'allocation.p{product}.winner']
+        pd.testing.assert_frame_equal(parsed_allocations[expected.columns], expected)
+
+
+def test_decode_formulas_winner_equals_row_wise() -> None:
+    formulas = conftest.generate_raw_dataset(is_small_domain=False)['property']
+    expected = pd.Series(pd.NA, index=formulas.index, dtype='Int64', name='property.formula.winner')
+    for winner, bits in conftest.WINNER_BITS.items():
+        expected[formulas.str.contains(' AND '.join(f'winner_{2 ** k}_{bit} > 0' for k, bit in enumerate(bits)))] =\
+            winner
+    pd.testing.assert_series_equal(formula_parsing.decode_formulas(formulas)['property.formula.winner'], expected)
+
+
+def test_decode_formulas_without_bits() -> None:
+    formulas = pd.Series(['EF (product = 1 AND winner = 2)', 'EF (product = 2 AND price = 3)'])
+    assert formula_parsing.decode_formulas(formulas).shape == (2, 0)
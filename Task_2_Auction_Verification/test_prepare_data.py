@@ -0,0 +1,48 @@
+"""Tests of pre-processing
+
+Reading partitions in parallel, loading from Parquet, and chunk-wise pre-processing need to give
+the same results as the straightforward way (reading partitions one after another, loading from
+CSV, pre-processing the whole dataset at once). For chunking, this must hold no matter where chunk
+boundaries fall (e.g., within a product permutation or between two parallel cases of a product).
+"""
+
+import pathlib
+
+import pandas as pd
+import pytest
+
+import dataset_schema
+import prepare_data
+
+
+def test_find_partitions_numeric_order(tmp_path: pathlib.Path) -> None:
+    for i in [10, 2, 1, 0]:
+        (tmp_path / f'result{i}.csv').touch()
+    assert [x.name for x in prepare_data.find_partitions(str(tmp_path / 'result*.csv'))] ==\
+        ['result0.csv', 'result1.csv', 'result2.csv', 'result10.csv']
+
+
+def test_read_raw_dataset_equals_sequential(raw_dataset_path: str) -> None:
+    expected = pd.concat([pd.read_csv(x, dtype=prepare_data.RAW_DTYPES)
+                          for x in prepare_data.find_partitions(raw_dataset_path)], ignore_index=True)
+    pd.testing.assert_frame_equal(prepare_data.read_raw_dataset(raw_dataset_path), expected)
+
+
+def test_load_dataset_parquet_equals_csv(dataset_path: pathlib.Path) -> None:
+    from_parquet = prepare_data.load_dataset(dataset_path)
+    dataset_path.with_suffix('.parquet').unlink()
+    from_csv = prepare_data.load_dataset(dataset_path)
+    pd.testing.assert_frame_equal(from_parquet, from_csv)
+    assert from_csv[dataset_schema.FORMULA_COLUMN].dtype == 'category'
+
+
+@pytest.mark.parametrize('chunk_size', [7, 13, 100, 1000])
+def test_chunked_equals_in_memory(raw_dataset_path: str, dataset_path: pathlib.Path, chunk_size: int) -> None:
+    chunked_path = dataset_path.with_name('chunked')
+    prepare_data.preprocess_dataset_chunked(raw_dataset_path, str(chunked_path.with_suffix('.csv')),
+                                            chunk_size=chunk_size)
+    assert chunked_path.with_suffix('.csv').read_bytes() == dataset_path.with_suffix('.csv').read_bytes()
+    assert (dataset_schema.get_formula_dictionary_path(chunked_path).read_bytes() ==
+            dataset_schema.get_formula_dictionary_path(dataset_path).read_bytes())
+    pd.testing.assert_frame_equal(pd.read_parquet(chunked_path.with_suffix('.parquet')),
+                                  pd.read_parquet(dataset_path.with_suffix('.parquet')))
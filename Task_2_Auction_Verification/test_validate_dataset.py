@@ -0,0 +1,29 @@
+"""Tests of dataset validation
+
+Validating a dataset chunk by chunk (from CSV) needs to report the same violating rows as
+validating the whole dataset at once, no matter where chunk boundaries fall.
+"""
+
+import pathlib
+
+import numpy as np
+import pytest
+
+import prepare_data
+import validate_dataset
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 50, 1000])
+def test_chunked_equals_in_memory(dataset_path: pathlib.Path, chunk_size: int) -> None:
+    expected = validate_dataset.check_dataset(prepare_data.load_dataset(dataset_path))
+    actual = validate_dataset.check_dataset_file(dataset_path, chunk_size=chunk_size)
+    assert list(actual) == validate_dataset.INVARIANTS
+    for invariant in validate_dataset.INVARIANTS:
+        np.testing.assert_array_equal(actual[invariant], expected[invariant], err_msg=invariant)
+
+
+def test_detects_violations(dataset_path: pathlib.Path) -> None:
+    dataset = prepare_data.load_dataset(dataset_path)
+    dataset.loc[3, 'allocation.revenue'] = 1  # revenue in non-final row
+    violations = validate_dataset.check_dataset(dataset)
+    assert 3 in violations['revenue_only_final']
@@ -0,0 +1,137 @@
+"""Validate dataset
+
+Checks of invariants of the pre-processed auction-verification data (originally explored in
+"explore_data.py"), each reporting the (0-based) positions of violating rows:
+    - first_iteration_capacity: capacities in the first iteration of each product permutation
+      are the same as in the first row of the dataset
+    - last_iteration_capacity: in the last iteration of each product permutation, five of six
+      products are assigned, i.e., the remaining capacities sum up to five (row: last iteration)
+    - allocation_only_final: the allocation is set exactly in rows with final verification
+    - revenue_only_final: the revenue is set exactly in rows with final verification
+    - wins_within_capacity: no bidder wins more products than its initial capacity
+    - two_positive_results: for each product within a product permutation, there are exactly two
+      positive verification results (rows: all rows of the product in the permutation)
+Row-wise invariants are vectorized column operations, permutation-wise invariants are checked
+with one groupby each. Data can be validated in chunks (e.g., while pre-processing or reading a
+large dataset): rows of the last product permutation of a chunk, which might be incomplete, are
+carried over to the next chunk.
+Code was written based on the small-domain verification dataset; the large-domain dataset is
+checked the same way, but might violate some invariants by design.
+"""
+
+import pathlib
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+import dataset_schema
+import instrumentation
+
+
+CAPACITY_COLUMNS = [f'process.b{bidder}.capacity' for bidder in range(1, 5)]
+WINNER_COLUMNS = [f'allocation.p{product}.winner' for product in range(1, 7)]
+PERMUTATION_COLUMNS = ['id.product_permutation', 'property.product', 'verification.result'] + CAPACITY_COLUMNS
+REQUIRED_COLUMNS = PERMUTATION_COLUMNS + WINNER_COLUMNS + ['id.iteration', 'verification.is_final',
+                                                           'allocation.p1.price', 'allocation.revenue']
+INVARIANTS = ['first_iteration_capacity', 'last_iteration_capacity', 'allocation_only_final', 'revenue_only_final',
+              'wins_within_capacity', 'two_positive_results']
+DATASET_PATHS = ['data/auction_verification', 'data/auction_verification_large']
+CHUNK_SIZE = 100000  # number of rows per chunk when validating dataset from CSV
+
+
+# Validates (consecutive chunks of) a dataset and collects the positions of violating rows.
+class DatasetValidator:
+
+    def __init__(self):
+        self.num_rows = 0  # position of first row of next chunk
+        self.initial_capacities = None  # from first row of dataset
+        self.pending_rows = None  # rows (and positions) of last, maybe incomplete permutation
+        self.violations = {invariant: [] for invariant in INVARIANTS}
+
+    # Check invariants which only depend on individual rows.
+    def _check_rows(self, dataset: pd.DataFrame, row_ids: np.ndarray) -> None:
+        capacities = dataset[CAPACITY_COLUMNS].to_numpy(dtype=np.int64)
+        is_first_iteration = (dataset['id.iteration'] == 1).to_numpy()
+        self.violations['first_iteration_capacity'].append(
+            row_ids[is_first_iteration & (capacities != self.initial_capacities).any(axis=1)])
+        is_final = dataset['verification.is_final'].to_numpy(dtype=bool)
+        self.violations['allocation_only_final'].append(
+            row_ids[dataset['allocation.p1.price'].notna().to_numpy() != is_final])
+        self.violations['revenue_only_final'].append(
+            row_ids[dataset['allocation.revenue'].notna().to_numpy() != is_final])
+        winners = dataset[WINNER_COLUMNS].fillna(0).to_numpy(dtype=np.int64)
+        num_wins = np.stack([(winners == bidder).sum(axis=1) for bidder in range(1, 5)], axis=1)
+        self.violations['wins_within_capacity'].append(row_ids[(num_wins > self.initial_capacities).any(axis=1)])
+
+    # Check invariants which depend on all rows of a product permutation (only complete permutations
+    # must be passed). Column "row_id" contains the positions of the rows.
+    def _check_permutations(self, permutation_rows: pd.DataFrame) -> Dict[str, List[np.ndarray]]:
+        violations = {}
+        last_rows = permutation_rows.groupby('id.product_permutation').tail(1)
+        violations['last_iteration_capacity'] = [
+            last_rows.loc[last_rows[CAPACITY_COLUMNS].sum(axis='columns') != 5, 'row_id'].to_numpy()]
+        num_positive_results = permutation_rows.groupby(['id.product_permutation', 'property.product'])[
+            'verification.result'].transform('sum')
+        violations['two_positive_results'] = [permutation_rows.loc[num_positive_results != 2, 'row_id'].to_numpy()]
+        return violations
+
+    # Validate the next chunk of the dataset (or the whole dataset).
+    def update(self, dataset: pd.DataFrame) -> None:
+        if len(dataset) == 0:
+            return
+        row_ids = np.arange(self.num_rows, self.num_rows + len(dataset))
+        self.num_rows += len(dataset)
+        if self.initial_capacities is None:
+            self.initial_capacities = dataset[CAPACITY_COLUMNS].iloc[0].to_numpy(dtype=np.int64)
+        self._check_rows(dataset, row_ids)
+        permutation_rows = dataset[PERMUTATION_COLUMNS].assign(row_id=row_ids)
+        if self.pending_rows is not None:
+            permutation_rows = pd.concat([self.pending_rows, permutation_rows], ignore_index=True)
+        is_last_permutation = permutation_rows['id.product_permutation'] ==\
+            permutation_rows['id.product_permutation'].iloc[-1]
+        for invariant, violating_row_ids in self._check_permutations(permutation_rows[~is_last_permutation]).items():
+            self.violations[invariant].extend(violating_row_ids)
+        self.pending_rows = permutation_rows[is_last_permutation]
+
+    # Return the positions of violating rows for each invariant (treating the last permutation seen
+    # so far as complete).
+    def get_violations(self) -> Dict[str, np.ndarray]:
+        violations = {invariant: list(row_ids) for invariant, row_ids in self.violations.items()}
+        if self.pending_rows is not None:
+            for invariant, row_ids in self._check_permutations(self.pending_rows).items():
+                violations[invariant].extend(row_ids)
+        return {invariant: np.sort(np.concatenate(row_ids)) if len(row_ids) > 0 else np.zeros(0, dtype=np.int64)
+                for invariant, row_ids in violations.items()}
+
+
+@instrumentation.instrument()
+def check_dataset(dataset: pd.DataFrame) -> Dict[str, np.ndarray]:
+    validator = DatasetValidator()
+    validator.update(dataset)
+    return validator.get_violations()
+
+
+# Validate a pre-processed dataset (path without file ending) chunk by chunk from its CSV file
+# (reading only the columns needed).
+@instrumentation.instrument()
+def check_dataset_file(path: Union[str, pathlib.Path], chunk_size: int = CHUNK_SIZE) -> Dict[str, np.ndarray]:
+    validator = DatasetValidator()
+    with pd.read_csv(pathlib.Path(path).with_suffix('.csv'), usecols=REQUIRED_COLUMNS, chunksize=chunk_size,
+                     dtype={x: dataset_schema.SCHEMA[x] for x in REQUIRED_COLUMNS}) as reader:
+        for chunk in reader:
+            validator.update(chunk)
+    return validator.get_violations()
+
+
+# One row per invariant with the number of violating rows and the positions of the first ones.
+def summarize_violations(violations: Dict[str, np.ndarray], max_row_ids: Optional[int] = 5) -> pd.DataFrame:
+    return pd.DataFrame([{'invariant': invariant, 'num_violating_rows': len(row_ids),
+                          'first_row_ids': row_ids[:max_row_ids].tolist()}
+                         for invariant, row_ids in violations.items()])
+
+
+if __name__ == '__main__':
+    for dataset_path in DATASET_PATHS:
+        print(f'--- {dataset_path} ---')
+        print(summarize_violations(check_dataset_file(dataset_path)).to_string(index=False))
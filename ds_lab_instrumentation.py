@@ -0,0 +1,106 @@
+"""DS Lab instrumentation
+
+Opt-in measurement of named stages of the scripts (e.g., loading data, computing
+recommendations, writing results). For each stage, we record wall time, CPU time (of the process),
+peak resident set size of the process so far (peak working set on Windows), and optionally the
+number of rows processed, and append them as one JSON object per line to an output stream.
+Measurement is enabled by setting the environment variable "DS_LAB_INSTRUMENTATION" to the path of
+the output file (or to "stderr"). Otherwise, stages are null contexts and decorated functions are
+not wrapped at all, so scripts can stay instrumented at (almost) no cost.
+Scripts of both tasks use this module via "instrumentation.py" in their own folder.
+"""
+
+import contextlib
+import functools
+import json
+import os
+import pathlib
+import sys
+import threading
+import time
+from typing import Any, Callable, ContextManager, Dict, Optional
+
+try:
+    import resource  # not available on Windows
+except ImportError:
+    resource = None
+try:
+    import win32api  # from "pywin32", only available on Windows
+    import win32process
+except ImportError:
+    win32process = None
+
+
+ENV_VARIABLE = 'DS_LAB_INSTRUMENTATION'
+OUTPUT = os.environ.get(ENV_VARIABLE, '')  # path of output file, "stderr", or empty (disabled)
+ENABLED = OUTPUT != ''
+
+_write_lock = threading.Lock()
+_disabled_measurement: Dict[str, Any] = {}  # yielded by disabled stages, fields set there are ignored
+
+
+# Peak resident set size of the process (in MiB), if it can be determined.
+def get_peak_rss_mb() -> Optional[float]:
+    if win32process is not None:
+        return win32process.GetProcessMemoryInfo(win32api.GetCurrentProcess())['PeakWorkingSetSize'] / 2**20
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 2**20 if sys.platform == 'darwin' else max_rss / 2**10  # bytes on macOS, else KiB
+
+
+# Append one record as JSON line to the output (one write per line, so records of concurrent
+# threads or processes are not interleaved).
+def _write_record(record: Dict[str, Any]) -> None:
+    line = json.dumps(record, default=str) + '\n'
+    with _write_lock:
+        if OUTPUT == 'stderr':
+            sys.stderr.write(line)
+        else:
+            with open(OUTPUT, 'a') as output_file:
+                output_file.write(line)
+
+
+@contextlib.contextmanager
+def _measure_stage(name: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    measurement = dict(fields)  # caller might add fields, e.g., "rows"
+    start_wall_time = time.perf_counter()
+    start_cpu_time = time.process_time()
+    try:
+        yield measurement
+    finally:
+        record = {'script': pathlib.Path(sys.argv[0]).name, 'stage': name, 'pid': os.getpid(),
+                  'wall_time': time.perf_counter() - start_wall_time,
+                  'cpu_time': time.process_time() - start_cpu_time, 'peak_rss_mb': get_peak_rss_mb()}
+        record.update(measurement)
+        _write_record(record)
+
+
+# Context manager measuring a named stage. Yields a dictionary to which further fields of the
+# record can be added, e.g., "measurement['rows'] = len(dataset)". Additional fields can also be
+# passed directly as keyword arguments.
+def stage(name: str, **fields: Any) -> ContextManager[Dict[str, Any]]:
+    if not ENABLED:
+        return contextlib.nullcontext(_disabled_measurement)
+    return _measure_stage(name, fields)
+
+
+# Decorator measuring each call of a function as stage (named like the function by default).
+# If the result is array-like (e.g., a data frame), its number of rows is recorded.
+def instrument(name: Optional[str] = None) -> Callable[[Callable], Callable]:
+    def decorator(func: Callable) -> Callable:
+        if not ENABLED:
+            return func
+        stage_name = func.__name__ if name is None else name
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _measure_stage(stage_name, {}) as measurement:
+                result = func(*args, **kwargs)
+                if len(getattr(result, 'shape', ())) > 0:
+                    measurement['rows'] = result.shape[0]
+                return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,319 @@
+"""Run pipeline
+
+Single entry point for the scripts of both tasks, modeled as stages of a dependency graph. Each
+stage runs one script (in the folder of its task, as the scripts expect) and declares the files it
+reads and writes (paths or glob patterns, relative to the task folder). A stage depends on all
+stages producing files which match its inputs. Besides the declared inputs, the script itself and
+all modules of the task folder or the top-level folder it (transitively) imports count as inputs.
+A stage is skipped if the content hashes of its inputs did not change since its last successful
+run and its outputs still exist unchanged, so after a single changed file, only the affected
+stages are run again. Hashes are cached by file modification time and size, so unchanged files
+are not even read. Stages whose dependencies are finished run in parallel, except stages sharing a
+resource (e.g., a database which several scripts write to), which run one after another.
+The console output of each stage is saved in the log directory (for stages without output files,
+like reports, this is the only result).
+
+Usage: "python run_pipeline.py [stage ...] [--force] [--dry-run] [--jobs N]"; without stage names,
+all stages run (else the given stages and the stages they depend on).
+"""
+
+import argparse
+import ast
+import concurrent.futures
+import fnmatch
+import hashlib
+import json
+import os
+import pathlib
+import subprocess
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+ROOT_DIR = pathlib.Path(__file__).resolve().parent
+PIPELINE_DIR = ROOT_DIR / '.pipeline'  # state and logs
+STATE_FILE_NAME = 'state.json'
+TASK_1_DIR = 'Task_1_DMC_2021'
+TASK_2_DIR = 'Task_2_Auction_Verification'
+SUBMISSION_FILES = 'data/**/*_recommendation.csv'
+MANUAL_STORE = 'data/manual_files.sqlite'  # written by each script ingesting manual files
+STAGES = [
+    # Task 1: demo submissions
+    {'name': 'recommend_global_favorites', 'dir': TASK_1_DIR, 'script': 'recommend_global_favorites.py',
+     'inputs': ['data/evaluation.csv', 'data/transactions.csv'],
+     'outputs': ['data/Jakob-global-favorites_recommendation.csv']},
+    {'name': 'recommend_similar_items', 'dir': TASK_1_DIR, 'script': 'recommend_similar_items.py',
+     'inputs': ['data/evaluation.csv', 'data/items.csv', 'data/transactions.csv'],
+     'outputs': ['data/Jakob-similar-items_recommendation.csv']},
+    {'name': 'recommend_cooccurring_favorites', 'dir': TASK_1_DIR, 'script': 'recommend_cooccurring_favorites.py',
+     'inputs': ['data/evaluation.csv', 'data/items.csv', 'data/transactions.csv'],
+     'outputs': ['data/Jakob-cooccurring-favorites_recommendation.csv']},
+    # Task 1: checking and evaluating submissions
+    {'name': 'check_submission_validity', 'dir': TASK_1_DIR, 'script': 'check_submission_validity.py',
+     'inputs': ['data/evaluation.csv', 'data/items.csv', SUBMISSION_FILES], 'outputs': []},
+    {'name': 'evaluate_offline', 'dir': TASK_1_DIR, 'script': 'evaluate_offline.py',
+     'inputs': ['data/evaluation.csv', 'data/items.csv', 'data/transactions.csv', SUBMISSION_FILES],
+     'outputs': []},
+    {'name': 'prepare_manual_scoring', 'dir': TASK_1_DIR, 'script': 'prepare_manual_scoring.py',
+     'inputs': ['data/evaluation.csv', 'data/items.csv', SUBMISSION_FILES],
+     'outputs': ['data/*_comparison.csv', 'data/*_scoring_template.csv']},
+    {'name': 'evaluate_manual_scoring', 'dir': TASK_1_DIR, 'script': 'evaluate_manual_scoring.py',
+     'inputs': ['data/**/*_scoring.csv'], 'outputs': [], 'resources': [MANUAL_STORE]},
+    # Task 1: distributed solution
+    {'name': 'prepare_distributed_solution', 'dir': TASK_1_DIR, 'script': 'prepare_distributed_solution.py',
+     'inputs': ['data/evaluation.csv', 'data/items.csv', SUBMISSION_FILES],
+     'outputs': ['data/comparison_*.csv', 'data/selection_template_*.csv']},
+    {'name': 'combine_distributed_solution', 'dir': TASK_1_DIR, 'script': 'combine_distributed_solution.py',
+     'inputs': ['data/evaluation.csv', 'data/items.csv', SUBMISSION_FILES, 'data/**/selection_*.csv'],
+     'outputs': ['data/IT_Karlsruhe_1.csv'], 'resources': [MANUAL_STORE]},
+    # Task 2: preparation
+    {'name': 'prepare_data_small', 'dir': TASK_2_DIR, 'script': 'prepare_data.py', 'args': ['small'],
+     'inputs': ['data/Process4.csv'],
+     'outputs': ['data/auction_verification.csv', 'data/auction_verification.parquet',
+                 'data/auction_verification_formulas.csv']},
+    {'name': 'prepare_data_large', 'dir': TASK_2_DIR, 'script': 'prepare_data.py', 'args': ['large'],
+     'inputs': ['data/result*.csv'],
+     'outputs': ['data/auction_verification_large.csv', 'data/auction_verification_large.parquet',
+                 'data/auction_verification_large_formulas.csv']},
+    # Task 2: analyses (reports)
+    {'name': 'validate_dataset', 'dir': TASK_2_DIR, 'script': 'validate_dataset.py',
+     'inputs': ['data/auction_verification*.csv'], 'outputs': []},
+    {'name': 'dataset_schema', 'dir': TASK_2_DIR, 'script': 'dataset_schema.py',
+     'inputs': ['data/auction_verification*.csv'], 'outputs': []},
+    {'name': 'cross_validation', 'dir': TASK_2_DIR, 'script': 'cross_validation.py',
+     'inputs': ['data/auction_verification.parquet', 'data/auction_verification_formulas.csv'], 'outputs': []},
+    {'name': 'schedule_verification', 'dir': TASK_2_DIR, 'script': 'schedule_verification.py',
+     'inputs': ['data/auction_verification*.parquet', 'data/auction_verification*_formulas.csv'], 'outputs': []},
+    {'name': 'pre_verification', 'dir': TASK_2_DIR, 'script': 'pre_verification.py',
+     'inputs': ['data/auction_verification*.parquet', 'data/auction_verification*_formulas.csv'], 'outputs': []}
+]
+
+
+# Whether a path (or glob pattern, e.g., of an output) matches a glob pattern; "**/" might match no
+# directory at all (as in "pathlib.Path.glob()").
+def matches(path: str, pattern: str) -> bool:
+    return fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(path, pattern.replace('**/', ''))
+
+
+# Return the stages each stage depends on (dictionary of stage name -> set of stage names).
+def get_dependencies(stages: List[Dict[str, Any]]) -> Dict[str, Set[str]]:
+    dependencies = {}
+    for stage in stages:
+        dependencies[stage['name']] = {
+            other_stage['name'] for other_stage in stages if other_stage['name'] != stage['name'] and
+            other_stage['dir'] == stage['dir'] and
+            any(matches(output, input) for output in other_stage['outputs'] for input in stage['inputs'])}
+    return dependencies
+
+
+# Return stage names in an order compatible with the dependencies (raise error if there is a cycle).
+def sort_stages(dependencies: Dict[str, Set[str]]) -> List[str]:
+    sorted_names = []
+    remaining = dict(dependencies)
+    while len(remaining) > 0:
+        ready = [name for name, stage_dependencies in remaining.items() if stage_dependencies.issubset(sorted_names)]
+        if len(ready) == 0:
+            raise ValueError(f'Dependencies of stages {sorted(remaining)} are cyclic.')
+        sorted_names.extend(ready)
+        for name in ready:
+            del remaining[name]
+    return sorted_names
+
+
+# Return the modules of "directory" (or of the root directory, e.g., shared by both tasks) imported
+# (transitively) by "script", as paths relative to the root directory.
+def get_local_modules(directory: pathlib.Path, script: str) -> List[str]:
+    modules = []
+    pending = [directory / script]
+    while len(pending) > 0:
+        module_path = pending.pop()
+        modules.append(module_path)
+        for node in ast.walk(ast.parse(module_path.read_text(encoding='utf-8'))):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module is not None:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                for module_dir in [directory, ROOT_DIR]:  # same order as in "sys.path"
+                    imported_path = module_dir / (name.split('.')[0] + '.py')
+                    if imported_path.exists():
+                        if imported_path not in modules and imported_path not in pending:
+                            pending.append(imported_path)
+                        break
+    return sorted(str(x.relative_to(ROOT_DIR)) for x in modules)
+
+
+# Return the files matching paths or glob patterns (relative to "directory"), as paths relative to
+# the root directory.
+def expand_patterns(directory: pathlib.Path, patterns: Iterable[str]) -> List[str]:
+    files = set()
+    for pattern in patterns:
+        files.update(str(x.relative_to(ROOT_DIR)) for x in directory.glob(pattern) if x.is_file())
+    return sorted(files)
+
+
+# Computes and caches content hashes of files (cache entries are re-used while modification time
+# and size of a file do not change).
+class FileHasher:
+
+    def __init__(self, cache: Dict[str, List[Any]]):
+        self.cache = cache  # path -> [mtime_ns, size, sha256]
+
+    def get_hash(self, path: str) -> Optional[str]:
+        full_path = ROOT_DIR / path
+        if not full_path.exists():
+            return None
+        stat = full_path.stat()
+        cache_entry = self.cache.get(path)
+        if cache_entry is not None and cache_entry[:2] == [stat.st_mtime_ns, stat.st_size]:
+            return cache_entry[2]
+        hasher = hashlib.sha256()
+        with open(full_path, 'rb') as file:
+            for block in iter(lambda: file.read(2**20), b''):
+                hasher.update(block)
+        self.cache[path] = [stat.st_mtime_ns, stat.st_size, hasher.hexdigest()]
+        return hasher.hexdigest()
+
+
+def load_state(pipeline_dir: pathlib.Path = PIPELINE_DIR) -> Dict[str, Any]:
+    state_path = pipeline_dir / STATE_FILE_NAME
+    if not state_path.exists():
+        return {'files': {}, 'stages': {}}
+    with open(state_path) as state_file:
+        return json.load(state_file)
+
+
+# Save state atomically, so an interrupted run does not leave a broken state file.
+def save_state(state: Dict[str, Any], pipeline_dir: pathlib.Path = PIPELINE_DIR) -> None:
+    pipeline_dir.mkdir(exist_ok=True)
+    temp_path = pipeline_dir / (STATE_FILE_NAME + '.tmp')
+    with open(temp_path, 'w') as state_file:
+        json.dump(state, state_file, indent=1)
+    os.replace(temp_path, pipeline_dir / STATE_FILE_NAME)
+
+
+# Hash of the stage definition and the current content of all its inputs.
+def get_input_signature(stage: Dict[str, Any], hasher: FileHasher) -> str:
+    directory = ROOT_DIR / stage['dir']
+    input_files = sorted(set(expand_patterns(directory, stage['inputs']) +
+                             get_local_modules(directory, stage['script'])))
+    definition = {key: stage.get(key) for key in ['dir', 'script', 'args', 'inputs', 'outputs']}
+    signature = {'definition': definition, 'inputs': {x: hasher.get_hash(x) for x in input_files}}
+    return hashlib.sha256(json.dumps(signature, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+# Whether outputs of the stage exist (at least one file per pattern) and are unchanged since its
+# last run.
+def are_outputs_unchanged(stage: Dict[str, Any], stage_state: Dict[str, Any], hasher: FileHasher) -> bool:
+    directory = ROOT_DIR / stage['dir']
+    if any(len(expand_patterns(directory, [pattern])) == 0 for pattern in stage['outputs']):
+        return False
+    return all(hasher.get_hash(path) == output_hash for path, output_hash in stage_state['outputs'].items())
+
+
+# Run the script of a stage, saving its console output in the log directory. Return exit code.
+def run_stage(stage: Dict[str, Any], pipeline_dir: pathlib.Path = PIPELINE_DIR) -> int:
+    log_dir = pipeline_dir / 'logs'
+    log_dir.mkdir(parents=True, exist_ok=True)
+    with open(log_dir / f'{stage["name"]}.log', 'w') as log_file:
+        process = subprocess.run([sys.executable, stage['script']] + stage.get('args', []),
+                                 cwd=ROOT_DIR / stage['dir'], stdout=log_file, stderr=subprocess.STDOUT)
+    return process.returncode
+
+
+# Run the selected stages (and the stages they depend on) in dependency order, in parallel where
+# possible, skipping up-to-date stages. Return names of failed stages.
+def run_pipeline(stages: List[Dict[str, Any]] = STAGES, selected_names: Optional[Iterable[str]] = None,
+                 force: bool = False, dry_run: bool = False, num_jobs: Optional[int] = None) -> List[str]:
+    stages = {stage['name']: stage for stage in stages}
+    dependencies = get_dependencies(list(stages.values()))
+    sorted_names = sort_stages(dependencies)
+    if selected_names is not None:
+        required_names = set()
+        pending = list(selected_names)
+        while len(pending) > 0:
+            name = pending.pop()
+            if name not in stages:
+                raise ValueError(f'Unknown stage "{name}".')
+            if name not in required_names:
+                required_names.add(name)
+                pending.extend(dependencies[name])
+        sorted_names = [x for x in sorted_names if x in required_names]
+    state = load_state()
+    hasher = FileHasher(state['files'])
+    finished_names = set()
+    would_run_names = set()  # in dry run
+    failed_names = []
+    running = {}  # future -> (stage name, input signature)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_jobs or os.cpu_count()) as executor:
+        while len(finished_names) + len(failed_names) < len(sorted_names):
+            for name in sorted_names:
+                if name in finished_names or name in failed_names or any(x[0] == name for x in running.values()):
+                    continue
+                if any(x in failed_names for x in dependencies[name]):
+                    print(f'[skipped]   {name} (dependency failed)')
+                    failed_names.append(name)
+                    continue
+                if not dependencies[name].issubset(finished_names):
+                    continue
+                if any(x in would_run_names for x in dependencies[name]):  # dry run, inputs might change
+                    print(f'[would run] {name} (dependency would run)')
+                    would_run_names.add(name)
+                    finished_names.add(name)
+                    continue
+                signature = get_input_signature(stages[name], hasher)
+                stage_state = state['stages'].get(name)
+                if not force and stage_state is not None and stage_state['signature'] == signature and\
+                        are_outputs_unchanged(stages[name], stage_state, hasher):
+                    print(f'[unchanged] {name}')
+                    finished_names.add(name)
+                    continue
+                if dry_run:
+                    print(f'[would run] {name}')
+                    would_run_names.add(name)
+                    finished_names.add(name)
+                    continue
+                busy_resources = {x for y in running.values() for x in stages[y[0]].get('resources', [])}
+                if any(x in busy_resources for x in stages[name].get('resources', [])):
+                    continue  # wait till the stage using the resource is finished
+                print(f'[running]   {name}')
+                running[executor.submit(run_stage, stages[name])] = (name, signature)
+            if len(running) == 0:
+                continue  # stages became ready or failed in this iteration
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name, signature = running.pop(future)
+                if future.result() != 0:
+                    print(f'[failed]    {name} (see "{PIPELINE_DIR / "logs" / name}.log")')
+                    failed_names.append(name)
+                    state['stages'].pop(name, None)
+                    continue
+                print(f'[finished]  {name}')
+                finished_names.add(name)
+                output_files = expand_patterns(ROOT_DIR / stages[name]['dir'], stages[name]['outputs'])
+                state['stages'][name] = {'signature': signature,
+                                         'outputs': {x: hasher.get_hash(x) for x in output_files}}
+                save_state(state)
+    save_state(state)
+    return failed_names
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the stages of both tasks, skipping up-to-date stages.')
+    parser.add_argument('stages', nargs='*', help='stages to run, plus their dependencies (default: all)')
+    parser.add_argument('--force', action='store_true', help='run stages even if up-to-date')
+    parser.add_argument('--dry-run', action='store_true', help='only show which stages would run')
+    parser.add_argument('--jobs', type=int, default=None, help='maximum number of stages running in parallel')
+    parser.add_argument('--list', action='store_true', help='list stages with their dependencies and exit')
+    args = parser.parse_args()
+    stage_names = [stage['name'] for stage in STAGES]
+    if any(x not in stage_names for x in args.stages):
+        parser.error(f'Stages must be from {stage_names}.')
+    if args.list:
+        for name, stage_dependencies in get_dependencies(STAGES).items():
+            print(f'{name}: {", ".join(sorted(stage_dependencies)) or "-"}')
+        sys.exit(0)
+    failed_stages = run_pipeline(selected_names=args.stages or None, force=args.force, dry_run=args.dry_run,
+                                 num_jobs=args.jobs)
+    sys.exit(1 if len(failed_stages) > 0 else 0)
@@ -0,0 +1,82 @@
+"""Tests of the pipeline runner
+
+Smoke tests of the stage graph declared in "run_pipeline.py": all scripts exist, dependencies
+follow from matching outputs to inputs (within a task), the graph can be sorted, cycles are
+detected, and stages sharing a resource do not run at the same time.
+"""
+
+import threading
+import time
+from typing import Any, Dict
+
+import pytest
+
+import run_pipeline
+
+
+def test_stage_scripts_exist() -> None:
+    names = [stage['name'] for stage in run_pipeline.STAGES]
+    assert len(names) == len(set(names))
+    for stage in run_pipeline.STAGES:
+        assert (run_pipeline.ROOT_DIR / stage['dir'] / stage['script']).exists(), stage['name']
+
+
+def test_matches() -> None:
+    assert run_pipeline.matches('data/Jakob-global-favorites_recommendation.csv', run_pipeline.SUBMISSION_FILES)
+    assert run_pipeline.matches('data/selection_template_1.csv', 'data/**/selection_*.csv')
+    assert not run_pipeline.matches('data/*_scoring_template.csv', 'data/**/*_scoring.csv')
+
+
+def test_dependencies() -> None:
+    dependencies = run_pipeline.get_dependencies(run_pipeline.STAGES)
+    recommenders = {'recommend_global_favorites', 'recommend_similar_items', 'recommend_cooccurring_favorites'}
+    assert dependencies['check_submission_validity'] == recommenders
+    assert dependencies['combine_distributed_solution'] == recommenders | {'prepare_distributed_solution'}
+    assert dependencies['cross_validation'] == {'prepare_data_small'}
+    assert dependencies['pre_verification'] == {'prepare_data_small', 'prepare_data_large'}
+    assert all(len(dependencies[x]) == 0 for x in recommenders | {'prepare_data_small', 'prepare_data_large'})
+
+
+def test_sort_stages() -> None:
+    dependencies = run_pipeline.get_dependencies(run_pipeline.STAGES)
+    sorted_names = run_pipeline.sort_stages(dependencies)
+    assert sorted(sorted_names) == sorted(dependencies)
+    for name, stage_dependencies in dependencies.items():
+        assert all(sorted_names.index(x) < sorted_names.index(name) for x in stage_dependencies)
+
+
+def test_sort_stages_cycle() -> None:
+    with pytest.raises(ValueError):
+        run_pipeline.sort_stages({'a': {'c'}, 'b': {'a'}, 'c': {'b'}, 'd': set()})
+
+
+def test_local_modules() -> None:
+    modules = run_pipeline.get_local_modules(run_pipeline.ROOT_DIR / run_pipeline.TASK_2_DIR, 'prepare_data.py')
+    assert f'{run_pipeline.TASK_2_DIR}/prepare_data.py' in modules
+    assert f'{run_pipeline.TASK_2_DIR}/formula_parsing.py' in modules
+    assert 'ds_lab_instrumentation.py' in modules  # shared module in top-level folder
+    assert not any('pandas' in x for x in modules)
+
+
+def test_shared_resource_not_parallel(monkeypatch: pytest.MonkeyPatch) -> None:
+    running_names = set()
+    max_running = [0]  # stages using the resource
+    lock = threading.Lock()
+
+    def run_stage(stage: Dict[str, Any]) -> int:
+        with lock:
+            running_names.add(stage['name'])
+            max_running[0] = max(max_running[0], len(running_names & {'a', 'b'}))
+        time.sleep(0.1)
+        with lock:
+            running_names.remove(stage['name'])
+        return 0
+
+    monkeypatch.setattr(run_pipeline, 'run_stage', run_stage)
+    monkeypatch.setattr(run_pipeline, 'get_input_signature', lambda stage, hasher: '')
+    monkeypatch.setattr(run_pipeline, 'load_state', lambda: {'files': {}, 'stages': {}})
+    monkeypatch.setattr(run_pipeline, 'save_state', lambda state: None)
+    stages = [{'name': x, 'dir': '', 'script': f'{x}.py', 'inputs': [], 'outputs': [],
+               'resources': ['r'] if x != 'c' else []} for x in ['a', 'b', 'c']]
+    assert run_pipeline.run_pipeline(stages, force=True, num_jobs=3) == []
+    assert max_running[0] == 1